@@ -0,0 +1,182 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+import engine
+from project_store import ProjectStore
+
+# ===========================
+#   导出性能基准测试
+# ===========================
+# 用 ffmpeg 的 lavfi 信号源在本地生成测试视频，按 default_project.json 的结构
+# 构建 N 个视频 × M 个片段的项目，端到端计时导出流程，结果追加写入 JSON Lines 文件便于前后对比。
+#
+# 用法:
+#   python bench.py --videos 4 --clips 50 --duration 600 --jobs 1,4 --modes per_clip,single_pass,smart
+
+def generate_video(ffmpeg_path, path, duration, resolution, fps, gop):
+    """生成带音频的 H.264 测试视频 (已存在时直接复用)"""
+    if os.path.exists(path): return
+    tmp_path = path + ".part" + os.path.splitext(path)[1]
+    cmd = [ffmpeg_path, '-hide_banner', '-v', 'error', '-y',
+           '-f', 'lavfi', '-i', f"testsrc2=size={resolution}:rate={fps}:duration={duration}",
+           '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=48000:duration={duration}",
+           '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(gop), '-pix_fmt', 'yuv420p',
+           '-c:a', 'aac', '-shortest', tmp_path]
+    subprocess.run(cmd, check=True, **engine.subprocess_kwargs())
+    os.replace(tmp_path, path)
+
+def build_project(video_paths, clips_per_video, duration, output_dir):
+    """每个视频均匀切出 M 个互不重叠的片段"""
+    project = engine.new_project()
+    project["output_dir"] = output_dir
+    span = duration / clips_per_video
+    for path in video_paths:
+        project["videos"][path] = [{
+            "start": engine.format_time(i * span),
+            "end": engine.format_time(i * span + span * 0.8),
+            "category": "",
+            "name": f"clip_{i + 1:04d}",
+            "status": engine.STATUS_WAITING
+        } for i in range(clips_per_video)]
+    return project
+
+def measure_spawn(ffmpeg_path, rounds=10):
+    """单次启动 ffmpeg 进程的平均开销 (秒)"""
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        subprocess.run([ffmpeg_path, '-hide_banner', '-version'], stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, **engine.subprocess_kwargs())
+    return (time.perf_counter() - t0) / rounds
+
+def measure_autosave(project, work_dir):
+    """完整保存一次项目，以及记录一条片段状态日志的平均耗时 (秒)"""
+    path = os.path.join(work_dir, "bench_project.json")
+    store = ProjectStore(path, project)
+    t0 = time.perf_counter()
+    store.flush()
+    full = time.perf_counter() - t0
+
+    entries = [(vid, clip) for vid, clips in project["videos"].items() for clip in clips]
+    t0 = time.perf_counter()
+    for vid, clip in entries:
+        store.record_status(vid, clip)
+    journal = (time.perf_counter() - t0) / max(1, len(entries))
+    store.close()
+    return {"full_save_sec": full, "journal_entry_sec": journal, "project_bytes": os.path.getsize(path)}
+
+def dir_size(path):
+    total = 0
+    for folder, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(folder, name))
+    return total
+
+def run_case(ffmpeg_path, project, out_dir, jobs, mode):
+    """端到端导出一次，返回计时结果"""
+    shutil.rmtree(out_dir, ignore_errors=True)
+    # 每轮都从 "等待" 状态开始
+    for clips in project["videos"].values():
+        for clip in clips: clip["status"] = engine.STATUS_WAITING
+
+    t0 = time.perf_counter()
+    planned, total_clips, skipped = engine.plan_jobs(project, out_dir, mode=mode)
+    plan_sec = time.perf_counter() - t0
+    failed = engine.run_export(ffmpeg_path, planned, total_clips, skipped, jobs)
+    elapsed = time.perf_counter() - t0
+
+    out_bytes = dir_size(out_dir)
+    return {
+        "mode": mode, "jobs": jobs, "processes": len(planned),
+        "clips": total_clips, "failed": failed,
+        "elapsed_sec": elapsed, "plan_sec": plan_sec,
+        "clips_per_sec": total_clips / elapsed if elapsed else 0.0,
+        "bytes_per_sec": out_bytes / elapsed if elapsed else 0.0,
+        "output_bytes": out_bytes
+    }
+
+def ffmpeg_version(ffmpeg_path):
+    try:
+        out = subprocess.run([ffmpeg_path, '-version'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                             text=True, **engine.subprocess_kwargs()).stdout
+        return out.splitlines()[0] if out else None
+    except OSError:
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出性能基准测试 (使用本地生成的测试视频)")
+    parser.add_argument("--videos", type=int, default=2, help="视频数量 N")
+    parser.add_argument("--clips", type=int, default=20, help="每个视频的片段数 M")
+    parser.add_argument("--duration", type=float, default=120, help="每个测试视频的时长 (秒)")
+    parser.add_argument("--resolution", default="1280x720", help="分辨率，如 1920x1080")
+    parser.add_argument("--fps", type=int, default=25, help="帧率")
+    parser.add_argument("--gop", type=int, default=50, help="关键帧间隔 (帧)")
+    parser.add_argument("--jobs", default="1,4", help="要测试的并发数，逗号分隔")
+    parser.add_argument("--modes", default=f"{engine.EXPORT_MODE_PER_CLIP},{engine.EXPORT_MODE_SINGLE_PASS}",
+                        help="要测试的导出模式，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=1, help="每种组合重复次数")
+    parser.add_argument("--workdir", default="bench_work", help="测试视频与输出的工作目录")
+    parser.add_argument("--results", default="bench_results.jsonl", help="结果文件 (每次运行追加一行 JSON)")
+    parser.add_argument("--ffmpeg", default=None, help="ffmpeg 可执行文件路径")
+    args = parser.parse_args(argv)
+
+    ffmpeg_path = args.ffmpeg or engine.find_ffmpeg()
+    if not ffmpeg_path:
+        print("错误: 未检测到 FFmpeg 组件", file=sys.stderr)
+        return 2
+
+    media_dir = os.path.join(args.workdir, "media")
+    os.makedirs(media_dir, exist_ok=True)
+    print(f"[1/3] 准备测试视频 ({args.videos} 个, {args.duration:g} 秒, {args.resolution}, GOP {args.gop})...")
+    videos = []
+    for i in range(args.videos):
+        name = f"src_{i:03d}_{args.resolution}_{args.fps}fps_g{args.gop}_{args.duration:g}s.mp4"
+        path = os.path.abspath(os.path.join(media_dir, name)).replace("\\", "/")
+        generate_video(ffmpeg_path, path, args.duration, args.resolution, args.fps, args.gop)
+        videos.append(path)
+
+    project = build_project(videos, args.clips, args.duration, "")
+    print("[2/3] 测量进程启动与自动保存开销...")
+    spawn = measure_spawn(ffmpeg_path)
+    autosave = measure_autosave(project, args.workdir)
+
+    print("[3/3] 端到端导出计时...")
+    cases = []
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        for jobs in [int(j) for j in args.jobs.split(",") if j.strip()]:
+            for r in range(args.repeat):
+                result = run_case(ffmpeg_path, project, os.path.join(args.workdir, "out"), jobs, mode)
+                result["round"] = r + 1
+                cases.append(result)
+                print(f"  {mode:<12} jobs={jobs:<3} {result['elapsed_sec']:.2f}s  "
+                      f"{result['clips_per_sec']:.1f} 片段/s  {engine.format_size(result['bytes_per_sec'])}/s  "
+                      f"进程 {result['processes']}  失败 {result['failed']}")
+
+    record = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ffmpeg_version(ffmpeg_path),
+        "params": {"videos": args.videos, "clips": args.clips, "duration": args.duration,
+                   "resolution": args.resolution, "fps": args.fps, "gop": args.gop},
+        "spawn_sec": spawn,
+        "autosave": autosave,
+        "cases": cases
+    }
+    with open(args.results, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    print(f"\n进程启动开销: {spawn * 1000:.1f} ms/次")
+    print(f"自动保存: 完整保存 {autosave['full_save_sec'] * 1000:.1f} ms ({engine.format_size(autosave['project_bytes'])})，"
+          f"状态日志 {autosave['journal_entry_sec'] * 1e6:.0f} µs/条")
+    print(f"结果已追加到 {os.path.abspath(args.results)}")
+    return 1 if any(c["failed"] for c in cases) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,13 @@
+import argparse
 import os
 import shutil
 import subprocess
 import sys
 import time
 
-def build_exe():
+APP_NAME = "寺院视频剪辑系统"
+
+def build_exe(onedir=False):
     print("="*40)
     print("  开始构建：寺院视频剪辑管理系统")
     print("="*40)
@@ -37,15 +40,16 @@ def build_exe():
 
     # 3. 执行打包命令
     # --noconsole: 隐藏黑色弹窗
-    # --onefile: 生成单个文件
+    # --onefile: 生成单个文件 (每次启动都要先解压到临时目录，冷启动要几秒)
+    # --onedir: 生成一个文件夹 (免解压，启动快，适合安装在办公电脑上)
     # --collect-all: 强制收集 ttkbootstrap 的主题文件（关键）
-    print("[3/4] 正在打包 (可能需要 1-2 分钟)...")
+    print(f"[3/4] 正在打包{'文件夹版' if onedir else '单文件版'} (可能需要 1-2 分钟)...")
     
     cmd = [
         "pyinstaller",
         "--noconsole",
-        "--onefile",
-        "--name=寺院视频剪辑系统",
+        "--onedir" if onedir else "--onefile",
+        f"--name={APP_NAME}",
         "--collect-all=ttkbootstrap", 
         "main.py"
     ]
@@ -60,7 +64,8 @@ def build_exe():
     # 4. 自动复制 ffmpeg.exe
     print("[4/4] 处理依赖组件...")
     ffmpeg_src = "ffmpeg.exe"
-    dist_folder = "dist"
+    # ffmpeg.exe 须与程序放在同一目录 (文件夹版为 dist 下的程序文件夹)
+    dist_folder = os.path.join("dist", APP_NAME) if onedir else "dist"
     
     if os.path.exists(ffmpeg_src):
         shutil.copy(ffmpeg_src, os.path.join(dist_folder, ffmpeg_src))
@@ -81,5 +86,7 @@ def build_exe():
         pass
 
 if __name__ == "__main__":
-    build_exe()
+    parser = argparse.ArgumentParser(description="打包寺院视频剪辑系统")
+    parser.add_argument("--onedir", action="store_true", help="打包为文件夹 (免解压，启动快)，默认为单个 exe 文件")
+    build_exe(parser.parse_args().onedir)
     input("\n按回车键退出...")
\ No newline at end of file
@@ -0,0 +1,547 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+import compilation
+import cutlist
+import dedup
+import distributed
+import engine
+import probe
+import scanner
+import segmenter
+import staging
+from manifest import OutputManifest
+from project_store import open_project_store, create_project_store
+
+# ===========================
+#   命令行批处理 (无界面)
+# ===========================
+# 用法:
+#   python main.py export project.json --jobs 8
+#   python cli.py export project.json --output /data/out --single-pass
+#   python main.py export project.json --mode smart          (精确剪切，只重编码首尾 GOP)
+#   python main.py convert project.json project.db       (JSON <-> SQLite 互转)
+#   python main.py list project.db --status 失败
+#   python main.py probe a.mp4 b.mkv --keyframes
+#   python main.py scan project.json /mnt/archive          (递归导入文件夹中的视频)
+#   python main.py dupes project.json                      (列出内容相同的重复素材)
+#   python main.py import project.json cuts.csv --video a.mp4  (批量导入 CSV / EDL / SRT 剪辑清单)
+#   python main.py segment project.json a.mp4 --min-len 60    (按静音 / 镜头切换自动分段)
+#   python main.py compile project.json 法师开示 --match 2024-05  (按分类把已导出的片段拼接为合辑)
+#   python main.py serve project.json --port 8765            (分布式导出：协调端)
+#   python main.py worker http://协调端:8765 --jobs 4         (分布式导出：工作端，可在多台机器上运行)
+# 退出码: 0 全部成功 / 1 有片段失败 / 2 参数或环境错误 / 130 被取消 (再次运行时从中断处继续)
+
+PROGRESS_INTERVAL = 2.0  # 汇总进度的输出间隔 (秒)
+ERROR_LINES = 5          # 失败时输出的 ffmpeg 错误行数
+EXIT_CANCELLED = 130     # 被 Ctrl+C 取消
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="main.py", description="寺院视频剪辑管理系统 - 命令行批处理")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_export = sub.add_parser("export", help="按项目文件导出全部未完成片段")
+    p_export.add_argument("project", help="项目文件 (default_project.json 格式)")
+    p_export.add_argument("--jobs", "-j", type=int, default=None, help="并发剪辑数 (默认使用项目设置)")
+    p_export.add_argument("--output", "-o", default=None, help="输出目录 (默认使用项目设置)")
+    p_export.add_argument("--mode", choices=engine.EXPORT_MODES, default=None,
+                          help="导出模式: per_clip 逐段复制 / single_pass 每个源文件只读取一次 / smart 精确剪切 (默认使用项目设置)")
+    p_export.add_argument("--single-pass", dest="mode", action="store_const", const=engine.EXPORT_MODE_SINGLE_PASS,
+                          help="等同于 --mode single_pass")
+    p_export.add_argument("--ffmpeg", default=None, help="ffmpeg 可执行文件路径")
+    p_export.add_argument("--stage", action="store_true", default=None, help="把网络共享上的源文件预读到本地再剪切")
+    p_export.add_argument("--stage-dir", default=None, help="预读暂存目录 (默认在缓存目录下)")
+    p_export.add_argument("--stage-size", type=float, default=None, help="暂存目录大小上限 (GB)")
+    p_export.add_argument("--no-save", action="store_true", help="不把片段状态写回项目文件")
+    p_export.add_argument("--force", action="store_true", help="忽略输出清单，全部重新剪切")
+    p_export.add_argument("--no-reuse", action="store_true", help="重复素材上的相同片段也各自剪切，不复用输出")
+
+    p_convert = sub.add_parser("convert", help="项目格式互转 (按扩展名识别 .json / .db)")
+    p_convert.add_argument("source", help="源项目文件")
+    p_convert.add_argument("target", help="目标项目文件")
+
+    p_list = sub.add_parser("list", help="列出片段")
+    p_list.add_argument("project", help="项目文件")
+    p_list.add_argument("--status", default=None, help="只列出该状态的片段，如 失败")
+
+    p_probe = sub.add_parser("probe", help="探测源视频信息 (结果会缓存)")
+    p_probe.add_argument("videos", nargs="+", help="视频文件")
+    p_probe.add_argument("--ffprobe", default=None, help="ffprobe 可执行文件路径")
+    p_probe.add_argument("--keyframes", action="store_true", help="输出完整关键帧时间表")
+
+    p_scan = sub.add_parser("scan", help="递归导入文件夹中的视频到项目")
+    p_scan.add_argument("project", help="项目文件")
+    p_scan.add_argument("folder", help="要扫描的文件夹")
+    p_scan.add_argument("--jobs", "-j", type=int, default=None, help="并发探测数")
+
+    p_dupes = sub.add_parser("dupes", help="按内容指纹 (大小 + 首尾数据) 列出项目中重复导入的素材")
+    p_dupes.add_argument("project", help="项目文件")
+    p_dupes.add_argument("--jobs", "-j", type=int, default=None, help="并发读取数")
+
+    p_import = sub.add_parser("import", help="批量导入剪辑清单 (CSV / EDL / SRT)")
+    p_import.add_argument("project", help="项目文件")
+    p_import.add_argument("cut_list", help="剪辑清单文件")
+    p_import.add_argument("--video", default=None, help="清单中没有指明视频的行导入到该视频")
+    p_import.add_argument("--fps", type=float, default=cutlist.DEFAULT_FPS, help="帧号时间码 (EDL) 的帧率")
+
+    p_segment = sub.add_parser("segment", help="按静音 / 镜头切换自动分段 (分析结果会缓存，调整参数时不再读文件)")
+    p_segment.add_argument("project", help="项目文件")
+    p_segment.add_argument("video", help="要分段的视频 (不在项目中时自动加入)")
+    p_segment.add_argument("--ffmpeg", default=None, help="ffmpeg 可执行文件路径")
+    p_segment.add_argument("--no-silence", action="store_true", help="不在静音处分段")
+    p_segment.add_argument("--silence-db", type=float, default=None, help="静音阈值 (dB)")
+    p_segment.add_argument("--min-silence", type=float, default=None, help="最短静音 (秒)")
+    p_segment.add_argument("--scenes", action="store_true", help="同时在镜头切换处分段")
+    p_segment.add_argument("--scene-threshold", type=float, default=None, help="镜头切换阈值 (0~1)")
+    p_segment.add_argument("--min-len", type=float, default=None, help="片段最短时长 (秒)")
+    p_segment.add_argument("--max-len", type=float, default=None, help="片段最长时长 (秒)")
+    p_segment.add_argument("--category", default="", help="生成片段的分类")
+    p_segment.add_argument("--dry-run", action="store_true", help="只列出分段结果，不写入项目")
+
+    p_compile = sub.add_parser("compile", help="按分类把已导出的片段拼接为合辑 (直接复制，编码参数不一致的片段才重编码)")
+    p_compile.add_argument("project", help="项目文件")
+    p_compile.add_argument("category", help="分类，如 法师开示")
+    p_compile.add_argument("--match", default=None, help="只收入路径包含该文字 (或匹配通配符) 的视频中的片段")
+    p_compile.add_argument("--name", default=None, help="合辑文件名 (不含扩展名，默认为分类名)")
+    p_compile.add_argument("--output", "-o", default=None, help="片段所在的输出目录 (默认使用项目设置)，合辑写入其中的 合辑 文件夹")
+    p_compile.add_argument("--ffmpeg", default=None, help="ffmpeg 可执行文件路径")
+
+    p_serve = sub.add_parser("serve", help="分布式导出协调端：把待剪切片段作为任务队列分发给工作端")
+    p_serve.add_argument("project", help="项目文件")
+    p_serve.add_argument("--host", default=distributed.DEFAULT_HOST,
+                         help="监听地址 (默认只接受本机连接；其它机器上的工作端要连接时如 0.0.0.0，须同时设置 --token)")
+    p_serve.add_argument("--token", default=os.environ.get(distributed.TOKEN_ENV),
+                         help=f"工作端须提供的共享口令 (默认读取环境变量 {distributed.TOKEN_ENV})")
+    p_serve.add_argument("--port", type=int, default=distributed.DEFAULT_PORT, help="监听端口")
+    p_serve.add_argument("--output", "-o", default=None, help="输出目录 (默认使用项目设置，须为各工作端都能访问的共享路径)")
+    p_serve.add_argument("--mode", choices=engine.EXPORT_MODES, default=None, help="导出模式 (默认使用项目设置)")
+    p_serve.add_argument("--lease", type=float, default=distributed.DEFAULT_LEASE, help="租约时长 (秒)")
+    p_serve.add_argument("--attempts", type=int, default=distributed.DEFAULT_ATTEMPTS, help="每个任务最多尝试次数")
+    p_serve.add_argument("--force", action="store_true", help="忽略输出清单，全部重新剪切")
+
+    p_worker = sub.add_parser("worker", help="分布式导出工作端：从协调端领取任务并剪切")
+    p_worker.add_argument("url", help="协调端地址，如 http://192.168.1.10:8765")
+    p_worker.add_argument("--jobs", "-j", type=int, default=engine.DEFAULT_MAX_WORKERS, help="本机并发剪辑数")
+    p_worker.add_argument("--name", default=None, help="工作端名称 (默认 主机名-进程号)")
+    p_worker.add_argument("--token", default=os.environ.get(distributed.TOKEN_ENV),
+                          help=f"协调端的共享口令 (默认读取环境变量 {distributed.TOKEN_ENV})")
+    p_worker.add_argument("--ffmpeg", default=None, help="ffmpeg 可执行文件路径")
+    p_worker.add_argument("--path-map", action="append", default=[], metavar="源前缀=本机前缀",
+                          help="各机器挂载点不同时的路径映射，可重复")
+    return parser
+
+def print_preflight(jobs, problems):
+    """输出规划阶段的预检结果：无效片段 (直接记为失败) 与提示"""
+    for job in jobs:
+        if job.rejected:
+            for clip, _ in job.items: print(f"无效: {clip['name']} ({job.vid_path}): {job.rejected}", file=sys.stderr)
+    for vid_path, clip, text in problems:
+        print(f"提示: {clip['name']} ({vid_path}): {text}", file=sys.stderr)
+    sys.stderr.flush()
+
+def cmd_export(args):
+    ffmpeg_path = args.ffmpeg or engine.find_ffmpeg()
+    if not ffmpeg_path:
+        print("错误: 未检测到 FFmpeg 组件", file=sys.stderr)
+        return 2
+    try:
+        store = open_project_store(args.project, on_error=lambda e: print(f"警告: 自动保存失败: {e}", file=sys.stderr))
+        project = store.data
+    except Exception as e:
+        print(f"错误: 项目文件读取失败: {e}", file=sys.stderr)
+        return 2
+
+    base_out = args.output or project.get("output_dir", "")
+    if not base_out:
+        print("错误: 请设置输出目录 (--output)", file=sys.stderr)
+        return 2
+    max_workers = args.jobs if args.jobs is not None else project.get("max_workers", engine.DEFAULT_MAX_WORKERS)
+
+    manifest = OutputManifest.load(base_out)
+    probe_cache = probe.ProbeCache(engine.find_ffprobe(ffmpeg_path))
+    problems = []
+    fingerprints = None if args.no_reuse else dedup.FingerprintCache().compute(list(project["videos"]), max_workers)
+    jobs, total_clips, skipped = engine.plan_jobs(project, base_out, mode=args.mode, manifest=manifest,
+                                                  force=args.force, probe_cache=probe_cache, problems=problems,
+                                                  source_fingerprints=fingerprints)
+    print_preflight(jobs, problems)
+    reused = sum(1 for job in jobs if job.reuse)
+    print(f"项目: {args.project} | 待处理任务 {len(jobs)} 个 | 片段 {total_clips} 个 (已完成 {skipped}"
+          + (f"，复用重复素材的输出 {reused}" if reused else "") + f") | 并发 {engine.clamp_workers(max_workers)}", flush=True)
+
+    print_lock = threading.Lock()
+    batch = engine.BatchProgress(jobs, total_clips, skipped)
+    last_report = {"t": 0.0}
+
+    def on_progress(job, info, batch):
+        # 汇总进度最多每 PROGRESS_INTERVAL 秒输出一行
+        with print_lock:
+            now = time.monotonic()
+            if now - last_report["t"] < PROGRESS_INTERVAL: return
+            last_report["t"] = now
+            print(engine.describe_progress(batch.snapshot()), flush=True)
+
+    def on_done(job, ok, processed, total):
+        with print_lock:
+            for clip, out_path in job.items:
+                print(f"[{processed}/{total}] {clip['status']} {out_path}" + (f" (复用 {job.reuse})" if ok and job.reuse else ""), flush=True)
+            if not ok and job.error:
+                for line in job.error.splitlines()[-ERROR_LINES:]:
+                    print(f"    {line}", file=sys.stderr)
+        if not args.no_save:
+            for clip in job.clips: store.record_status(job.vid_path, clip)
+
+    # Ctrl+C / 终止信号：结束运行中的 ffmpeg，中断的片段保持等待状态，下次导出时继续
+    control = engine.ExportControl()
+    install_cancel_handler(control)
+
+    settings = {"staging": args.stage if args.stage is not None else project.get("staging"),
+                "staging_max_gb": args.stage_size or project.get("staging_max_gb")}
+    t0 = time.time()
+    failed = engine.run_export(ffmpeg_path, jobs, total_clips, skipped, max_workers, on_done=on_done,
+                               on_progress=on_progress, batch=batch, manifest=manifest, probe_cache=probe_cache,
+                               staging=staging.from_project(settings, args.stage_dir), control=control)
+    if not args.no_save: store.close()
+    print(engine.describe_progress(batch.snapshot()), flush=True)
+    if control.cancelled:
+        print(f"已取消: 失败 {failed} 个，未完成的片段下次导出时继续，用时 {time.time() - t0:.1f} 秒", flush=True)
+        return EXIT_CANCELLED
+    print(f"处理完毕: 失败 {failed} 个，用时 {time.time() - t0:.1f} 秒", flush=True)
+    return 1 if failed else 0
+
+def cmd_convert(args):
+    if os.path.abspath(args.source) == os.path.abspath(args.target):
+        print("错误: 源文件与目标文件相同", file=sys.stderr)
+        return 2
+    try:
+        # 经由项目存储打开：JSON 项目会先回放状态日志，上次完整保存之后记录的片段状态不会丢失
+        src = open_project_store(args.source)
+        data = src.to_dict()
+        src.close()
+        create_project_store(args.target, data).close()
+    except Exception as e:
+        print(f"错误: 转换失败: {e}", file=sys.stderr)
+        return 2
+    total = sum(len(v) for v in data["videos"].values())
+    print(f"已转换: {len(data['videos'])} 个视频，{total} 个片段 -> {args.target}")
+    return 0
+
+def cmd_list(args):
+    try:
+        store = open_project_store(args.project)
+    except Exception as e:
+        print(f"错误: 项目文件读取失败: {e}", file=sys.stderr)
+        return 2
+    if args.status is not None:
+        rows = store.clips_with_status(args.status)
+    else:
+        rows = [(path, i, c) for path, clips in store.data["videos"].items() for i, c in enumerate(clips)]
+    for path, i, c in rows:
+        print(f"{c.get('status', engine.STATUS_WAITING)}\t{c['start']}-{c['end']}\t{c.get('category', '')}\t{c['name']}\t{path}#{i + 1}")
+    return 0
+
+def cmd_probe(args):
+    ffprobe_path = args.ffprobe or engine.find_ffprobe(engine.find_ffmpeg())
+    if not ffprobe_path:
+        print("错误: 未检测到 ffprobe 组件", file=sys.stderr)
+        return 2
+    cache = probe.ProbeCache(ffprobe_path)
+    failed = 0
+    for path in args.videos:
+        info = cache.get(path, keyframes=True)
+        if info is None:
+            print(f"{path}: 探测失败", file=sys.stderr)
+            failed += 1
+            continue
+        if not args.keyframes:
+            info = dict(info, keyframes=len(info.get("keyframes", [])))
+        print(json.dumps({"path": path, **info}, ensure_ascii=False))
+    return 1 if failed else 0
+
+def cmd_scan(args):
+    try:
+        store = open_project_store(args.project)
+    except Exception as e:
+        print(f"错误: 项目文件读取失败: {e}", file=sys.stderr)
+        return 2
+    videos = store.data["videos"]
+    cache = probe.ProbeCache(engine.find_ffprobe(engine.find_ffmpeg()))
+
+    def on_batch(batch):
+        for path, info in batch:
+            if path not in videos: videos[path] = []
+        print(f"已导入 {len(videos)} 个视频素材", flush=True)
+
+    found = scanner.scan_folder(args.folder, set(videos), cache, args.jobs, on_batch)
+    if found:
+        if not store.data.get("output_dir"): store.data["output_dir"] = scanner.normalize_path(args.folder)
+        store.request_save()
+    store.close()
+    print(f"扫描完成：新增 {found} 个视频素材")
+    return 0
+
+def cmd_dupes(args):
+    try:
+        store = open_project_store(args.project)
+    except Exception as e:
+        print(f"错误: 项目文件读取失败: {e}", file=sys.stderr)
+        return 2
+    videos = list(store.data["videos"])
+    store.close()
+    fingerprints = dedup.FingerprintCache().compute(videos, args.jobs)
+    groups = dedup.duplicate_groups(fingerprints, videos)
+    for group in groups:
+        print(group[0])
+        for path in group[1:]: print(f"  = {path}")
+    missing = len(videos) - len(fingerprints)
+    print(f"共 {len(videos)} 个视频素材：{len(groups)} 组重复，可省去 {sum(len(g) - 1 for g in groups)} 个"
+          + (f"，{missing} 个无法读取" if missing else ""))
+    return 0
+
+def cmd_import(args):
+    try:
+        store = open_project_store(args.project)
+    except Exception as e:
+        print(f"错误: 项目文件读取失败: {e}", file=sys.stderr)
+        return 2
+    videos = store.data["videos"]
+    default_video = None
+    if args.video:
+        default_video = scanner.normalize_path(args.video)
+        if default_video not in videos: default_video = scanner.normalize_path(os.path.abspath(args.video))
+    try:
+        grouped, errors = cutlist.load_cut_list(args.cut_list, list(videos), default_video, args.fps)
+    except cutlist.CutListError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        store.close()
+        return 2
+    for line, err in errors:
+        print(f"第 {line} 行: {err}", file=sys.stderr)
+    added, duplicates, new_videos = cutlist.apply_cut_list(store.data, grouped)
+    if added or new_videos: store.request_save()
+    store.close()
+    print(f"导入完成：新增 {added} 个片段，新增 {new_videos} 个视频，跳过重复 {duplicates} 个，错误 {len(errors)} 行")
+    return 1 if errors else 0
+
+def cmd_segment(args):
+    ffmpeg_path = args.ffmpeg or engine.find_ffmpeg()
+    if not ffmpeg_path:
+        print("错误: 未检测到 FFmpeg 组件", file=sys.stderr)
+        return 2
+    try:
+        store = open_project_store(args.project)
+    except Exception as e:
+        print(f"错误: 项目文件读取失败: {e}", file=sys.stderr)
+        return 2
+    videos = store.data["videos"]
+    vid_path = scanner.normalize_path(args.video)
+    if vid_path not in videos: vid_path = scanner.normalize_path(os.path.abspath(args.video))
+    info = probe.ProbeCache(engine.find_ffprobe(ffmpeg_path)).get(vid_path, keyframes=True)
+
+    settings = segmenter.settings_from_project(store.data)
+    overrides = {"silence_db": args.silence_db, "min_silence": args.min_silence, "scene_threshold": args.scene_threshold,
+                 "min_len": args.min_len, "max_len": args.max_len}
+    settings.update({k: v for k, v in overrides.items() if v is not None})
+    if args.no_silence: settings["use_silence"] = False
+    if args.scenes: settings["use_scenes"] = True
+
+    control = engine.ExportControl()
+    install_cancel_handler(control)
+
+    def on_progress(pts):
+        print(f"正在分析: {engine.format_time(int(pts))}", flush=True)
+
+    try:
+        analysis = segmenter.AnalysisCache().get(ffmpeg_path, vid_path, info, on_progress, control)
+    except segmenter.AnalysisError as e:
+        print(f"错误: 分析失败: {e}", file=sys.stderr)
+        store.close()
+        return 1
+    if analysis is None:
+        store.close()
+        return EXIT_CANCELLED
+    segments = segmenter.propose_segments(analysis, settings, info.get("keyframes") if info else None)
+    clips = segmenter.segments_to_clips(segments, videos.get(vid_path, []), args.category)
+    for clip in clips: print(f"{clip['start']}\t{clip['end']}\t{clip['name']}")
+    if not args.dry_run and clips:
+        if vid_path not in videos: videos[vid_path] = []
+        videos[vid_path].extend(clips)
+        store.data["auto_segment"] = settings
+        store.request_save()
+    store.close()
+    print(f"分段完成：{len(clips)} 个片段" + (" (未写入项目)" if args.dry_run else ""))
+    return 0
+
+def cmd_compile(args):
+    ffmpeg_path = args.ffmpeg or engine.find_ffmpeg()
+    if not ffmpeg_path:
+        print("错误: 未检测到 FFmpeg 组件", file=sys.stderr)
+        return 2
+    try:
+        store = open_project_store(args.project)
+    except Exception as e:
+        print(f"错误: 项目文件读取失败: {e}", file=sys.stderr)
+        return 2
+    base_out = args.output or store.data.get("output_dir", "")
+    pieces, missing = compilation.collect_pieces(store.data, args.category, base_out, match=args.match)
+    store.close()
+    for vid_path, clip, reason in missing:
+        print(f"未收入: {clip['name']} ({vid_path}): {reason}", file=sys.stderr)
+    if not pieces:
+        print(f"错误: 分类「{args.category}」中没有已导出的片段", file=sys.stderr)
+        return 2
+
+    out_path = compilation.compilation_path(base_out, args.category, args.name, os.path.splitext(pieces[0][2])[1])
+    control = engine.ExportControl()
+    install_cancel_handler(control)
+    last_report = {"t": 0.0}
+
+    def on_progress(text):
+        # 阶段变化都输出，拼接百分比最多每 PROGRESS_INTERVAL 秒输出一行
+        now = time.monotonic()
+        if text.endswith("%") and now - last_report["t"] < PROGRESS_INTERVAL: return
+        last_report["t"] = now
+        print(text, flush=True)
+
+    t0 = time.time()
+    probe_cache = probe.ProbeCache(engine.find_ffprobe(ffmpeg_path))
+    ok, tail, encoded = compilation.build_compilation(ffmpeg_path, pieces, out_path, probe_cache, on_progress, control)
+    if control.cancelled: return EXIT_CANCELLED
+    if not ok:
+        print("错误: 合辑生成失败", file=sys.stderr)
+        for line in [l for l in tail if l][-ERROR_LINES:]: print(f"    {line}", file=sys.stderr)
+        return 1
+    print(f"合辑完成: {out_path} | {len(pieces)} 个片段 (重编码 {encoded} 个)，未收入 {len(missing)} 个，"
+          f"用时 {time.time() - t0:.1f} 秒", flush=True)
+    return 0
+
+def install_cancel_handler(control):
+    """Ctrl+C / 终止信号时取消，而不是直接抛出 KeyboardInterrupt"""
+    def on_signal(signum, frame):
+        if not control.cancelled: print("正在取消...", file=sys.stderr, flush=True)
+        control.cancel()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, on_signal)
+
+def cmd_serve(args):
+    if not args.token and not distributed.is_loopback(args.host):
+        # 工作端按协调端给出的路径写文件，不能让局域网上任何机器都能领取任务、回报结果
+        print(f"错误: 监听 {args.host} 时须设置共享口令 (--token 或环境变量 {distributed.TOKEN_ENV})", file=sys.stderr)
+        return 2
+    try:
+        store = open_project_store(args.project, on_error=lambda e: print(f"警告: 自动保存失败: {e}", file=sys.stderr))
+    except Exception as e:
+        print(f"错误: 项目文件读取失败: {e}", file=sys.stderr)
+        return 2
+    base_out = args.output or store.data.get("output_dir", "")
+    if not base_out:
+        print("错误: 请设置输出目录 (--output)", file=sys.stderr)
+        return 2
+
+    manifest = OutputManifest.load(base_out)
+    problems = []
+    jobs, total_clips, skipped = engine.plan_jobs(store.data, base_out, mode=args.mode, manifest=manifest, force=args.force,
+                                                  probe_cache=probe.ProbeCache(engine.find_ffprobe(engine.find_ffmpeg())),
+                                                  problems=problems)
+    print_preflight(jobs, problems)
+    print_lock = threading.Lock()
+
+    def on_event(text):
+        with print_lock:
+            print(text, flush=True)
+
+    coordinator = distributed.Coordinator(store, jobs, total_clips, skipped, manifest,
+                                          args.lease, max(1, args.attempts), on_event)
+    stop = threading.Event()
+    control = engine.ExportControl()
+    control.on_cancel(stop.set)
+    install_cancel_handler(control)
+    last_report = {"t": 0.0}
+
+    def on_tick(status):
+        now = time.monotonic()
+        if now - last_report["t"] < PROGRESS_INTERVAL: return
+        last_report["t"] = now
+        tasks = status["tasks"]
+        on_event(f"{engine.describe_progress(status['progress'])} | 排队 {tasks.get('queued', 0)} | "
+                 f"运行 {tasks.get('leased', 0)} | 工作端 {len(status['workers'])}")
+
+    print(f"协调端: http://{args.host}:{args.port} | 任务 {len(jobs)} 个 | 片段 {total_clips} 个 (已完成 {skipped})", flush=True)
+    try:
+        distributed.serve(coordinator, args.host, args.port, on_tick, stop, args.token)
+    except OSError as e:
+        print(f"错误: 无法监听 {args.host}:{args.port}: {e}", file=sys.stderr)
+        store.close()
+        return 2
+    store.close()
+
+    status = coordinator.status()
+    for name, stats in sorted(status["workers"].items()):
+        print(f"  {name}: 任务 {stats['jobs']} 个，片段 {stats['clips']} 个，失败 {stats['failed']} 个，"
+              f"剪切耗时 {stats['busy_sec']:.1f} 秒", flush=True)
+    failed = status["progress"]["failed"]
+    if not coordinator.finished:
+        print(f"已取消: 失败 {failed} 个，未完成的片段下次继续", flush=True)
+        return EXIT_CANCELLED
+    print(f"处理完毕: 失败 {failed} 个", flush=True)
+    return 1 if failed else 0
+
+def cmd_worker(args):
+    ffmpeg_path = args.ffmpeg or engine.find_ffmpeg()
+    if not ffmpeg_path:
+        print("错误: 未检测到 FFmpeg 组件", file=sys.stderr)
+        return 2
+    try:
+        path_maps = distributed.parse_path_maps(args.path_map)
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+    print_lock = threading.Lock()
+
+    def on_event(text):
+        with print_lock:
+            print(text, flush=True)
+
+    control = engine.ExportControl()
+    install_cancel_handler(control)
+    worker = distributed.Worker(args.url, ffmpeg_path, args.jobs, args.name, path_maps,
+                                probe.ProbeCache(engine.find_ffprobe(ffmpeg_path)), on_event, control, args.token)
+    print(f"工作端 {worker.name}: 连接 {worker.url}，并发 {worker.jobs}", flush=True)
+    completed, failed = worker.run()
+    print(f"工作端结束: 完成 {completed} 个片段，失败 {failed} 个", flush=True)
+    if control.cancelled: return EXIT_CANCELLED
+    return 1 if failed else 0
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "export":
+        return cmd_export(args)
+    if args.command == "convert":
+        return cmd_convert(args)
+    if args.command == "list":
+        return cmd_list(args)
+    if args.command == "probe":
+        return cmd_probe(args)
+    if args.command == "scan":
+        return cmd_scan(args)
+    if args.command == "dupes":
+        return cmd_dupes(args)
+    if args.command == "import":
+        return cmd_import(args)
+    if args.command == "segment":
+        return cmd_segment(args)
+    if args.command == "compile":
+        return cmd_compile(args)
+    if args.command == "serve":
+        return cmd_serve(args)
+    if args.command == "worker":
+        return cmd_worker(args)
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+import os
+import shutil
+import fnmatch
+from collections import Counter
+
+import engine
+from smart_render import VIDEO_ENCODERS, AUDIO_ENCODERS, codec_encoder_args, inband_header_args, check_joins
+
+# ===========================
+#   合辑导出 (按分类拼接已剪好的片段)
+# ===========================
+# 合辑 (如某月全部 "法师开示") 直接用已导出的片段文件拼接，不再读取数 GB 的源文件：
+# 按项目顺序 (视频顺序、片段开始时间) 收集某分类中已完成的片段输出，用 ffmpeg concat 分离器直接复制拼接。
+# 直接复制要求各片段的编码参数一致；以总时长最多的一组参数为准，参数不同的片段先重编码为相同参数
+# (只重编码这几个片段)，再与其余片段一起拼接。每个片段在合辑中是一个章节，章节名为片段名。
+# 各片段的参数集 (SPS/PPS 等编码头) 一般各不相同，拼接后只保留第一个，所以要写进每个关键帧的码流：
+# H.264 由 concat 分离器自动完成；HEVC 等先把片段直接复制到带码流内参数集的临时文件 (见 smart_render.py)。
+# 有重编码或转存的片段时，拼接后在相关拼接处解码一小段检查。
+# 临时文件放在合辑旁边以合辑文件命名的临时文件夹中，结束后删除；合辑先写临时文件，成功后才改名。
+
+COMPILATION_FOLDER = "合辑"  # 合辑输出在输出目录下的这个文件夹中
+TIMESCALE_EXTENSIONS = (".mp4", ".mov")  # 重编码片段的时间基与参考片段对齐 (直接复制拼接时不必换算时间戳)
+AUTO_INBAND_CODECS = ("h264",)  # concat 分离器自动把参数集插入码流的编码 (auto_convert)
+
+class CompilationError(RuntimeError):
+    """无法生成合辑，消息为可直接展示给用户的原因"""
+
+def match_video(vid_path, pattern):
+    """视频筛选：含通配符 (* ? [) 时按通配符匹配完整路径，否则为路径中包含的文字，不区分大小写"""
+    if not pattern: return True
+    path, pattern = vid_path.replace("\\", "/").lower(), pattern.replace("\\", "/").lower()
+    if any(ch in pattern for ch in "*?["): return fnmatch.fnmatchcase(path, pattern)
+    return pattern in path
+
+def collect_pieces(project, category, output_dir=None, auto_subfolder=None, match=None):
+    """
+    按项目顺序收集某分类中已导出的片段，返回 ([(视频路径, 片段, 输出路径), ...], [(视频路径, 片段, 未收入的原因), ...])。
+    match 为视频筛选 (见 match_video)；参数为 None 时使用项目内的设置。
+    """
+    base_out = output_dir if output_dir is not None else project.get("output_dir", "")
+    if auto_subfolder is None: auto_subfolder = project.get("auto_subfolder", True)
+    pieces, missing = [], []
+    for vid_path, clips in project["videos"].items():
+        if not match_video(vid_path, match): continue
+        for clip in sorted((c for c in clips if c.get('category', "") == category), key=engine.clip_start_key):
+            out_path = engine.clip_output_path(base_out, vid_path, clip, auto_subfolder)
+            if clip.get('status') != engine.STATUS_DONE: missing.append((vid_path, clip, "片段尚未导出"))
+            elif not os.path.isfile(out_path): missing.append((vid_path, clip, f"输出文件不存在: {out_path}"))
+            else: pieces.append((vid_path, clip, out_path))
+    return pieces, missing
+
+def compilation_path(output_dir, category, name=None, ext=".mp4"):
+    return os.path.join(output_dir, COMPILATION_FOLDER, f"{name or category}{ext}")
+
+def stream_signature(info):
+    """决定能否直接复制拼接的编码参数：(视频参数或 None, 音频参数或 None)"""
+    streams = info.get("streams", [])
+    video = next((s for s in streams if s["type"] == "video"), None)
+    audio = next((s for s in streams if s["type"] == "audio"), None)
+    v = (video.get("codec"), video.get("width"), video.get("height"), video.get("pix_fmt"),
+         round(video.get("fps") or 0.0, 2)) if video else None
+    a = (audio.get("codec"), audio.get("sample_rate"), audio.get("channels")) if audio else None
+    return v, a
+
+def plan_compilation(paths, probe_cache):
+    """
+    确定参考参数与需要重编码的片段，返回 (参考片段的探测信息, [各片段是否需要重编码], [各片段时长])。
+    无法探测的片段、参考参数没有对应编码器时抛出 CompilationError。
+    """
+    infos = []
+    for path in paths:
+        info = probe_cache.get(path)
+        if info is None: raise CompilationError(f"无法读取片段的媒体信息: {path}")
+        infos.append(info)
+    signatures = [stream_signature(info) for info in infos]
+    weights = Counter()
+    for sig, info in zip(signatures, infos): weights[sig] += info.get("duration") or 0.0
+    reference = max(weights, key=lambda sig: (weights[sig], -signatures.index(sig)))
+    if reference[0] is None: raise CompilationError("片段中没有视频流")
+    conform = [sig != reference for sig in signatures]
+    if any(conform):
+        if reference[0][0] not in VIDEO_ENCODERS: raise CompilationError(f"不支持重编码为 {reference[0][0]}，无法统一片段的编码参数")
+        if reference[1] is not None and reference[1][0] not in AUDIO_ENCODERS:
+            raise CompilationError(f"不支持重编码为 {reference[1][0]}，无法统一片段的编码参数")
+    ref_info = infos[signatures.index(reference)]
+    return ref_info, conform, [info.get("duration") or 0.0 for info in infos]
+
+def build_conform_cmd(ffmpeg_path, src, info, ref_info, dst):
+    """把一个片段重编码为与参考片段相同的编码参数 (画面等比缩放后补边，缺少的音轨补静音)"""
+    (vcodec, width, height, pix_fmt, fps), audio = stream_signature(ref_info)
+    has_audio = stream_signature(info)[1] is not None
+    cmd = [ffmpeg_path, '-y', '-i', src]
+    if audio is not None and not has_audio:
+        cmd += ['-f', 'lavfi', '-i', f"anullsrc=r={audio[1]}:cl=stereo"]
+    vf = (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+          f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1")
+    if fps: vf += f",fps={fps}"
+    cmd += ['-map', '0:v:0', '-vf', vf, *codec_encoder_args(vcodec)]
+    if pix_fmt: cmd += ['-pix_fmt', pix_fmt]
+    if audio is None:
+        cmd += ['-an']
+    else:
+        cmd += ['-map', '0:a:0' if has_audio else '1:a:0', '-c:a', *AUDIO_ENCODERS[audio[0]],
+                '-ar', str(audio[1]), '-ac', str(audio[2]), '-shortest']
+    video = next(s for s in ref_info["streams"] if s["type"] == "video")
+    timescale = str(video.get("time_base") or "").partition("/")[2]
+    if timescale.isdigit() and dst.lower().endswith(TIMESCALE_EXTENSIONS): cmd += ['-video_track_timescale', timescale]
+    return cmd + [dst]
+
+def concat_entry(path):
+    """concat 列表中的一行：单引号内原样，单引号本身写作 '\\''"""
+    path = os.path.abspath(path).replace("\\", "/").replace("'", "'\\''")
+    return f"file '{path}'\n"
+
+def write_chapters(path, names, durations):
+    """ffmetadata 章节：每个片段一章，章节名为片段名"""
+    def escape(text):
+        for ch in "\\=;#\n": text = text.replace(ch, "\\" + ch)
+        return text
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(";FFMETADATA1\n")
+        t = 0
+        for name, duration in zip(names, durations):
+            end = t + int(round(duration * 1000))
+            f.write(f"[CHAPTER]\nTIMEBASE=1/1000\nSTART={t}\nEND={end}\ntitle={escape(name)}\n")
+            t = end
+
+def build_compilation(ffmpeg_path, pieces, out_path, probe_cache, on_progress=None, control=None):
+    """
+    把 collect_pieces 收集的片段拼接为 out_path，返回 (是否成功, 错误输出末尾行, 重编码的片段数)。
+    on_progress(说明) 报告当前阶段 (重编码第几个片段 / 拼接百分比)；control (engine.ExportControl) 可取消。
+    """
+    if not pieces: return False, ["没有可拼接的片段"], 0
+    paths = [path for _, _, path in pieces]
+    try:
+        ref_info, conform, durations = plan_compilation(paths, probe_cache)
+    except CompilationError as e:
+        return False, [str(e)], 0
+
+    tmp_dir = os.path.join(os.path.dirname(out_path) or ".", f".{os.path.basename(out_path)}.compile")
+    partial = engine.partial_output_path(out_path)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    try:
+        os.makedirs(tmp_dir)
+        files = list(paths)
+        encoded = sum(conform)
+        vcodec = stream_signature(ref_info)[0][0]
+        rewrap = len(paths) > 1 and vcodec not in AUTO_INBAND_CODECS and bool(inband_header_args(vcodec))
+        ext = ".mkv" if rewrap else os.path.splitext(out_path)[1]
+        done = 0
+        for i, (path, needed) in enumerate(zip(paths, conform)):
+            if not needed: continue
+            done += 1
+            if on_progress: on_progress(f"统一编码参数 {done}/{encoded}: {os.path.basename(path)}")
+            files[i] = os.path.join(tmp_dir, f"piece{i}{ext}")
+            ok, tail = engine.run_ffmpeg(build_conform_cmd(ffmpeg_path, path, probe_cache.get(path), ref_info, files[i]),
+                                         None, control)
+            if not ok: return False, tail, encoded
+        if rewrap:
+            for i, path in enumerate(paths):
+                if conform[i]: continue
+                if on_progress: on_progress(f"写入编码头 {i + 1}/{len(paths)}: {os.path.basename(path)}")
+                files[i] = os.path.join(tmp_dir, f"piece{i}{ext}")
+                ok, tail = engine.run_ffmpeg([ffmpeg_path, '-y', '-i', path, '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy',
+                                              *inband_header_args(vcodec), files[i]], None, control)
+                if not ok: return False, tail, encoded
+
+        list_path = os.path.join(tmp_dir, "pieces.txt")
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for path in files: f.write(concat_entry(path))
+        meta_path = os.path.join(tmp_dir, "chapters.txt")
+        write_chapters(meta_path, [clip['name'] for _, clip, _ in pieces], durations)
+        total = sum(durations)
+
+        def on_block(block):
+            try:
+                percent = min(99.0, int(block.get("out_time_us", "0")) / 1e6 / total * 100) if total else 0.0
+            except ValueError:
+                return
+            on_progress(f"拼接 {len(files)} 个片段 (直接复制): {percent:.0f}%")
+
+        if on_progress: on_progress(f"拼接 {len(files)} 个片段 (直接复制)")
+        cmd = [ffmpeg_path, '-y', '-f', 'concat', '-safe', '0', '-i', list_path, '-f', 'ffmetadata', '-i', meta_path,
+               '-map', '0:v:0', '-map', '0:a:0?', '-map_metadata', '1', '-map_chapters', '1', '-c', 'copy']
+        if out_path.lower().endswith(TIMESCALE_EXTENSIONS): cmd += ['-movflags', '+faststart']
+        ok, tail = engine.run_ffmpeg(cmd + [partial], on_block if on_progress else None, control)
+        if ok:
+            joins, t = [], 0.0
+            for i, duration in enumerate(durations[:-1]):
+                t += duration
+                if rewrap or conform[i] or conform[i + 1]: joins.append(t)
+            if joins and on_progress: on_progress(f"检查拼接处 ({len(joins)} 处)")
+            ok, tail = check_joins(ffmpeg_path, partial, joins, control)
+        if ok: os.replace(partial, out_path)
+        return ok, tail, encoded
+    except OSError as e:
+        return False, [str(e)], 0
+    finally:
+        engine.remove_quietly(partial)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -0,0 +1,278 @@
+import os
+import re
+import csv
+import codecs
+from collections import OrderedDict
+
+import engine
+import scanner
+from timecode import DEFAULT_FPS, SMPTE_RE, parse_timecode
+
+# ===========================
+#   批量导入剪辑清单 (CSV / EDL / SRT)
+# ===========================
+# 编辑手里的剪辑清单通常是表格、剪辑软件导出的 EDL 或字幕文件。
+# 这里逐行流式解析，一遍完成时间码校验和视频匹配，结果按视频分组；
+# 调用方用 apply_cut_list() 一次性写入项目，之后只保存一次、只刷新一次界面。
+#
+# CSV: 首行可为表头 (video/视频, start/开始, end/结束, category/分类, name/名称，顺序任意)；
+#      没有表头时按 [视频,] 开始, 结束, 分类, 名称 的顺序 (首列不是时间时视为视频列)。
+# EDL: CMX3600 格式，取每个视频事件的源入点/出点；"* FROM CLIP NAME:" 注释指明对应的视频文件。
+# SRT: 每条字幕为一个片段，字幕文字作为片段名。
+# 没有指明视频的行导入到 default_video (界面中为当前选中的视频)。
+
+SNIFF_BYTES = 64 * 1024
+MAX_NAME_LENGTH = 60
+FORMAT_CSV = "csv"
+FORMAT_EDL = "edl"
+FORMAT_SRT = "srt"
+FORMAT_EXTENSIONS = {
+    ".csv": FORMAT_CSV, ".tsv": FORMAT_CSV, ".txt": FORMAT_CSV,
+    ".edl": FORMAT_EDL,
+    ".srt": FORMAT_SRT, ".vtt": FORMAT_SRT
+}
+CSV_COLUMNS = {
+    "video": ("video", "file", "source", "path", "视频", "文件", "源文件", "素材"),
+    "start": ("start", "in", "start time", "开始", "开始时间", "入点"),
+    "end": ("end", "out", "end time", "结束", "结束时间", "出点"),
+    "category": ("category", "tag", "分类", "标签", "类别"),
+    "name": ("name", "title", "名称", "片段名", "文件名", "标题")
+}
+INVALID_NAME_CHARS = re.compile(r'[\\/:*?"<>|\r\n\t]+')
+
+class CutListError(ValueError):
+    pass
+
+def detect_format(path):
+    fmt = FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if fmt is None: raise CutListError(f"不支持的清单格式: {os.path.basename(path)} (支持 CSV / EDL / SRT)")
+    return fmt
+
+def detect_encoding(path):
+    """UTF-8 (可带 BOM) 优先；中文版 Excel 另存的 CSV 为 GBK"""
+    with open(path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+    try:
+        codecs.getincrementaldecoder('utf-8-sig')().decode(head, final=False)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'gbk'
+
+def clean_name(text):
+    """片段名会成为输出文件名，去掉文件名中不允许的字符"""
+    name = INVALID_NAME_CHARS.sub("_", str(text)).strip(" ._")
+    return name[:MAX_NAME_LENGTH].rstrip(" ._")
+
+# ===========================
+#   各格式的流式解析 (产出 {"line", "video", "start", "end", "category", "name"}，时间仍为文本)
+# ===========================
+
+def _csv_column_map(row):
+    """表头行 -> {字段: 列号}；不是表头时返回 None"""
+    mapping = {}
+    for i, cell in enumerate(row):
+        key = cell.strip().lower()
+        for field, aliases in CSV_COLUMNS.items():
+            if key in aliases and field not in mapping: mapping[field] = i
+    return mapping if "start" in mapping and "end" in mapping else None
+
+def iter_csv(path, fps=DEFAULT_FPS):
+    encoding = detect_encoding(path)
+    with open(path, 'r', encoding=encoding, newline='') as f:
+        sample = f.read(SNIFF_BYTES)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel_tab if path.lower().endswith(".tsv") else csv.excel
+        mapping = None
+        for line_no, row in enumerate(csv.reader(f, dialect), 1):
+            if not any(cell.strip() for cell in row) or row[0].lstrip().startswith("#"): continue
+            if mapping is None:
+                header = _csv_column_map(row)
+                if header is not None:
+                    mapping = header
+                    continue
+            if mapping is None:
+                # 没有表头：首列不是时间时视为视频列
+                offset = 1 if parse_timecode(row[0], fps) is None and len(row) >= 3 else 0
+                mapping = {"start": offset, "end": offset + 1, "category": offset + 2, "name": offset + 3}
+                if offset: mapping["video"] = 0
+            cell = lambda field: row[mapping[field]].strip() if field in mapping and mapping[field] < len(row) else ""
+            yield {"line": line_no, "video": cell("video"), "start": cell("start"), "end": cell("end"),
+                   "category": cell("category"), "name": cell("name")}
+
+def iter_edl(path, fps=DEFAULT_FPS):
+    """CMX3600 事件行: 编号 卷号 轨道 转场 [转场时长] 源入点 源出点 录制入点 录制出点"""
+    pending = None
+
+    def flush():
+        # 只导入视频轨事件；黑场 (BL) 没有源文件。片段名为 事件号[_注释]
+        if pending and "V" in pending["track"].upper() and pending["reel"].upper() != "BL":
+            name = f"{pending['event']}_{pending['comment']}" if pending["comment"] else pending["event"]
+            return {"line": pending["line"], "video": pending["video"], "start": pending["start"],
+                    "end": pending["end"], "category": "", "name": name}
+        return None
+
+    with open(path, 'r', encoding=detect_encoding(path)) as f:
+        for line_no, line in enumerate(f, 1):
+            text = line.strip()
+            if not text: continue
+            if text.startswith("*"):
+                if pending is None: continue
+                key, _, value = text.lstrip("* ").partition(":")
+                key, value = key.strip().upper(), value.strip()
+                if key in ("FROM CLIP NAME", "SOURCE FILE") and value and not pending["video"]: pending["video"] = value
+                elif key in ("LOC", "COMMENT") and value and not pending["comment"]:
+                    # LOC: 时间码 颜色 说明
+                    parts = value.split(None, 2) if key == "LOC" else ["", "", value]
+                    pending["comment"] = parts[2] if len(parts) > 2 else ""
+                continue
+            fields = text.split()
+            if not fields[0].isdigit(): continue  # TITLE: / FCM: 等
+            row = flush()
+            if row: yield row
+            pending = None
+            tcs = [x for x in fields if SMPTE_RE.match(x)]
+            if len(fields) < 8 or len(tcs) < 4:
+                yield {"line": line_no, "video": "", "start": "", "end": "", "category": "", "name": "",
+                       "error": "无法识别的 EDL 事件行"}
+                continue
+            pending = {"line": line_no, "event": fields[0], "reel": fields[1], "track": fields[2],
+                       "video": "", "comment": "", "start": tcs[-4], "end": tcs[-3]}
+        row = flush()
+        if row: yield row
+
+def iter_srt(path, fps=DEFAULT_FPS):
+    """字幕块: [序号] / 起 --> 止 / 文字 (可多行) / 空行"""
+    with open(path, 'r', encoding=detect_encoding(path)) as f:
+        cue, text_lines, index = None, [], 0
+
+        def make_row():
+            return {"line": cue[0], "video": "", "start": cue[1], "end": cue[2], "category": "",
+                    "name": f"{index:04d}_{clean_name(' '.join(text_lines))}".rstrip("_")}
+
+        for line_no, line in enumerate(f, 1):
+            text = line.strip()
+            if "-->" in text:
+                if cue is not None: yield make_row()
+                left, _, right = text.partition("-->")
+                index += 1
+                cue, text_lines = (line_no, left.strip(), (right.split() or [""])[0]), []
+            elif not text:
+                if cue is not None: yield make_row()
+                cue = None
+            elif cue is not None:
+                text_lines.append(re.sub(r"<[^>]+>", "", text))
+        if cue is not None: yield make_row()
+
+PARSERS = {FORMAT_CSV: iter_csv, FORMAT_EDL: iter_edl, FORMAT_SRT: iter_srt}
+
+# ===========================
+#   校验与写入
+# ===========================
+
+class VideoResolver:
+    """把清单中的视频名匹配到项目中的视频：完整路径 -> 文件名 -> 不带扩展名的文件名 -> 清单旁边的文件"""
+
+    def __init__(self, known, base_dir):
+        self.base_dir = base_dir
+        self.by_path = {scanner.normalize_path(p): p for p in known}
+        self.by_name, self.by_stem = {}, {}
+        for p in known:
+            name = os.path.basename(p).lower()
+            self.by_name.setdefault(name, p)
+            self.by_stem.setdefault(os.path.splitext(name)[0], p)
+        self.cache = {}
+
+    def resolve(self, text):
+        if text in self.cache: return self.cache[text]
+        norm = scanner.normalize_path(text)
+        name = os.path.basename(norm).lower()
+        found = self.by_path.get(norm) or self.by_name.get(name) or self.by_stem.get(os.path.splitext(name)[0])
+        if found is None:
+            candidate = norm if os.path.isabs(norm) else os.path.join(self.base_dir, norm)
+            if os.path.isfile(candidate) and candidate.lower().endswith(engine.VIDEO_EXTENSIONS):
+                found = scanner.normalize_path(os.path.abspath(candidate))
+        self.cache[text] = found
+        return found
+
+def load_cut_list(path, known_videos=(), default_video=None, fps=DEFAULT_FPS, fmt=None):
+    """
+    解析并校验剪辑清单 (一遍完成)，返回 (OrderedDict{视频路径: [片段, ...]}, [(行号, 错误说明), ...])。
+    片段时间统一格式化为 HH:MM:SS(.mmm)；清单中出现但项目中没有的视频，只要文件存在也会返回 (由调用方加入项目)。
+    没有名称的行片段名为空，由 apply_cut_list 按视频中已有的名称编号。
+    文件无法读取或格式不支持时抛出 CutListError。
+    """
+    fmt = fmt or detect_format(path)
+    resolver = VideoResolver(known_videos, os.path.dirname(os.path.abspath(path)))
+    grouped, errors = OrderedDict(), []
+    try:
+        for row in PARSERS[fmt](path, fps):
+            line = row["line"]
+            if row.get("error"):
+                errors.append((line, row["error"]))
+                continue
+            if row["video"]:
+                vid = resolver.resolve(row["video"])
+                if vid is None:
+                    errors.append((line, f"找不到视频: {row['video']}"))
+                    continue
+            elif default_video:
+                vid = default_video
+            else:
+                errors.append((line, "未指定视频 (界面中先选中目标视频，命令行使用 --video)"))
+                continue
+            s, e = parse_timecode(row["start"], fps), parse_timecode(row["end"], fps)
+            if s is None or e is None:
+                errors.append((line, f"时间格式错误: {row['start']} - {row['end']}"))
+                continue
+            if e <= s:
+                errors.append((line, f"结束时间不晚于开始时间: {row['start']} - {row['end']}"))
+                continue
+            clips = grouped.setdefault(vid, [])
+            clips.append({"start": engine.format_time(s), "end": engine.format_time(e),
+                          "category": clean_name(row["category"]),
+                          "name": clean_name(row["name"]),
+                          "status": engine.STATUS_WAITING})
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        raise CutListError(f"清单读取失败: {e}") from e
+    return grouped, errors
+
+def apply_cut_list(project, grouped):
+    """
+    把 load_cut_list 的结果一次性写入项目数据 (新视频加入列表、新分类加入分类表)，
+    与已有片段起止和名称完全相同的行跳过；没有名称的行与已有片段起止、分类相同即跳过，
+    否则命名为 clip_N (N 避开该视频已有的名称)。返回 (新增片段数, 跳过的重复数, 新增视频数)。
+    调用方随后保存一次、刷新一次界面。
+    """
+    videos = project["videos"]
+    categories = project.get("categories")
+    known_cats = set(categories) if categories is not None else None
+    added = duplicates = new_videos = 0
+    for vid, clips in grouped.items():
+        if vid not in videos:
+            videos[vid] = []
+            new_videos += 1
+        existing = videos[vid]
+        seen = {(c['start'], c['end'], c.get('category', ''), c['name']) for c in existing}
+        seen_spans = {key[:3] for key in seen}
+        taken, n = {c['name'] for c in existing}, 0
+        for clip in clips:
+            key = (clip['start'], clip['end'], clip['category'], clip['name'])
+            if key in seen or (not clip['name'] and key[:3] in seen_spans):
+                duplicates += 1
+                continue
+            if not clip['name']:
+                n += 1
+                while f"clip_{n}" in taken: n += 1
+                clip['name'] = f"clip_{n}"
+            taken.add(clip['name'])
+            seen.add((*key[:3], clip['name']))
+            seen_spans.add(key[:3])
+            existing.append(clip)
+            added += 1
+            if known_cats is not None and clip['category'] and clip['category'] not in known_cats:
+                known_cats.add(clip['category'])
+                categories.append(clip['category'])
+    return added, duplicates, new_videos
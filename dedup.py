@@ -0,0 +1,120 @@
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import engine
+
+# ===========================
+#   重复素材识别 (内容指纹)
+# ===========================
+# 同一段录像常被复制到不同文件夹、以不同路径多次导入，按路径去重识别不出来。
+# 这里给每个源文件算一个内容指纹：文件大小 + 开头、结尾各 SAMPLE_BYTES 字节的 SHA-1，
+# 每个文件只读几 MB，网络共享上的数 GB 录像也很快；按源文件身份 (路径, 大小, 修改时间) 缓存到磁盘。
+# 指纹相同的源文件视为同一段录像：界面中标记出来，导出时起止相同的片段只剪一次，其余直接硬链接或复制。
+
+FINGERPRINT_VERSION = 1
+SAMPLE_BYTES = 1024 ** 2  # 开头、结尾各读取的字节数
+
+def partial_hash(path, sample=SAMPLE_BYTES):
+    """文件大小 + 开头、结尾各 sample 字节的 SHA-1 (不大于 2*sample 的文件即为全文)，读取失败时抛出 OSError"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        h = hashlib.sha1(f"{size}|".encode('ascii'))
+        h.update(f.read(sample))
+        if size > sample:
+            f.seek(max(sample, size - sample))
+            h.update(f.read(sample))
+    return f"{size:x}-{h.hexdigest()}"
+
+def _cache_key(identity):
+    raw = f"{FINGERPRINT_VERSION}|{identity['path']}|{identity['size']}|{identity['mtime_ns']}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+class FingerprintCache:
+    """内容指纹缓存：内存一层 + 磁盘每个源文件一个 JSON，线程安全"""
+
+    def __init__(self, root=None):
+        self.root = root or engine.cache_dir("fingerprint")
+        self._mem = {}
+        self._lock = threading.Lock()
+
+    def _file(self, key):
+        return os.path.join(self.root, key[:2], key + ".json")
+
+    def peek(self, path):
+        """只查缓存，不读文件内容；文件已变化或未计算过时返回 None"""
+        try:
+            key = _cache_key(engine.file_identity(path))
+        except OSError:
+            return None
+        with self._lock:
+            if key in self._mem: return self._mem[key]
+        try:
+            with open(self._file(key), 'r', encoding='utf-8') as f:
+                fp = json.load(f)["fingerprint"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        with self._lock:
+            self._mem[key] = fp
+        return fp
+
+    def get(self, path):
+        """返回内容指纹，没有缓存时计算并写入缓存；文件无法读取时返回 None"""
+        fp = self.peek(path)
+        if fp is not None: return fp
+        try:
+            identity = engine.file_identity(path)
+            fp = partial_hash(path)
+        except OSError:
+            return None
+        key = _cache_key(identity)
+        file_path = self._file(key)
+        tmp_path = file_path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"fingerprint": fp, "source": identity}, f, ensure_ascii=False)
+            os.replace(tmp_path, file_path)
+        except OSError:
+            engine.remove_quietly(tmp_path)
+        with self._lock:
+            self._mem[key] = fp
+        return fp
+
+    def compute(self, paths, max_workers=None, cancel=None):
+        """
+        并发计算一批源文件的指纹 (已缓存的不再读取)，返回 {路径: 指纹}，无法读取的文件不在结果中。
+        cancel 为 threading.Event 时可中途取消，已算出的部分照常返回。
+        """
+        def work(path):
+            if cancel is not None and cancel.is_set(): return path, None
+            return path, self.get(path)
+
+        result = {}
+        todo = []
+        for path in paths:
+            fp = self.peek(path)
+            if fp is not None: result[path] = fp
+            else: todo.append(path)
+        if todo:
+            with ThreadPoolExecutor(max_workers=max_workers or engine.DEFAULT_MAX_WORKERS) as pool:
+                for path, fp in pool.map(work, todo):
+                    if fp is not None: result[path] = fp
+        return result
+
+def duplicate_groups(fingerprints, order=None):
+    """
+    指纹相同的源文件分组，返回 [[路径, ...], ...] (只含两个及以上的组)。
+    组内和组间按 order (默认为 fingerprints 的顺序) 排列，组内第一个视为原件。
+    """
+    groups = {}
+    for path in (order if order is not None else fingerprints):
+        fp = fingerprints.get(path)
+        if fp is not None: groups.setdefault(fp, []).append(path)
+    return [paths for paths in groups.values() if len(paths) > 1]
+
+def duplicate_map(fingerprints, order=None):
+    """{重复的源文件: 原件}，原件为同组中按 order 最靠前的文件"""
+    return {path: group[0] for group in duplicate_groups(fingerprints, order) for path in group[1:]}
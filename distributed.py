@@ -0,0 +1,469 @@
+import hashlib
+import hmac
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+import urllib.error
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import engine
+
+# ===========================
+#   多机分布式导出 (协调端 + 拉取式工作端)
+# ===========================
+# 协调端把项目的待剪切片段规划为任务队列，通过 HTTP (JSON) 对外提供：
+#   POST /lease   工作端领取任务，得到带期限的租约
+#   POST /renew   工作端定期续租 (心跳)
+#   POST /report  工作端回报结果与耗时
+#   GET  /status  查看队列与各工作端统计
+# 租约到期未续 (工作端崩溃、断网) 的任务重新排队；失败的任务重试，超过次数才记为失败。
+# 片段状态、输出清单只由协调端写入，工作端只需能访问共享存储上的源文件与输出目录。
+# 工作端按协调端给出的路径写输出，所以协调端默认只监听本机；对局域网开放时必须设置共享口令，
+# 每个请求都要在 TOKEN_HEADER 中带上同一口令 (的摘要，口令可以含中文)。
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+TOKEN_HEADER = "X-ClipFlow-Token"
+TOKEN_ENV = "CLIPFLOW_TOKEN"  # 命令行未给出 --token 时从此环境变量读取口令
+DEFAULT_LEASE = 120.0   # 租约时长 (秒)，工作端每 1/3 租约时长续租一次
+DEFAULT_ATTEMPTS = 3    # 每个任务最多尝试次数
+POLL_INTERVAL = 2.0     # 暂时没有任务时工作端的轮询间隔 (秒)
+CONNECT_RETRIES = 5     # 工作端连不上协调端时的重试次数
+DONE_GRACE = 2 * POLL_INTERVAL + 1  # 全部完成后协调端继续应答的时间，让轮询中的工作端收到结束通知
+
+# 任务状态
+TASK_QUEUED = "queued"
+TASK_LEASED = "leased"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+
+class Task:
+    def __init__(self, task_id, job):
+        self.id = task_id
+        self.job = job
+        self.state = TASK_QUEUED
+        self.attempts = 0
+        self.token = None
+        self.worker = None
+        self.deadline = 0.0
+
+    def to_wire(self):
+        return {"id": self.id, "token": self.token, "vid_path": self.job.vid_path, "mode": self.job.mode,
+                "items": [[clip, out_path] for clip, out_path in self.job.items]}
+
+class Coordinator:
+    """任务队列与租约管理，线程安全；on_event(text) 在 HTTP 线程中回调，用于输出日志"""
+
+    def __init__(self, store, jobs, total_clips, skipped=0, manifest=None,
+                 lease_seconds=DEFAULT_LEASE, max_attempts=DEFAULT_ATTEMPTS, on_event=None):
+        self.store = store
+        self.manifest = manifest
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.on_event = on_event
+        self.batch = engine.BatchProgress(jobs, total_clips, skipped)
+        self.tasks = {}
+        self.queue = deque()
+        rejected = []
+        for i, job in enumerate(jobs):
+            task = Task(str(i), job)
+            self.tasks[task.id] = task
+            if job.rejected:
+                # 规划阶段判定无效的片段不分发，直接记为失败
+                task.state = TASK_FAILED
+                rejected.append(task)
+            else:
+                self.queue.append(task.id)
+        self.workers = {}  # 工作端名 -> {"jobs", "clips", "failed", "busy_sec", "last_seen"}
+        self.leases = {}   # 令牌 -> 已租出的任务
+        self.remaining = len(self.queue)  # 尚未完成或失败的任务数
+        self.finished_at = time.monotonic() if not self.queue else None
+        self._lock = threading.Lock()
+        for task in rejected:
+            job = task.job
+            job.error = job.rejected
+            for clip in job.clips:
+                clip['status'] = engine.STATUS_FAILED
+                store.record_status(job.vid_path, clip)
+            self.batch.finish(job, False)
+            self._event(f"任务 {task.id} 无效，记为失败 ({job.rejected})")
+
+    def _event(self, text):
+        if self.on_event: self.on_event(text)
+
+    def _worker_stats(self, worker):
+        stats = self.workers.setdefault(worker, {"jobs": 0, "clips": 0, "failed": 0, "busy_sec": 0.0, "last_seen": 0.0})
+        stats["last_seen"] = time.time()
+        return stats
+
+    def lease(self, worker, limit=1):
+        """领取最多 limit 个任务，返回 (任务列表, 是否已全部结束)"""
+        self.expire()
+        leased = []
+        with self._lock:
+            self._worker_stats(worker)
+            while self.queue and len(leased) < limit:
+                task = self.tasks[self.queue.popleft()]
+                task.state = TASK_LEASED
+                task.attempts += 1
+                task.token = uuid.uuid4().hex
+                self.leases[task.token] = task
+                task.worker = worker
+                task.deadline = time.monotonic() + self.lease_seconds
+                for clip in task.job.clips: clip['status'] = engine.STATUS_RUNNING
+                leased.append(task.to_wire())
+            done = self.finished_at is not None
+        for wire in leased: self._event(f"{worker} 领取任务 {wire['id']} ({len(wire['items'])} 个片段)")
+        return leased, done
+
+    def renew(self, worker, tokens):
+        """续租，返回仍然有效的令牌 (已过期被收回的任务工作端应放弃)"""
+        valid = []
+        with self._lock:
+            self._worker_stats(worker)
+            for token in tokens:
+                task = self.leases.get(token)
+                if task is not None:
+                    task.deadline = time.monotonic() + self.lease_seconds
+                    valid.append(token)
+        return valid
+
+    def report(self, worker, task_id, token, ok, error=None, elapsed=0.0, cancelled=False):
+        """工作端回报结果；令牌不符 (租约已过期并转给别人) 时忽略，返回是否被接受"""
+        with self._lock:
+            # 任务与令牌都对得上才收回租约，错误或过时的回报不能影响正在运行的租约
+            task = self.leases.get(token) if token else None
+            if task is None or task.id != task_id: return False
+            del self.leases[token]
+            stats = self._worker_stats(worker)
+            stats["busy_sec"] += elapsed
+            if ok:
+                task.state = TASK_DONE
+                status = engine.STATUS_DONE
+            elif cancelled or task.attempts < self.max_attempts:
+                # 工作端主动取消不计入尝试次数
+                if cancelled: task.attempts -= 1
+                task.state = TASK_QUEUED
+                self.queue.append(task.id)
+                status = engine.STATUS_WAITING
+            else:
+                task.state = TASK_FAILED
+                status = engine.STATUS_FAILED
+            task.token = None
+            finished = task.state in (TASK_DONE, TASK_FAILED)
+            if finished:
+                self.remaining -= 1
+                stats["jobs"] += 1
+                stats["clips"] += len(task.job.items)
+                if not ok: stats["failed"] += len(task.job.items)
+            job = task.job
+            job.error = error
+            for clip in job.clips: clip['status'] = status
+
+        for clip in job.clips: self.store.record_status(job.vid_path, clip)
+        if self.manifest is not None:
+            for _, out_path in job.items:
+                if ok and out_path in job.fingerprints: self.manifest.record(out_path, job.fingerprints[out_path])
+                else: self.manifest.forget(out_path)
+            self.manifest.save(force=False)
+        if finished: self.batch.finish(job, ok)
+
+        if ok:
+            self._event(f"{worker} 完成任务 {task_id}，用时 {elapsed:.1f} 秒")
+        else:
+            reason = (error or "").splitlines()[-1:] or ["取消"]
+            action = "失败" if status == engine.STATUS_FAILED else "重新排队"
+            self._event(f"{worker} 任务 {task_id} 未完成 ({reason[0]})，{action}")
+        self._check_finished()
+        return True
+
+    def expire(self):
+        """收回过期租约：重新排队，超过尝试次数的记为失败"""
+        expired = []
+        with self._lock:
+            now = time.monotonic()
+            for token, task in list(self.leases.items()):
+                if task.deadline > now: continue
+                expired.append((task.id, task.worker))
+                del self.leases[token]
+                task.token = None
+                if task.attempts < self.max_attempts:
+                    task.state = TASK_QUEUED
+                    self.queue.append(task.id)
+                    status = engine.STATUS_WAITING
+                else:
+                    task.state = TASK_FAILED
+                    status = engine.STATUS_FAILED
+                    self.remaining -= 1
+                    self.batch.finish(task.job, False)
+                for clip in task.job.clips: clip['status'] = status
+        for task_id, worker in expired: self._event(f"任务 {task_id} 的租约已过期 (工作端 {worker})")
+        if expired: self._check_finished()
+
+    def _check_finished(self):
+        with self._lock:
+            if self.finished_at is None and self.remaining == 0: self.finished_at = time.monotonic()
+
+    def abandon(self):
+        """协调端提前退出时，把已租出未回报的片段恢复为等待，下次继续"""
+        with self._lock:
+            leased = list(self.leases.values())
+            self.leases.clear()
+            for task in leased:
+                task.state = TASK_QUEUED
+                task.token = None
+                for clip in task.job.clips: clip['status'] = engine.STATUS_WAITING
+        for task in leased:
+            for clip in task.job.clips: self.store.record_status(task.job.vid_path, clip)
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    def status(self):
+        with self._lock:
+            counts = {}
+            for task in self.tasks.values(): counts[task.state] = counts.get(task.state, 0) + 1
+            workers = {name: dict(stats) for name, stats in self.workers.items()}
+        return {"tasks": counts, "progress": self.batch.snapshot(), "workers": workers, "finished": self.finished}
+
+# ===========================
+#      协调端 HTTP 服务
+# ===========================
+
+def token_digest(secret):
+    return hashlib.sha256(secret.encode('utf-8')).hexdigest()
+
+def is_loopback(host):
+    return host in ("localhost", "::1") or host.startswith("127.")
+
+def make_server(coordinator, host=DEFAULT_HOST, port=DEFAULT_PORT, secret=None):
+    """secret 不为空时，没有带上相同口令的请求一律拒绝 (403)"""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass  # 由协调端自行输出日志
+
+        def _reply(self, data, code=200):
+            body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _authorized(self):
+            if not secret: return True
+            # 请求头按 latin-1 解码，编码回字节再比较，任意内容都不会出错
+            if hmac.compare_digest(self.headers.get(TOKEN_HEADER, "").encode('latin-1'), token_digest(secret).encode()): return True
+            self._reply({"error": "forbidden"}, 403)
+            return False
+
+        def do_GET(self):
+            if not self._authorized(): return
+            if self.path == "/status": return self._reply(coordinator.status())
+            self._reply({"error": "not found"}, 404)
+
+        def do_POST(self):
+            if not self._authorized(): return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                req = json.loads(self.rfile.read(length) or b"{}")
+                worker = str(req.get("worker") or self.client_address[0])
+            except (ValueError, TypeError):
+                return self._reply({"error": "bad request"}, 400)
+            if self.path == "/lease":
+                jobs, done = coordinator.lease(worker, max(1, int(req.get("limit", 1))))
+                return self._reply({"jobs": jobs, "done": done, "lease_seconds": coordinator.lease_seconds})
+            if self.path == "/renew":
+                return self._reply({"valid": coordinator.renew(worker, set(req.get("tokens", [])))})
+            if self.path == "/report":
+                accepted = coordinator.report(worker, req.get("id"), req.get("token"), bool(req.get("ok")),
+                                              req.get("error"), float(req.get("elapsed") or 0.0), bool(req.get("cancelled")))
+                return self._reply({"accepted": accepted})
+            self._reply({"error": "not found"}, 404)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+def serve(coordinator, host=DEFAULT_HOST, port=DEFAULT_PORT, on_tick=None, stop=None, secret=None):
+    """
+    运行协调端直到全部任务结束 (或 stop 事件被设置)。
+    on_tick(status) 每秒调用一次，用于输出进度；secret 为工作端须提供的共享口令。
+    """
+    server = make_server(coordinator, host, port, secret)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        while stop is None or not stop.is_set():
+            coordinator.expire()
+            if on_tick: on_tick(coordinator.status())
+            if coordinator.finished and time.monotonic() - coordinator.finished_at > DONE_GRACE: break
+            time.sleep(1.0)
+    finally:
+        server.shutdown()
+        server.server_close()
+        if not coordinator.finished: coordinator.abandon()
+        if coordinator.manifest is not None: coordinator.manifest.save()
+
+# ===========================
+#      工作端
+# ===========================
+
+def parse_path_maps(specs):
+    """把 ["源前缀=本机前缀", ...] 解析为 [(源前缀, 本机前缀)]"""
+    maps = []
+    for spec in specs or []:
+        src, sep, dst = spec.partition("=")
+        if not sep or not src: raise ValueError(f"路径映射格式应为 源前缀=本机前缀: {spec}")
+        maps.append((src, dst))
+    return maps
+
+def map_path(path, maps):
+    """按前缀把协调端的路径换成本机路径 (各机器挂载点不同时使用)"""
+    for src, dst in maps:
+        if path.startswith(src):
+            path = dst + path[len(src):]
+            break
+    if os.sep == "/": path = path.replace("\\", "/")
+    return path
+
+class Worker:
+    """
+    拉取式工作端：jobs 个线程各自循环 "领取 -> 剪切 -> 回报"，另有一个线程为运行中的任务续租。
+    续租时协调端不再认可的令牌 (租约已过期、任务已转给别的工作端) 立即中止对应任务，不再回报。
+    on_event(text) 用于输出日志；control (engine.ExportControl) 可取消运行中的任务；secret 为协调端的共享口令。
+    """
+
+    def __init__(self, url, ffmpeg_path, jobs=1, name=None, path_maps=None, probe_cache=None, on_event=None, control=None,
+                 secret=None):
+        self.url = url.rstrip("/")
+        self.secret = secret
+        self.ffmpeg_path = ffmpeg_path
+        self.jobs = engine.clamp_workers(jobs)
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.path_maps = path_maps or []
+        self.probe_cache = probe_cache
+        self.on_event = on_event
+        self.control = control or engine.ExportControl()
+        self.lease_seconds = DEFAULT_LEASE
+        self.completed = 0
+        self.failed = 0
+        self._active = {}  # 运行中任务的令牌 -> 该任务的 ExportControl
+        self._revoked = set()  # 租约已被协调端收回的令牌
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.control.on_cancel(self._cancel_active)
+
+    def _cancel_active(self):
+        with self._lock:
+            controls = list(self._active.values())
+        for control in controls: control.cancel()
+
+    def _event(self, text):
+        if self.on_event: self.on_event(text)
+
+    def _call(self, endpoint, payload):
+        """POST 一次；连接失败时重试 CONNECT_RETRIES 次，仍失败则抛出 OSError"""
+        payload = dict(payload, worker=self.name)
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        headers = {"Content-Type": "application/json"}
+        if self.secret: headers[TOKEN_HEADER] = token_digest(self.secret)
+        for attempt in range(CONNECT_RETRIES):
+            try:
+                req = urllib.request.Request(self.url + endpoint, data=data, headers=headers)
+                with urllib.request.urlopen(req, timeout=30) as resp:
+                    return json.loads(resp.read())
+            except urllib.error.HTTPError as e:
+                # 口令不符时重试也没有用
+                if e.code == 403: raise OSError("协调端拒绝访问: 口令不符 (--token)")
+                if attempt == CONNECT_RETRIES - 1 or self.control.cancelled: raise OSError(f"无法连接协调端: {e}")
+                time.sleep(POLL_INTERVAL)
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                if attempt == CONNECT_RETRIES - 1 or self.control.cancelled: raise OSError(f"无法连接协调端: {e}")
+                time.sleep(POLL_INTERVAL)
+
+    def _heartbeat(self):
+        # 续租间隔取协调端告知的租约时长 (领取任务后才知道)，所以按短间隔检查是否到期
+        last = time.monotonic()
+        while not self._stop.wait(min(POLL_INTERVAL, self.lease_seconds / 3)):
+            if time.monotonic() - last < self.lease_seconds / 3: continue
+            last = time.monotonic()
+            with self._lock:
+                tokens = list(self._active)
+            if not tokens: continue
+            try:
+                valid = set(self._call("/renew", {"tokens": tokens}).get("valid") or [])
+            except OSError:
+                continue  # 暂时连不上协调端时继续剪切，租约是否过期由协调端判定
+            for token in tokens:
+                if token in valid: continue
+                with self._lock:
+                    control = self._active.get(token)
+                    if control is not None: self._revoked.add(token)
+                if control is not None: control.cancel()
+
+    def _run_one(self, wire):
+        items = [(clip, map_path(out_path, self.path_maps)) for clip, out_path in wire["items"]]
+        job = engine.ExportJob(map_path(wire["vid_path"], self.path_maps), items, wire.get("mode") or engine.EXPORT_MODE_PER_CLIP)
+        job.partial_tag = wire["token"]
+        control = engine.ExportControl()
+        with self._lock:
+            self._active[wire["token"]] = control
+        if self.control.cancelled: control.cancel()
+        t0 = time.monotonic()
+        try:
+            ok = engine.run_job(self.ffmpeg_path, job, probe_cache=self.probe_cache, control=control)
+        finally:
+            with self._lock:
+                self._active.pop(wire["token"], None)
+                revoked = wire["token"] in self._revoked
+                self._revoked.discard(wire["token"])
+        elapsed = time.monotonic() - t0
+        if revoked and not self.control.cancelled:
+            # 任务已转给别的工作端，回报也会被忽略
+            self._event(f"任务 {wire['id']} 的租约已被协调端收回，放弃 ({elapsed:.1f} 秒)")
+            return
+        cancelled = not ok and control.cancelled
+        self._call("/report", {"id": wire["id"], "token": wire["token"], "ok": ok, "error": job.error,
+                               "elapsed": elapsed, "cancelled": cancelled})
+        with self._lock:
+            if ok: self.completed += len(items)
+            elif not cancelled: self.failed += len(items)
+        for clip, out_path in items:
+            self._event(f"{clip['status']} {out_path} ({elapsed:.1f} 秒)")
+
+    def _loop(self):
+        while not self.control.cancelled:
+            try:
+                resp = self._call("/lease", {"limit": 1})
+            except OSError as e:
+                self._event(str(e))
+                return
+            self.lease_seconds = float(resp.get("lease_seconds") or DEFAULT_LEASE)
+            if not resp.get("jobs"):
+                if resp.get("done"): return
+                time.sleep(POLL_INTERVAL)
+                continue
+            for wire in resp["jobs"]:
+                try:
+                    self._run_one(wire)
+                except OSError as e:
+                    self._event(str(e))
+                    return
+
+    def run(self):
+        """运行到协调端通知全部完成、连不上协调端或被取消，返回 (完成片段数, 失败片段数)"""
+        beat = threading.Thread(target=self._heartbeat, daemon=True)
+        beat.start()
+        threads = [threading.Thread(target=self._loop, daemon=True) for _ in range(self.jobs)]
+        for t in threads: t.start()
+        for t in threads:
+            while t.is_alive(): t.join(0.5)  # 分段等待，主线程能及时响应 Ctrl+C
+        self._stop.set()
+        return self.completed, self.failed
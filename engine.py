@@ -0,0 +1,790 @@
+import subprocess
+import os
+import json
+import threading
+import sys
+import platform
+import shutil
+import time
+import bisect
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from timecode import ClipSpan, TimecodeError, parse_timecode, format_timecode
+
+# ===========================
+#   批量导出引擎 (不依赖任何界面组件)
+# ===========================
+# 图形界面 (main.py) 与命令行 (cli.py) 共用此模块：
+# 项目读写、任务规划、ffmpeg 执行都在这里完成。
+
+# --- 片段状态 ---
+STATUS_WAITING = "等待"
+STATUS_RUNNING = "处理中..."
+STATUS_DONE = "完成"
+STATUS_FAILED = "失败"
+
+# --- 定制化：佛教寺院常用分类 ---
+DEFAULT_CATEGORIES = [
+    "法师开示",
+    "经典讲座",
+    "法会记录",
+    "早晚课诵",
+    "义工活动",
+    "禅修剪影",
+    "参访交流",
+    "其他素材"
+]
+
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".mov", ".avi", ".flv", ".ts")
+
+# 默认并发剪辑数 (stream copy 主要受磁盘限制，默认不宜过大)
+DEFAULT_MAX_WORKERS = max(1, min(4, os.cpu_count() or 1))
+MAX_WORKERS_LIMIT = 32
+# 导出模式: 逐段剪切 / 每个源文件只读取一次 (单进程多输出) / 精确剪切 (只重编码首尾 GOP，见 smart_render.py)
+EXPORT_MODE_PER_CLIP = "per_clip"
+EXPORT_MODE_SINGLE_PASS = "single_pass"
+EXPORT_MODE_SMART = "smart"
+EXPORT_MODES = (EXPORT_MODE_PER_CLIP, EXPORT_MODE_SINGLE_PASS, EXPORT_MODE_SMART)
+# 直接复制剪切的编码参数 (也参与输出指纹计算)
+CUT_ARGS = ('-c', 'copy', '-avoid_negative_ts', '1')
+# 单次读取模式的输出指纹参数 (各输出的起点由输出端 seek 对齐到关键帧，与逐段剪切的输出分开记录)
+SINGLE_PASS_FINGERPRINT_ARGS = CUT_ARGS + ('single_pass', 1)
+# 单次读取模式中输出端 -ss 提前到关键帧之前的秒数 (不超过与前一个关键帧间隔的一半)：
+# 输出端按解码时间戳丢弃数据包，有 B 帧时关键帧的解码时间早于显示时间，-ss 恰好落在关键帧上会把它丢掉
+KEYFRAME_LEAD = 0.25
+# 网络源文件预读缓存的默认总大小上限 (GB)
+DEFAULT_STAGING_GB = 50
+# 失败时保留的 ffmpeg 错误输出行数
+STDERR_TAIL_LINES = 40
+# 剪切过程中输出写到带此标记的临时文件，成功后才改为正式文件名
+PARTIAL_TAG = ".clipflow-part"
+# 取消时先请求 ffmpeg 退出，超过此时间 (秒) 仍未退出则强制结束
+TERMINATE_TIMEOUT = 5.0
+# 片段结束时间超出源视频时长不超过此值 (秒) 时不提示
+END_TOLERANCE = 0.05
+
+# ===========================
+#      项目文件
+# ===========================
+
+def new_project():
+    """返回一个空白项目 (与 default_project.json 结构一致)"""
+    return {
+        "output_dir": "",
+        "auto_subfolder": True,
+        "videos": {},
+        "categories": DEFAULT_CATEGORIES.copy(),
+        "max_workers": DEFAULT_MAX_WORKERS,
+        "export_mode": EXPORT_MODE_PER_CLIP,
+        "staging": False,
+        "staging_max_gb": DEFAULT_STAGING_GB
+    }
+
+def load_project(file_path):
+    """读取项目文件并补全缺省字段，读取失败时抛出异常"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    for key, value in new_project().items():
+        data.setdefault(key, value)
+    return data
+
+def save_project(file_path, data):
+    """先写临时文件再原子替换，写入中途崩溃不会损坏原项目文件"""
+    tmp_path = file_path + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        remove_quietly(tmp_path)
+        raise
+
+def clamp_workers(n):
+    try:
+        n = int(n)
+    except (TypeError, ValueError):
+        n = DEFAULT_MAX_WORKERS
+    return max(1, min(MAX_WORKERS_LIMIT, n))
+
+def cache_dir(name):
+    """本地缓存目录 (探测结果、缩略图等)，可用环境变量 CLIPFLOW_CACHE_DIR 指定位置"""
+    root = os.environ.get("CLIPFLOW_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".templeclipflow", "cache")
+    path = os.path.join(root, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def file_identity(path):
+    """源文件身份 (路径, 大小, 修改时间)，任一变化都视为不同的文件"""
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+# ===========================
+#      FFmpeg 与时间工具
+# ===========================
+
+def find_ffmpeg():
+    """优先使用软件目录下的 ffmpeg，其次使用系统 PATH 中的"""
+    if getattr(sys, 'frozen', False):
+        base = os.path.dirname(sys.executable)
+    else:
+        base = os.path.dirname(os.path.abspath(__file__))
+
+    local = os.path.join(base, "ffmpeg.exe")
+    if platform.system() != "Windows": local = os.path.join(base, "ffmpeg")
+
+    if os.path.exists(local): return local
+    from shutil import which
+    return which("ffmpeg")
+
+def find_ffprobe(ffmpeg_path=None):
+    """ffprobe 通常与 ffmpeg 放在同一目录"""
+    if ffmpeg_path:
+        folder, name = os.path.split(ffmpeg_path)
+        local = os.path.join(folder, name.replace("ffmpeg", "ffprobe"))
+        if local != ffmpeg_path and os.path.exists(local): return local
+    from shutil import which
+    return which("ffprobe")
+
+def subprocess_kwargs():
+    """Windows 下隐藏子进程的控制台窗口，其他平台无需处理"""
+    if platform.system() != "Windows": return {}
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return {"startupinfo": startupinfo}
+
+def parse_time(text):
+    """将时间文本 (HH:MM:SS(.ms) / MM:SS / 秒数 / 帧号时间码，见 timecode.py) 转为秒，无法解析时返回 None"""
+    return parse_timecode(text)
+
+def format_time(secs):
+    """秒数转为 HH:MM:SS，带小数时保留毫秒"""
+    return format_timecode(secs)
+
+def clip_times(clip):
+    """交给 ffmpeg 的 (开始, 结束) 规范文本；无法解析的原样返回 (规划阶段已拒绝这类片段)"""
+    try:
+        return ClipSpan.from_clip(clip).texts()
+    except TimecodeError:
+        return clip['start'], clip['end']
+
+def clips_overlap(clips):
+    """判断一组片段时间段是否存在重叠 (无法解析的时间视为重叠)"""
+    spans = []
+    for c in clips:
+        s, e = parse_time(c['start']), parse_time(c['end'])
+        if s is None or e is None or e <= s: return True
+        spans.append((s, e))
+    spans.sort()
+    return any(spans[i][1] > spans[i+1][0] for i in range(len(spans) - 1))
+
+# ===========================
+#      任务规划与执行
+# ===========================
+
+class ExportJob:
+    """一次 ffmpeg 调用：一个源视频及其要输出的 [(片段, 输出路径), ...]"""
+
+    def __init__(self, vid_path, items, mode=EXPORT_MODE_PER_CLIP):
+        self.vid_path = vid_path
+        self.items = items
+        self.mode = mode
+        self.input_path = None  # 实际读取的文件 (预读到本地的副本)，None 时直接读源文件
+        self.error = None  # 失败时 ffmpeg 错误输出的末尾部分
+        self.rejected = None  # 规划阶段判定无效时的原因，这类任务不启动 ffmpeg
+        self.fingerprints = {}  # 输出路径 -> 输出指纹 (使用输出清单时)
+        self.reuse = None  # 复用任务：内容与之相同的已有输出路径，直接硬链接或复制，不启动 ffmpeg
+        self.after = None  # 复用同一批中剪出的输出时，剪出它的任务
+        self.partial_tag = None  # 临时输出文件名的附加标记 (分布式工作端为租约令牌，同一片段被重新分发时互不覆盖)
+
+    @property
+    def clips(self):
+        return [clip for clip, _ in self.items]
+
+    @property
+    def media_seconds(self):
+        """本任务要输出的总时长 (秒)，无法解析的片段按 0 计；复用任务不需要剪切，按 0 计"""
+        total = 0.0
+        if self.reuse: return total
+        for clip in self.clips:
+            s, e = parse_time(clip['start']), parse_time(clip['end'])
+            if s is not None and e is not None and e > s: total += e - s
+        return total
+
+def clip_output_path(base_out, vid_path, clip, auto_subfolder=True):
+    vid_name, ext = os.path.splitext(os.path.basename(vid_path))
+    final_dir = base_out
+    if auto_subfolder: final_dir = os.path.join(final_dir, vid_name)
+    if clip.get('category'): final_dir = os.path.join(final_dir, clip['category'])
+    return os.path.join(final_dir, f"{clip['name']}{ext}")
+
+def clip_start_key(clip):
+    start = parse_time(clip['start'])
+    return start if start is not None else float("inf")
+
+def output_key(path):
+    """判断两个输出路径是否为同一文件 (Windows 不区分大小写)"""
+    return os.path.normcase(os.path.abspath(path))
+
+def reuse_key(content, clip, out_path, cut_args=None):
+    """内容相同的源文件 (content 为 dedup.py 的内容指纹) 上起止相同、剪切参数与封装格式相同的片段，输出相同"""
+    start, end = clip_times(clip)
+    return (content, start, end, os.path.splitext(out_path)[1].lower(), tuple(cut_args or CUT_ARGS))
+
+def reject_job(vid_path, clip, out_path, mode, reason):
+    """规划阶段判定无效的片段：不会启动 ffmpeg，执行时直接记为失败"""
+    job = ExportJob(vid_path, [(clip, out_path)], mode)
+    job.rejected = reason
+    return job
+
+def plan_jobs(project, output_dir=None, auto_subfolder=None, mode=None, manifest=None, force=False,
+              probe_cache=None, problems=None, source_fingerprints=None):
+    """
+    规划整个项目的导出任务，mode 为 EXPORT_MODES 之一。
+    返回 (任务列表, 片段总数, 已完成跳过数)；参数为 None 时使用项目内的设置。
+    传入输出清单 (manifest.OutputManifest) 时按指纹判断是否跳过：
+    输出文件仍在且指纹一致的片段跳过，其余 (包括状态为完成但输出已丢失或已修改的) 重新剪切。
+    force=True 时全部重新剪切。
+
+    规划前对整个项目做一遍预检，不启动任何 ffmpeg：
+    源文件不存在、时间无法解析、起止颠倒、开始时间超出源视频时长 (probe_cache 中已缓存时长时)、
+    与前面的片段输出到同一文件的片段规划为 rejected 任务，执行时直接记为失败并给出原因。
+    片段时间重叠、结束时间超出视频时长只作提示：传入列表 problems 时追加 (视频路径, 片段, 说明)。
+
+    传入 source_fingerprints ({视频路径: 内容指纹}，见 dedup.py) 时，内容相同的源文件上起止相同的片段只剪一次，
+    其余规划为复用任务 (job.reuse)：优先复用输出清单中仍然有效的输出，否则复用本批中第一个相同片段的输出，
+    run_export 在剪切任务全部结束后再执行复用任务。
+    """
+    base_out = output_dir if output_dir is not None else project.get("output_dir", "")
+    if auto_subfolder is None: auto_subfolder = project.get("auto_subfolder", True)
+    if mode is None: mode = project.get("export_mode", EXPORT_MODE_PER_CLIP)
+    cut_args = None
+    if mode == EXPORT_MODE_SMART:
+        from smart_render import FINGERPRINT_ARGS
+        cut_args = FINGERPRINT_ARGS
+    elif mode == EXPORT_MODE_SINGLE_PASS:
+        cut_args = SINGLE_PASS_FINGERPRINT_ARGS
+
+    all_videos = project["videos"]
+    # 第一遍：全部输出路径，同名时由项目中靠前的片段占用
+    outputs, owners = {}, {}
+    for vid_path, clips in all_videos.items():
+        outputs[vid_path] = [clip_output_path(base_out, vid_path, clip, auto_subfolder) for clip in clips]
+        for clip, out_path in zip(clips, outputs[vid_path]):
+            owners.setdefault(output_key(out_path), (vid_path, clip))
+
+    total_clips = sum(len(v) for v in outputs.values())
+    planned = []   # [(视频路径, 无效任务, 待剪切的 (片段, 输出路径), 输出指纹)]
+    produced = {}  # 复用键 -> (仍然有效的输出路径, None)
+    skipped = 0
+    for vid_path, clips in all_videos.items():
+        content = source_fingerprints.get(vid_path) if source_fingerprints else None
+        exists = os.path.exists(vid_path)
+        identity = None
+        if exists and manifest is not None:
+            try:
+                identity = file_identity(vid_path)
+            except OSError:
+                exists = False
+        info = probe_cache.peek(vid_path) if exists and probe_cache is not None else None
+        duration = info.get("duration") if info else None
+
+        pending, rejected, spans = [], [], []
+        fingerprints = {}
+        for clip, out_path in zip(clips, outputs[vid_path]):
+            if not exists:
+                if clip.get('status') == STATUS_DONE and not force: skipped += 1
+                else: rejected.append(reject_job(vid_path, clip, out_path, mode, f"源文件不存在: {vid_path}"))
+                continue
+            try:
+                span = ClipSpan.from_clip(clip)
+            except TimecodeError as e:
+                span, reason = None, str(e)
+            else:
+                owner_vid, owner = owners[output_key(out_path)]
+                reason = None
+                if owner is not clip:
+                    reason = f"输出文件与 {os.path.basename(owner_vid)} 中的片段「{owner['name']}」相同: {out_path}"
+                elif duration and span.start >= duration:
+                    reason = f"开始时间超出视频时长 ({format_time(duration)})"
+                else:
+                    spans.append((span, clip))
+            if manifest is not None and span is not None:
+                fp = manifest.fingerprint(identity, clip, out_path, cut_args)
+                fingerprints[out_path] = fp
+                if not force and reason is None and (manifest.is_fresh(out_path, fp) or
+                                  (clip.get('status') == STATUS_DONE and not manifest.has_entry(out_path) and manifest.adopt(out_path, fp))):
+                    clip['status'] = STATUS_DONE
+                    skipped += 1
+                    if content: produced.setdefault(reuse_key(content, clip, out_path, cut_args), (out_path, None))
+                    continue
+            elif clip.get('status') == STATUS_DONE and not force:
+                skipped += 1
+                continue
+            if reason is not None:
+                rejected.append(reject_job(vid_path, clip, out_path, mode, reason))
+                continue
+            if problems is not None and duration and span.end > duration + END_TOLERANCE:
+                problems.append((vid_path, clip, f"结束时间超出视频时长 ({format_time(duration)})，将截止到视频结尾"))
+            pending.append((clip, out_path))
+
+        if problems is not None:
+            # 时间重叠的片段 (合法，但多半是输错了)，按开始时间扫描一遍
+            spans.sort(key=lambda item: item[0].start)
+            latest = None
+            for span, clip in spans:
+                if latest is not None and span.overlaps(latest[0]):
+                    problems.append((vid_path, clip, f"与片段「{latest[1]['name']}」时间重叠"))
+                if latest is None or span.end > latest[0].end: latest = (span, clip)
+        planned.append((vid_path, rejected, pending, fingerprints))
+
+    # 重复素材上的相同片段：清单中已有的输出优先，其次为项目顺序中的第一个
+    reused = {}  # id(片段) -> (被复用的输出路径, 被复用的片段 或 None)
+    if source_fingerprints:
+        for vid_path, _, pending, _ in planned:
+            content = source_fingerprints.get(vid_path)
+            if not content: continue
+            for clip, out_path in pending:
+                owner = produced.setdefault(reuse_key(content, clip, out_path, cut_args), (out_path, clip))
+                if owner[1] is not clip: reused[id(clip)] = owner
+
+    jobs, reuse_jobs, cut_by = [], [], {}
+    for vid_path, rejected, pending, fingerprints in planned:
+        # 按开始时间排序，同一源文件顺序读取
+        cut = sorted((item for item in pending if id(item[0]) not in reused), key=lambda item: clip_start_key(item[0]))
+
+        # 片段有重叠时回退到逐段剪切
+        if mode == EXPORT_MODE_SINGLE_PASS and len(cut) > 1 and not clips_overlap([c for c, _ in cut]):
+            vid_jobs = [ExportJob(vid_path, cut, mode)]
+        else:
+            vid_jobs = [ExportJob(vid_path, [item], mode) for item in cut]
+        for job in vid_jobs:
+            for clip in job.clips: cut_by[id(clip)] = job
+        vid_reuse = []
+        for clip, out_path in pending:
+            if id(clip) not in reused: continue
+            source, owner = reused[id(clip)]
+            job = ExportJob(vid_path, [(clip, out_path)], mode)
+            job.reuse = source
+            job.after = cut_by.get(id(owner)) if owner is not None else None
+            vid_reuse.append(job)
+        for job in vid_jobs + vid_reuse:
+            job.fingerprints = {out: fingerprints[out] for _, out in job.items if out in fingerprints}
+        jobs.extend(rejected)
+        jobs.extend(vid_jobs)
+        reuse_jobs.extend(vid_reuse)
+    jobs.extend(reuse_jobs)
+    return jobs, total_clips, skipped
+
+def keyframe_seek(keyframes, start):
+    """
+    单次读取模式中一个输出的 -ss：start 之前最近的关键帧再提前一点 (见 KEYFRAME_LEAD)。
+    输出端 seek 之后、关键帧之前的视频包会被丢弃，画面与逐段剪切 (输入端 seek) 一样从该关键帧开始。
+    """
+    i = bisect.bisect_right(keyframes, start + 1e-6)
+    if not i: return 0.0
+    kf = keyframes[i - 1]
+    prev = keyframes[i - 2] if i > 1 else 0.0
+    return max(0.0, kf - min(KEYFRAME_LEAD, (kf - prev) / 2))
+
+def build_cut_cmd(ffmpeg_path, vid_path, items, keyframes=None):
+    """
+    构建剪切命令：单个片段用输入端快速 seek；多个片段共用一次输入，各输出自带 -ss/-to。
+    多个片段时需要源文件的关键帧表 keyframes，各输出的起点按 keyframe_seek 对齐到关键帧。
+    """
+    if len(items) == 1:
+        clip, out_path = items[0]
+        start, end = clip_times(clip)
+        return [ffmpeg_path, '-y', '-ss', start, '-to', end, '-i', vid_path, *CUT_ARGS, out_path]
+
+    # 读到最后一个片段结束即停止，不必扫完整个源文件
+    last_end = max(parse_time(c['end']) for c, _ in items)
+    cmd = [ffmpeg_path, '-y', '-to', f"{last_end:.3f}", '-i', vid_path]
+    for clip, out_path in items:
+        _, end = clip_times(clip)
+        cmd += ['-ss', f"{keyframe_seek(keyframes, parse_time(clip['start'])):.3f}", '-to', end, *CUT_ARGS, out_path]
+    return cmd
+
+def parse_progress(block, job):
+    """
+    解析一段 ffmpeg -progress 输出 (key=value)。
+    多输出时 ffmpeg 报告的是第一个输出的时钟，这里只作近似，结束前不超过 99%。
+    """
+    try:
+        out_time = max(0.0, int(block.get("out_time_us", "0")) / 1e6)
+    except ValueError:
+        out_time = 0.0
+    try:
+        total_size = int(block.get("total_size", "0"))
+    except ValueError:
+        total_size = 0
+    try:
+        speed = float(block.get("speed", "").rstrip("x"))
+    except ValueError:
+        speed = None
+
+    media = job.media_seconds
+    if len(job.items) > 1:
+        last_end = max(parse_time(c['end']) or 0.0 for c in job.clips)
+        out_time = min(out_time, last_end) * (media / last_end) if last_end else 0.0
+    finished = block.get("progress") == "end"
+    percent = 100.0 if finished else (min(99.0, out_time / media * 100) if media else 0.0)
+    return {"out_time": min(out_time, media) if media else out_time, "total_size": total_size,
+            "speed": speed, "percent": percent}
+
+def partial_output_path(out_path, tag=None):
+    """剪切中的临时输出路径 (保留扩展名，ffmpeg 按扩展名选择封装格式)；tag 用于区分同时剪切同一输出的多个进程"""
+    root, ext = os.path.splitext(out_path)
+    return f"{root}{PARTIAL_TAG}{'-' + tag if tag else ''}{ext}"
+
+def remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def link_output(source, dst):
+    """复用相同的输出：硬链接 (同一卷上瞬间完成、不占空间)，跨卷或文件系统不支持时复制；返回 (是否成功, 错误信息行)"""
+    remove_quietly(dst)
+    try:
+        try:
+            os.link(source, dst)
+        except OSError:
+            shutil.copyfile(source, dst)
+    except OSError as e:
+        return False, [str(e)]
+    return True, []
+
+class ExportControl:
+    """
+    导出过程的暂停 / 取消控制，线程安全。
+    暂停后不再启动新任务，正在运行的任务照常完成；取消时结束所有运行中的 ffmpeg 进程，
+    被中断的片段恢复为 "等待"，下次导出从这些片段继续。
+    """
+
+    def __init__(self):
+        self._cancel = threading.Event()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._procs = set()
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def paused(self):
+        return not self._resume.is_set()
+
+    def pause(self):
+        self._resume.clear()
+
+    def resume(self):
+        self._resume.set()
+
+    def cancel(self):
+        self._cancel.set()
+        self._resume.set()
+        with self._lock:
+            procs, hooks = list(self._procs), list(self._hooks)
+        for proc in procs: self._terminate(proc)
+        for hook in hooks: hook()
+
+    def on_cancel(self, hook):
+        """登记取消时要执行的操作 (如中止预读)"""
+        with self._lock:
+            self._hooks.append(hook)
+        if self.cancelled: hook()
+
+    def wait_if_paused(self):
+        """暂停期间阻塞，返回是否应继续 (已取消时返回 False)"""
+        self._resume.wait()
+        return not self.cancelled
+
+    def register(self, proc):
+        with self._lock:
+            self._procs.add(proc)
+        if self.cancelled: self._terminate(proc)
+
+    def unregister(self, proc):
+        with self._lock:
+            self._procs.discard(proc)
+
+    @staticmethod
+    def _terminate(proc):
+        try:
+            proc.terminate()
+        except OSError:
+            return
+        def force():
+            if proc.poll() is None:
+                try:
+                    proc.kill()
+                except OSError:
+                    pass
+        timer = threading.Timer(TERMINATE_TIMEOUT, force)
+        timer.daemon = True
+        timer.start()
+
+def run_ffmpeg(cmd, on_block=None, control=None):
+    """
+    执行一条 ffmpeg 命令，返回 (是否成功, stderr 末尾行)。
+    通过 -progress 流式读取进度，每收到一段 key=value 调用一次 on_block(block)；
+    stderr 只保留末尾 STDERR_TAIL_LINES 行。传入 control (ExportControl) 时取消会结束该进程。
+    """
+    tail = deque(maxlen=STDERR_TAIL_LINES)
+    if control is not None and control.cancelled: return False, tail
+    cmd = [cmd[0], '-hide_banner', '-nostats', '-progress', 'pipe:1'] + cmd[1:]
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+                                text=True, encoding='utf-8', errors='replace', **subprocess_kwargs())
+    except (OSError, subprocess.SubprocessError) as e:
+        tail.append(str(e))
+        return False, tail
+    if control is not None: control.register(proc)
+    reader = threading.Thread(target=lambda: tail.extend(line.rstrip() for line in proc.stderr), daemon=True)
+    reader.start()
+    try:
+        block = {}
+        for line in proc.stdout:
+            key, _, value = line.strip().partition("=")
+            block[key] = value
+            if key == "progress":
+                if on_block: on_block(block)
+                block = {}
+        ok = proc.wait() == 0
+    finally:
+        # on_block 等处抛出异常时，不能留下仍在运行、仍登记在 control 中的 ffmpeg
+        if proc.poll() is None: proc.kill()
+        proc.wait()
+        reader.join()
+        if control is not None: control.unregister(proc)
+    return ok, tail
+
+def run_job(ffmpeg_path, job, on_progress=None, probe_cache=None, control=None):
+    """
+    执行一个剪切任务 (逐段/单次读取模式为一个 ffmpeg 进程，可能输出多个片段)，返回是否成功。
+    on_progress(job, info) 在工作线程中回调；失败时 ffmpeg 错误输出的末尾存入 job.error。
+    精确剪切模式与多片段的单次读取任务需要 probe_cache (probe.ProbeCache) 提供关键帧表；
+    单次读取任务没有关键帧表时在同一任务中逐段剪切 (输出与逐段模式相同)。
+    输出先写到临时文件，全部成功后才改名为正式文件，中途失败、取消或崩溃都不会留下半截的正式输出。
+    被取消的任务片段恢复为 "等待"，不计为失败。
+    复用任务 (job.reuse) 不启动 ffmpeg，把相同的输出链接或复制过来；剪出该输出的任务 (job.after) 未成功时记为失败。
+    """
+    if job.rejected:
+        job.error = job.rejected
+        for clip in job.clips: clip['status'] = STATUS_FAILED
+        return False
+
+    def on_block(block):
+        if on_progress: on_progress(job, parse_progress(block, job))
+
+    items = [(clip, partial_output_path(out_path, job.partial_tag)) for clip, out_path in job.items]
+    try:
+        for _, out_path in job.items:
+            os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    except OSError as e:
+        ok, tail = False, [str(e)]
+    else:
+        if job.reuse:
+            if job.after is not None and any(c['status'] != STATUS_DONE for c in job.after.clips):
+                ok, tail = False, [f"被复用的片段未剪切成功: {job.reuse}"]
+            else:
+                ok, tail = link_output(job.reuse, items[0][1])
+        elif job.mode == EXPORT_MODE_SMART:
+            from smart_render import smart_cut
+            ok, tail = smart_cut(ffmpeg_path, job, items, probe_cache, on_block, control)
+        else:
+            src = job.input_path or job.vid_path
+            info = probe_cache.get(job.vid_path, keyframes=True) if len(items) > 1 and probe_cache is not None else None
+            keyframes = info.get("keyframes") if info else None
+            if len(items) > 1 and not keyframes:
+                for item in items:
+                    ok, tail = run_ffmpeg(build_cut_cmd(ffmpeg_path, src, [item]), on_block, control)
+                    if not ok: break
+            else:
+                ok, tail = run_ffmpeg(build_cut_cmd(ffmpeg_path, src, items, keyframes), on_block, control)
+    if ok:
+        try:
+            for (_, tmp_path), (_, out_path) in zip(items, job.items): os.replace(tmp_path, out_path)
+        except OSError as e:
+            ok, tail = False, [str(e)]
+    if not ok:
+        for _, tmp_path in items: remove_quietly(tmp_path)
+
+    cancelled = not ok and control is not None and control.cancelled
+    if not ok and not cancelled: job.error = "\n".join(line for line in tail if line) or "ffmpeg 执行失败"
+    status = STATUS_DONE if ok else (STATUS_WAITING if cancelled else STATUS_FAILED)
+    for clip in job.clips: clip['status'] = status
+    return ok
+
+class BatchProgress:
+    """
+    汇总整批任务的进度：已完成片段数、输出字节速率、相对实时的处理倍速和预计剩余时间。
+    以输出的媒体时长为工作量估算剩余时间，线程安全。
+    """
+
+    def __init__(self, jobs, total_clips, skipped=0):
+        self.total = total_clips
+        self.processed = skipped
+        self.failed = 0
+        self.total_media = sum(job.media_seconds for job in jobs)
+        self.done_media = 0.0
+        self.done_bytes = 0
+        self.started = time.monotonic()
+        self._inflight = {}  # id(job) -> (已输出时长, 已输出字节)
+        self._lock = threading.Lock()
+
+    def update(self, job, info):
+        with self._lock:
+            self._inflight[id(job)] = (info["out_time"], info["total_size"])
+
+    def finish(self, job, ok, cancelled=False):
+        with self._lock:
+            _, size = self._inflight.pop(id(job), (0.0, 0))
+            if cancelled:
+                # 被取消的任务下次继续，不计入已完成的工作量
+                self.total_media -= job.media_seconds
+                return self.processed
+            self.done_media += job.media_seconds
+            self.done_bytes += size
+            self.processed += len(job.items)
+            if not ok: self.failed += len(job.items)
+            return self.processed
+
+    def snapshot(self):
+        with self._lock:
+            media = self.done_media + sum(t for t, _ in self._inflight.values())
+            size = self.done_bytes + sum(b for _, b in self._inflight.values())
+            processed, total, failed = self.processed, self.total, self.failed
+        elapsed = max(1e-6, time.monotonic() - self.started)
+        speed = media / elapsed
+        remaining = max(0.0, self.total_media - media)
+        return {
+            "processed": processed, "total": total, "failed": failed,
+            "percent": media / self.total_media * 100 if self.total_media else 0.0,
+            "bytes_per_sec": size / elapsed, "speed": speed,
+            "eta": remaining / speed if speed > 0 else None, "elapsed": elapsed
+        }
+
+def format_size(n):
+    for unit in ("B", "KB", "MB"):
+        if n < 1024: return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+def describe_progress(stats):
+    """整批进度的一行描述，界面状态栏与命令行共用"""
+    text = f"处理进度: {stats['processed']}/{stats['total']} | {format_size(stats['bytes_per_sec'])}/s | 速度 {stats['speed']:.1f}x"
+    if stats["eta"] is not None: text += f" | 剩余 {format_time(int(stats['eta']))}"
+    if stats["failed"]: text += f" | 失败 {stats['failed']}"
+    return text
+
+def run_export(ffmpeg_path, jobs, total_clips, skipped=0, max_workers=1, on_start=None, on_done=None,
+               on_progress=None, batch=None, manifest=None, probe_cache=None, device_limits=None, staging=None,
+               control=None):
+    """
+    在线程池中执行全部任务。以下回调都在工作线程中发生，界面需自行转交到主线程：
+    on_start(job) 任务开始；on_done(job, ok, processed, total) 任务结束；
+    on_progress(job, info, batch) 收到 ffmpeg 进度时，info 为本任务进度，batch 为 BatchProgress。
+    调用方可传入自己创建的 batch 以便在回调中读取汇总进度。
+    传入输出清单时记录成功输出的指纹，并在结束时保存清单。
+    精确剪切与单次读取任务使用 probe_cache 查询关键帧，未传入时按 ffmpeg 所在目录新建。
+    任务按源文件所在设备调度 (见 scheduler.py)，device_limits 可覆盖各类设备的并发上限。
+    传入 staging (staging.StagingCache) 时，网络共享上的源文件在前一个源文件剪切期间预读到本地。
+    control (ExportControl) 用于暂停 / 取消；取消后尚未开始的任务保持原状态，返回失败的片段数 (不含被取消的)。
+    规划阶段判定无效的任务 (job.rejected) 最先直接记为失败，不占用工作线程；
+    复用输出的任务 (job.reuse) 在剪切任务全部结束后执行，此时要复用的输出都已生成。
+    """
+    if batch is None: batch = BatchProgress(jobs, total_clips, skipped)
+    for job in jobs:
+        if not job.rejected: continue
+        run_job(ffmpeg_path, job)
+        processed = batch.finish(job, False)
+        if on_done: on_done(job, False, processed, total_clips)
+    jobs = [job for job in jobs if not job.rejected]
+    if probe_cache is None and any(job.mode == EXPORT_MODE_SMART or len(job.items) > 1 for job in jobs):
+        from probe import ProbeCache
+        probe_cache = ProbeCache(find_ffprobe(ffmpeg_path))
+
+    def job_progress(job, info):
+        batch.update(job, info)
+        if on_progress: on_progress(job, info, batch)
+
+    # 需要预读的源文件 (网络共享上的)，按任务顺序排列
+    staged_sources = []
+    if staging is not None:
+        from scheduler import device_kind, DEVICE_NETWORK
+        for job in jobs:
+            if job.reuse: continue
+            if job.vid_path not in staged_sources and device_kind(job.vid_path) == DEVICE_NETWORK:
+                staged_sources.append(job.vid_path)
+    next_source = {path: staged_sources[i + 1] for i, path in enumerate(staged_sources[:-1])}
+    if staging is not None and control is not None: control.on_cancel(staging.abort)
+
+    def execute(job):
+        # 状态直接在工作线程写入，避免排队的 UI 回调覆盖已完成的结果
+        for clip in job.clips: clip['status'] = STATUS_RUNNING
+        if on_start: on_start(job)
+        try:
+            if not job.reuse:
+                if job.vid_path in staged_sources: job.input_path = staging.acquire(job.vid_path)
+                if job.vid_path in next_source: staging.prefetch(next_source[job.vid_path])
+            ok = run_job(ffmpeg_path, job, job_progress, probe_cache, control)
+        finally:
+            if job.input_path: staging.release(job.input_path)
+        cancelled = not ok and control is not None and control.cancelled
+        if manifest is not None:
+            for _, out_path in job.items:
+                if ok and out_path in job.fingerprints: manifest.record(out_path, job.fingerprints[out_path])
+                else: manifest.forget(out_path)
+            manifest.save(force=False)
+        return ok, cancelled
+
+    def worker(job):
+        try:
+            ok, cancelled = execute(job)
+        except Exception as e:
+            # 暂存、清单、回调等处的意外异常也要让任务结束并汇报，不能让工作线程悄悄退出；
+            # 片段不能停留在 "处理中" (会被状态日志记下)：已取消时恢复为等待，否则记为失败
+            ok, cancelled = False, control is not None and control.cancelled
+            if not cancelled: job.error = f"{type(e).__name__}: {e}"
+            for clip in job.clips: clip['status'] = STATUS_WAITING if cancelled else STATUS_FAILED
+            if manifest is not None:
+                for _, out_path in job.items: manifest.forget(out_path)
+        processed = batch.finish(job, ok, cancelled)
+        if on_done: on_done(job, ok, processed, total_clips)
+
+    from scheduler import IoScheduler
+
+    def run_all(batch_jobs):
+        scheduler = IoScheduler(batch_jobs, device_limits)
+
+        def drain():
+            while True:
+                if control is not None and not control.wait_if_paused(): return
+                job = scheduler.acquire()
+                if job is None: return
+                try:
+                    if control is None or not control.cancelled: worker(job)
+                finally:
+                    scheduler.release(job)
+
+        workers = clamp_workers(max_workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(drain) for _ in range(min(workers, len(batch_jobs)))]
+        # 工作线程本身出错 (如 on_done 抛出) 时不能悄悄丢掉剩余任务
+        for future in futures: future.result()
+
+    try:
+        run_all([job for job in jobs if not job.reuse])
+        run_all([job for job in jobs if job.reuse])
+        if staging is not None: staging.close()
+    finally:
+        # 暂存或任务出错时也要记下已经成功的输出
+        if manifest is not None: manifest.save()
+    return batch.failed
@@ -1,12 +1,25 @@
+import sys
+import startup
+
+# --- 命令行模式 ---
+# 带参数启动时 (如 `python main.py export project.json --jobs 8`) 直接走无界面的批处理，
+# 不加载任何界面组件，便于在无头服务器或计划任务中运行。
+if __name__ == "__main__" and len(sys.argv) > 1:
+    from cli import main as cli_main
+    sys.exit(cli_main(sys.argv[1:]))
+
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, Menu
-import subprocess
 import os
 import json
 import threading
-import sys
-import platform
-import time
+
+import engine
+import probe
+import timecode
+from project_store import open_project_store, create_project_store
+# 其余功能模块 (文件夹导入、剪辑清单、自动分段、缩略图、重复素材、合辑、导出清单) 在首次使用时才导入，
+# 缩短从启动到窗口出现的时间
 
 # --- 配置与美化 ---
 # 尝试加载美化库，让界面更庄严整洁
@@ -17,10 +30,26 @@ try:
 except ImportError:
     import tkinter.ttk as ttk
     STYLE_THEME = None
+startup.mark("导入")
 
 # 全局配置文件名
 APP_CONFIG_FILE = "app_config.json"
 DEFAULT_PROJECT_NAME = "default_project.json"
+# 导出过程中表格/状态栏的刷新间隔 (毫秒)，同一间隔内的多次更新合并为一次
+UI_REFRESH_MS = 100
+PROJECT_FILETYPES = [("弘法项目文件", "*.json"), ("大型项目 (SQLite)", "*.db *.sqlite")]
+# 导出模式下拉框显示的名称
+EXPORT_MODE_LABELS = {
+    engine.EXPORT_MODE_PER_CLIP: "逐段复制 (最快)",
+    engine.EXPORT_MODE_SINGLE_PASS: "源文件单次读取",
+    engine.EXPORT_MODE_SMART: "精确剪切 (重编码首尾)"
+}
+# 预览面板的缩略图数 (含片段起止两张)
+PREVIEW_COUNT = 8
+# 提示框中最多列出的问题行数 (导入剪辑清单、导出前预检)
+REPORT_LINES = 15
+# 视频列表框每批填入的行数，大项目分批填充，打开时界面不卡顿
+LIST_CHUNK = 300
 
 class VideoClipperApp:
     def __init__(self, root):
@@ -28,64 +57,108 @@ class VideoClipperApp:
         self.root.geometry("1200x800")
         self.root.title("寺院视频剪辑管理系统 (TempleClipFlow)")
         
-        self.ffmpeg_path = self.find_ffmpeg()
+        self.ffmpeg_path = None  # 窗口出现后在后台查找，见 locate_ffmpeg
+        self.probe_cache = probe.ProbeCache()
+        self._analysis_cache = None  # 以下缓存在首次使用时创建，见同名属性
+        self._thumbs = None
+        self._fingerprints = None
+        self.duplicate_of = {}  # 重复导入的素材 -> 内容相同的原件 (列表中靠前的)
+        self.dedup_generation = 0  # 每次重新识别递增，丢弃过期的后台结果
+        self.preview_cancel = None  # 当前预览请求的作废标记
+        self.preview_images = []    # PhotoImage 须保持引用，否则会被回收
         
         # --- 核心状态 ---
         self.current_project_path = None 
-        
-        # --- 定制化：佛教寺院常用分类 ---
-        self.default_categories = [
-            "法师开示", 
-            "经典讲座", 
-            "法会记录", 
-            "早晚课诵", 
-            "义工活动", 
-            "禅修剪影", 
-            "参访交流",
-            "其他素材"
-        ]
-        
-        self.project_data = {
-            "output_dir": "",
-            "auto_subfolder": True,
-            "videos": {},
-            "categories": self.default_categories.copy() 
-        }
+        self.store = None  # 当前项目的持久化 (合并保存 + 状态日志)
+        self.default_categories = engine.DEFAULT_CATEGORIES.copy()
+        self.project_data = engine.new_project()
         self.current_video_path = None
+        self.video_paths = []  # 与视频列表框逐行对应，按序号直接取路径
+        self._list_filled = 0  # 视频列表框中已填入的行数 (分批填充完成前少于 video_paths)
+        self._list_generation = 0
+        self.importing = False
+        # 工作线程提交的待刷新片段行，按 UI_REFRESH_MS 合并刷新
+        self._ui_lock = threading.Lock()
+        self._pending_rows = {}
+        self._pending_status = None
+        self._ui_flush_scheduled = False
+        self.clip_progress = {}  # id(片段) -> 导出中的完成百分比
+        self.export_control = None  # 导出进行中时为 engine.ExportControl
+        self.export_thread = None
+        self.exporting = False  # 从开始导出到 finish_processing，期间不能增删视频/片段或切换项目
+        self.closing = False
         
         # --- UI 变量 ---
         self.var_output_dir = tk.StringVar()
         self.var_auto_sub = tk.BooleanVar(value=True)
+        self.var_workers = tk.IntVar(value=engine.DEFAULT_MAX_WORKERS)
+        self.var_staging = tk.BooleanVar(value=False)
+        self.var_export_mode = tk.StringVar(value=EXPORT_MODE_LABELS[engine.EXPORT_MODE_PER_CLIP])
         
         # --- 构建界面 ---
         self.create_menu()
         self.setup_ui()
+        startup.mark("建窗口")
         
         # --- 初始化加载 ---
-        self.check_environment()
+        # 先让窗口绘制出来 (空闲回调中完成首次绘制)，再查找 ffmpeg、打开上次的项目
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after_idle(lambda: self.root.after(0, self.deferred_startup))
+
+    def deferred_startup(self):
+        startup.mark("首次绘制")
+        threading.Thread(target=self.locate_ffmpeg, daemon=True).start()
         self.startup_load()
+        startup.mark("打开项目")
+        startup.report()
 
-    def find_ffmpeg(self):
-        if getattr(sys, 'frozen', False):
-            base = os.path.dirname(sys.executable)
-        else:
-            base = os.path.dirname(os.path.abspath(__file__))
-        
-        local = os.path.join(base, "ffmpeg.exe")
-        if platform.system() != "Windows": local = os.path.join(base, "ffmpeg")
-        
-        if os.path.exists(local): return local
-        from shutil import which
-        return which("ffmpeg")
+    def locate_ffmpeg(self):
+        """后台查找 ffmpeg / ffprobe (PATH 中有网络驱动器时可能较慢)，找到后回到主线程检查环境"""
+        ffmpeg_path = engine.find_ffmpeg()
+        ffprobe_path = engine.find_ffprobe(ffmpeg_path)
+        self.root.after(0, lambda: self.set_ffmpeg(ffmpeg_path, ffprobe_path))
+
+    def set_ffmpeg(self, ffmpeg_path, ffprobe_path):
+        self.ffmpeg_path = ffmpeg_path
+        self.probe_cache.ffprobe_path = ffprobe_path
+        if self._thumbs is not None: self._thumbs.ffmpeg_path = ffmpeg_path
+        self.check_environment()
 
     def check_environment(self):
         if self.ffmpeg_path:
             src = "本地" if "ffmpeg.exe" in self.ffmpeg_path else "系统"
-            self.update_status(f"系统就绪 | FFmpeg组件来源: {src}", "green")
+            # 保留打开项目时的提示 (如中断恢复的片段数)
+            self.update_status(f"系统就绪 | FFmpeg组件来源: {src} | 启动用时 {startup.elapsed():.2f} 秒 | "
+                               f"{self.lbl_status.cget('text')}", "green")
         else:
             self.update_status("未检测到FFmpeg组件，无法执行剪辑", "red")
             self.root.after(500, lambda: messagebox.showerror("组件缺失", "请将 ffmpeg.exe 放入软件目录中。"))
 
+    # ===========================
+    #      按需创建的缓存
+    # ===========================
+
+    @property
+    def analysis_cache(self):
+        if self._analysis_cache is None:
+            import segmenter
+            self._analysis_cache = segmenter.AnalysisCache()
+        return self._analysis_cache
+
+    @property
+    def thumbs(self):
+        if self._thumbs is None:
+            import thumbnails
+            self._thumbs = thumbnails.ThumbnailCache(self.ffmpeg_path, self.probe_cache)
+        return self._thumbs
+
+    @property
+    def fingerprints(self):
+        if self._fingerprints is None:
+            import dedup
+            self._fingerprints = dedup.FingerprintCache()
+        return self._fingerprints
+
     # ===========================
     #      项目管理核心逻辑
     # ===========================
@@ -108,61 +181,52 @@ class VideoClipperApp:
 
     def create_new_project(self):
         """新建弘法项目"""
+        if self.export_busy(): return
         self.trigger_autosave()
         file_path = filedialog.asksaveasfilename(
             title="新建弘法项目",
             defaultextension=".json",
-            filetypes=[("弘法项目文件", "*.json")],
+            filetypes=PROJECT_FILETYPES,
             initialfile="新弘法项目.json"
         )
         
         if file_path:
-            self.project_data = {
-                "output_dir": "",
-                "auto_subfolder": True,
-                "videos": {},
-                "categories": self.default_categories.copy()
-            }
             self.current_video_path = None
-            self.current_project_path = file_path
+            self.set_store(create_project_store(file_path, engine.new_project(), **self.store_options()))
             self.trigger_autosave()
+            self.store.flush()
             self.refresh_ui_from_data()
             self.update_app_title()
             self.save_app_config()
 
     def open_project_dialog(self):
+        if self.export_busy(): return
         file_path = filedialog.askopenfilename(
             title="打开项目",
-            filetypes=[("弘法项目文件", "*.json")]
+            filetypes=PROJECT_FILETYPES
         )
         if file_path:
             self.load_project_file(file_path)
 
     def load_project_file(self, file_path):
-        self.current_project_path = file_path
-        if not os.path.exists(file_path):
-            self.project_data = {
-                "output_dir": "", 
-                "auto_subfolder": True, 
-                "videos": {},
-                "categories": self.default_categories.copy()
-            }
-            self.trigger_autosave()
-        else:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if "categories" not in data:
-                        data["categories"] = self.default_categories.copy()
-                    self.project_data = data
-            except Exception as e:
-                messagebox.showerror("错误", f"文件读取失败: {e}")
-                return
+        try:
+            if not os.path.exists(file_path):
+                store = create_project_store(file_path, engine.new_project(), **self.store_options())
+            else:
+                store = open_project_store(file_path, **self.store_options())
+        except Exception as e:
+            messagebox.showerror("错误", f"文件读取失败: {e}")
+            return
+        self.set_store(store)
 
+        self.duplicate_of = {}
         self.refresh_ui_from_data()
         self.update_app_title()
         self.save_app_config()
-        self.update_status(f"当前项目: {os.path.basename(file_path)}")
+        text = f"当前项目: {os.path.basename(file_path)}"
+        if store.interrupted: text += f" | 上次导出中断的 {store.interrupted} 个片段已恢复为等待，再次导出时继续"
+        self.update_status(text)
+        self.check_duplicates()
 
     def save_app_config(self):
         config = {"last_opened_project": self.current_project_path}
@@ -172,15 +236,62 @@ class VideoClipperApp:
         except:
             pass
 
+    def set_store(self, store):
+        """切换当前项目：先把旧项目未保存的修改写盘"""
+        if self.store: self.store.close()
+        self.store = store
+        self.project_data = store.data
+        self.current_project_path = store.path
+
+    def store_options(self):
+        # 合并保存放到主循环里执行：界面随时在改项目数据，后台线程序列化会读到改了一半的字典
+        return {"on_error": self.on_save_error, "schedule": lambda delay, fn: self.root.after(int(delay * 1000), fn)}
+
+    def on_save_error(self, e):
+        # 导出线程中写状态日志失败时也会回调
+        self.root.after(0, lambda: self.update_status(f"自动保存失败: {e}", "red"))
+
+    def on_close(self):
+        if self.export_thread and self.export_thread.is_alive():
+            if not messagebox.askyesno("确认退出", "正在导出，退出将中止未完成的片段 (下次导出时继续)。确定退出吗？"): return
+            self.closing = True
+            self.export_control.cancel()
+            self.update_status("正在停止导出...")
+            self.wait_export_then_close()
+            return
+        if self._thumbs is not None: self._thumbs.close()
+        if self.store: self.store.close()
+        self.root.destroy()
+
+    def wait_export_then_close(self):
+        # 不能在主线程 join：工作线程的界面回调需要主循环处理
+        if self.export_thread.is_alive():
+            self.root.after(UI_REFRESH_MS, self.wait_export_then_close)
+            return
+        if self._thumbs is not None: self._thumbs.close()
+        if self.store: self.store.close()
+        self.root.destroy()
+
     def trigger_autosave(self, *args):
-        if not self.current_project_path: return
+        """把界面设置同步进项目数据，并请求一次合并保存"""
+        if not self.store: return
         self.project_data["output_dir"] = self.var_output_dir.get()
         self.project_data["auto_subfolder"] = self.var_auto_sub.get()
+        self.project_data["max_workers"] = self.get_max_workers()
+        self.project_data["export_mode"] = self.get_export_mode()
+        self.project_data["staging"] = self.var_staging.get()
+        self.store.request_save()
+
+    def get_export_mode(self):
+        label = self.var_export_mode.get()
+        return next((m for m, text in EXPORT_MODE_LABELS.items() if text == label), engine.EXPORT_MODE_PER_CLIP)
+
+    def get_max_workers(self):
+        """读取并发数设置，非法输入时回退到默认值"""
         try:
-            with open(self.current_project_path, 'w', encoding='utf-8') as f:
-                json.dump(self.project_data, f, indent=4, ensure_ascii=False)
-        except Exception as e:
-            self.update_status(f"自动保存失败: {e}", "red")
+            return engine.clamp_workers(self.var_workers.get())
+        except tk.TclError:
+            return engine.DEFAULT_MAX_WORKERS
 
     def update_app_title(self):
         name = os.path.basename(self.current_project_path) if self.current_project_path else "未命名"
@@ -258,7 +369,7 @@ class VideoClipperApp:
         file_menu.add_command(label="📄 新建弘法项目", command=self.create_new_project)
         file_menu.add_command(label="📂 打开项目", command=self.open_project_dialog)
         file_menu.add_separator()
-        file_menu.add_command(label="❌ 退出系统", command=self.root.quit)
+        file_menu.add_command(label="❌ 退出系统", command=self.on_close)
         
         setting_menu = Menu(menubar, tearoff=0)
         menubar.add_cascade(label="设置", menu=setting_menu)
@@ -275,6 +386,8 @@ class VideoClipperApp:
         lf_btn = ttk.Frame(self.frame_left)
         lf_btn.pack(fill=tk.X, pady=5)
         ttk.Button(lf_btn, text="➕ 导入视频素材", command=self.import_videos, bootstyle="primary").pack(fill=tk.X)
+        ttk.Button(lf_btn, text="📁 导入整个文件夹", command=self.import_folder).pack(fill=tk.X, pady=(5,0))
+        ttk.Button(lf_btn, text="📋 导入剪辑清单 (CSV/EDL/SRT)", command=self.import_cut_list).pack(fill=tk.X, pady=(5,0))
         
         self.list_videos = tk.Listbox(self.frame_left, selectmode=tk.SINGLE, font=("微软雅黑", 10), bd=0, highlightthickness=1)
         self.list_videos.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -293,6 +406,15 @@ class VideoClipperApp:
         ttk.Entry(frame_settings, textvariable=self.var_output_dir).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
         ttk.Button(frame_settings, text="选择文件夹...", command=self.select_output).pack(side=tk.LEFT)
         ttk.Checkbutton(frame_settings, text="自动按视频名建立文件夹", variable=self.var_auto_sub, command=self.trigger_autosave).pack(side=tk.LEFT, padx=10)
+        ttk.Label(frame_settings, text="并发数:").pack(side=tk.LEFT)
+        spin_workers = ttk.Spinbox(frame_settings, from_=1, to=engine.MAX_WORKERS_LIMIT, width=4, textvariable=self.var_workers, command=self.trigger_autosave)
+        spin_workers.pack(side=tk.LEFT, padx=5)
+        spin_workers.bind('<FocusOut>', self.trigger_autosave)
+        ttk.Label(frame_settings, text="导出模式:").pack(side=tk.LEFT, padx=(10,0))
+        cb_mode = ttk.Combobox(frame_settings, width=16, state="readonly", textvariable=self.var_export_mode, values=list(EXPORT_MODE_LABELS.values()))
+        cb_mode.pack(side=tk.LEFT, padx=5)
+        cb_mode.bind('<<ComboboxSelected>>', self.trigger_autosave)
+        ttk.Checkbutton(frame_settings, text="网络素材预读到本地", variable=self.var_staging, command=self.trigger_autosave).pack(side=tk.LEFT, padx=10)
 
         # 表格
         cols = ("ID", "Start", "End", "Category", "Name", "Status")
@@ -304,6 +426,11 @@ class VideoClipperApp:
         for i, col in enumerate(cols):
             self.tree.heading(col, text=col_map[col])
             self.tree.column(col, width=col_widths[i], anchor="center" if col!="Name" else "w")
+        self.tree.bind('<<TreeviewSelect>>', self.on_clip_select)
+
+        # 画面预览
+        self.frame_preview = ttk.LabelFrame(self.frame_right, text="画面预览 (关键帧，左键设为开始 / 右键设为结束)", padding=5)
+        self.frame_preview.pack(fill=tk.X, pady=(0,10))
 
         # 编辑区
         frame_edit = ttk.LabelFrame(self.frame_right, text="添加剪辑片段", padding=10)
@@ -333,9 +460,18 @@ class VideoClipperApp:
         self.root.bind('<Return>', lambda e: self.add_clip())
         
         ttk.Button(f_act, text="❌ 删除片段", command=self.del_clip).pack(side=tk.LEFT, padx=10)
+        ttk.Button(f_act, text="🪄 自动分段...", command=self.open_auto_segment).pack(side=tk.LEFT)
         
-        self.btn_run = ttk.Button(self.frame_right, text="🚀 开始批量处理 (导出所有视频)", command=self.start_processing, bootstyle="success")
-        self.btn_run.pack(side=tk.BOTTOM, fill=tk.X, pady=5)
+        f_run = ttk.Frame(self.frame_right)
+        f_run.pack(side=tk.BOTTOM, fill=tk.X, pady=5)
+        self.btn_cancel = ttk.Button(f_run, text="⏹ 取消", command=self.cancel_processing, state="disabled")
+        self.btn_cancel.pack(side=tk.RIGHT)
+        self.btn_pause = ttk.Button(f_run, text="⏸ 暂停", command=self.toggle_pause, state="disabled")
+        self.btn_pause.pack(side=tk.RIGHT, padx=5)
+        self.btn_compile = ttk.Button(f_run, text="🎞 生成合辑...", command=self.open_compilation)
+        self.btn_compile.pack(side=tk.RIGHT, padx=(0,5))
+        self.btn_run = ttk.Button(f_run, text="🚀 开始批量处理 (导出所有视频)", command=self.start_processing, bootstyle="success")
+        self.btn_run.pack(side=tk.LEFT, fill=tk.X, expand=True)
         
         self.lbl_status = ttk.Label(self.root, text="就绪", relief=tk.SUNKEN, anchor="w")
         self.lbl_status.pack(side=tk.BOTTOM, fill=tk.X)
@@ -350,157 +486,730 @@ class VideoClipperApp:
     def refresh_ui_from_data(self):
         self.var_output_dir.set(self.project_data.get("output_dir", ""))
         self.var_auto_sub.set(self.project_data.get("auto_subfolder", True))
+        self.var_workers.set(self.project_data.get("max_workers", engine.DEFAULT_MAX_WORKERS))
+        self.var_staging.set(self.project_data.get("staging", False))
+        mode = self.project_data.get("export_mode")
+        self.var_export_mode.set(EXPORT_MODE_LABELS.get(mode, EXPORT_MODE_LABELS[engine.EXPORT_MODE_PER_CLIP]))
         
         cats = self.project_data.get("categories", self.default_categories)
         self.ent_cat['values'] = cats
         if cats: self.ent_cat.current(0)
         
-        self.list_videos.delete(0, tk.END)
         self.current_video_path = None 
         self.refresh_clip_tree() 
+        self.clear_preview()
         self.btn_add.config(state="disabled")
-        
-        for path in self.project_data["videos"].keys():
-            self.list_videos.insert(tk.END, f"🎬 {os.path.basename(path)}")
+        self.refresh_video_list()
+
+    def refresh_video_list(self):
+        self.video_paths = list(self.project_data["videos"])
+        self.list_videos.delete(0, tk.END)
+        self._list_filled = 0
+        self._list_generation += 1
+        self.fill_video_list(self._list_generation)
+
+    def fill_video_list(self, generation):
+        """填入下一批 LIST_CHUNK 行，其余留到主循环的下一轮，先显示的部分可以立即操作"""
+        if generation != self._list_generation: return
+        end = min(len(self.video_paths), self._list_filled + LIST_CHUNK)
+        labels = [self.video_label(p) for p in self.video_paths[self._list_filled:end]]
+        if labels: self.list_videos.insert(tk.END, *labels)
+        self._list_filled = end
+        if end < len(self.video_paths): self.root.after(1, lambda: self.fill_video_list(generation))
+
+    def select_video_row(self, idx):
+        """选中视频列表的第 idx 行；分批填充还没填到这一行时，先把它之前的行一次填完"""
+        if idx >= self._list_filled:
+            self.list_videos.insert(tk.END, *(self.video_label(p) for p in self.video_paths[self._list_filled:idx + 1]))
+            self._list_filled = idx + 1
+        self.list_videos.selection_set(idx)
+        self.list_videos.see(idx)
+
+    def append_videos(self, paths):
+        """新导入的视频加到列表末尾 (分批填充未完成时由填充过程带上)"""
+        filling = self._list_filled < len(self.video_paths)
+        self.video_paths.extend(paths)
+        if filling or not paths: return
+        self.list_videos.insert(tk.END, *(self.video_label(p) for p in paths))
+        self._list_filled = len(self.video_paths)
+
+    def video_label(self, path):
+        original = self.duplicate_of.get(path)
+        label = f"🎬 {os.path.basename(path)}"
+        return f"{label}  ⧉ 与 {os.path.basename(original)} 相同" if original else label
+
+    def check_duplicates(self):
+        """后台计算 (或读缓存) 全部素材的内容指纹，把重复导入的素材在列表中标记出来"""
+        import dedup
+        videos = list(self.video_paths)
+        max_workers = self.get_max_workers()
+        self.dedup_generation += 1
+        generation = self.dedup_generation
+
+        def work():
+            fingerprints = self.fingerprints.compute(videos, max_workers)
+            dupes = dedup.duplicate_map(fingerprints, videos)
+            self.root.after(0, lambda: self.show_duplicates(generation, dupes))
+        threading.Thread(target=work, daemon=True).start()
+
+    def show_duplicates(self, generation, dupes):
+        if generation != self.dedup_generation or self.closing: return
+        old, self.duplicate_of = self.duplicate_of, dupes
+        selected = set(self.list_videos.curselection())
+        for i, path in enumerate(self.video_paths[:self._list_filled]):
+            if old.get(path) == dupes.get(path): continue
+            self.list_videos.delete(i)
+            self.list_videos.insert(i, self.video_label(path))
+            if i in selected: self.list_videos.selection_set(i)
+        found = [p for p in dupes if p not in old]
+        if found:
+            self.update_status(f"发现 {len(found)} 个重复导入的素材 (内容与列表中的其他视频相同)，导出时相同的片段只剪切一次", "orange")
 
     def import_videos(self):
-        files = filedialog.askopenfilenames(filetypes=[("Video Files", "*.mp4 *.mkv *.mov *.avi *.flv *.ts")])
+        if self.export_busy(): return
+        files = filedialog.askopenfilenames(filetypes=[("Video Files", " ".join("*" + e for e in engine.VIDEO_EXTENSIONS))])
         if not files: return
+        import scanner
         
-        count = 0
+        added = []
         for f in files:
-            f = f.replace("\\", "/")
+            f = scanner.normalize_path(f)
             if f not in self.project_data["videos"]:
                 self.project_data["videos"][f] = [] 
-                count += 1
+                added.append(f)
+        self.append_videos(added)
+        count = len(added)
         
         if count > 0:
             if not self.var_output_dir.get():
                 self.var_output_dir.set(os.path.dirname(files[0]))
-            self.list_videos.delete(0, tk.END)
-            for path in self.project_data["videos"].keys():
-                self.list_videos.insert(tk.END, f"🎬 {os.path.basename(path)}")
             self.trigger_autosave()
+            self.check_duplicates()
             messagebox.showinfo("导入成功", f"已添加 {count} 个视频素材")
 
+    def import_folder(self):
+        """递归导入文件夹中的所有视频：后台扫描和探测，分批加入列表，结束时只保存一次"""
+        if self.importing or self.export_busy(): return
+        root_dir = filedialog.askdirectory(title="选择要导入的文件夹")
+        if not root_dir: return
+        import scanner
+        self.importing = True
+        known = set(self.project_data["videos"])
+        added = {"count": 0}
+
+        def on_batch(batch):
+            self.root.after(0, lambda: self.add_imported_batch(batch, added))
+
+        def work():
+            scanner.scan_folder(root_dir, known, self.probe_cache, self.get_max_workers(), on_batch)
+            self.root.after(0, finish)
+
+        def finish():
+            self.importing = False
+            if added["count"] > 0:
+                if not self.var_output_dir.get(): self.var_output_dir.set(root_dir)
+                self.trigger_autosave()
+            self.update_status(f"文件夹导入完成：新增 {added['count']} 个视频素材", "green")
+            if added["count"] > 0: self.check_duplicates()
+
+        self.update_status(f"正在扫描: {root_dir}")
+        threading.Thread(target=work, daemon=True).start()
+
+    def add_imported_batch(self, batch, added):
+        """主线程中把一批扫描结果加入项目和列表框"""
+        paths = []
+        for path, info in batch:
+            if path in self.project_data["videos"]: continue
+            self.project_data["videos"][path] = []
+            paths.append(path)
+        self.append_videos(paths)
+        added["count"] += len(paths)
+        self.update_status(f"正在导入... 已新增 {added['count']} 个视频素材")
+
+    def import_cut_list(self):
+        """批量导入剪辑清单：解析校验一遍完成，整批写入项目后只保存一次、刷新一次界面"""
+        if self.export_busy(): return
+        path = filedialog.askopenfilename(title="选择剪辑清单", filetypes=[
+            ("剪辑清单", "*.csv *.tsv *.txt *.edl *.srt *.vtt"), ("All Files", "*.*")])
+        if not path: return
+        import cutlist
+        fps = cutlist.DEFAULT_FPS
+        info = self.probe_cache.peek(self.current_video_path) if self.current_video_path else None
+        video = next((s for s in info.get("streams", []) if s["type"] == "video"), None) if info else None
+        if video and video.get("fps"): fps = video["fps"]
+        try:
+            grouped, errors = cutlist.load_cut_list(path, list(self.project_data["videos"]), self.current_video_path, fps)
+        except cutlist.CutListError as e:
+            messagebox.showerror("导入失败", str(e))
+            return
+
+        added, duplicates, new_videos = cutlist.apply_cut_list(self.project_data, grouped)
+        if added or new_videos:
+            current = self.current_video_path
+            self.refresh_video_list()
+            cats = self.project_data.get("categories", self.default_categories)
+            self.ent_cat['values'] = cats
+            if current in self.video_paths:
+                self.select_video_row(self.video_paths.index(current))
+            self.refresh_clip_tree()
+            self.trigger_autosave()
+
+        msg = f"新增 {added} 个片段"
+        if new_videos: msg += f"，新增 {new_videos} 个视频素材"
+        if duplicates: msg += f"，跳过 {duplicates} 个重复片段"
+        if errors:
+            msg += f"\n\n{len(errors)} 行未导入:\n" + "\n".join(f"第 {line} 行: {err}" for line, err in errors[:REPORT_LINES])
+            if len(errors) > REPORT_LINES: msg += "\n..."
+            messagebox.showwarning("导入完成", msg)
+        else:
+            messagebox.showinfo("导入完成", msg)
+        self.update_status(f"剪辑清单导入完成：{msg.splitlines()[0]}", "green")
+        if new_videos: self.check_duplicates()
+
     def remove_video(self):
+        if self.export_busy(): return
         sel = self.list_videos.curselection()
         if not sel: return
-        keys = list(self.project_data["videos"].keys())
-        if sel[0] < len(keys):
-            del self.project_data["videos"][keys[sel[0]]]
+        if sel[0] < len(self.video_paths):
+            path = self.video_paths.pop(sel[0])
+            del self.project_data["videos"][path]
+            self.list_videos.delete(sel[0])
+            self._list_filled -= 1
+            if self.current_video_path == path:
+                self.current_video_path = None
+                self.btn_add.config(state="disabled")
+                self.clear_preview()
             self.trigger_autosave()
-            self.list_videos.delete(0, tk.END)
-            for path in self.project_data["videos"].keys():
-                self.list_videos.insert(tk.END, f"🎬 {os.path.basename(path)}")
             self.refresh_clip_tree()
+            if path in self.duplicate_of or path in self.duplicate_of.values(): self.check_duplicates()
 
     def on_video_select(self, event):
         sel = self.list_videos.curselection()
         if not sel: return
-        keys = list(self.project_data["videos"].keys())
-        if sel[0] < len(keys):
-            self.current_video_path = keys[sel[0]]
+        if sel[0] < len(self.video_paths):
+            self.current_video_path = self.video_paths[sel[0]]
             self.refresh_clip_tree()
             self.btn_add.config(state="normal")
             self.frame_right.config(text=f"2. 剪辑工作台 - 当前视频: {os.path.basename(self.current_video_path)}")
+            self.show_media_info(self.current_video_path)
+            self.show_preview(self.current_video_path)
+
+    def show_media_info(self, vid_path):
+        """后台获取 (或读缓存) 源视频信息，显示到状态栏"""
+        def work():
+            info = self.probe_cache.get(vid_path)
+            if info and self.current_video_path == vid_path:
+                self.root.after(0, lambda: self.update_status(probe.describe(info)))
+        threading.Thread(target=work, daemon=True).start()
+
+    def on_clip_select(self, event):
+        sel = self.tree.selection()
+        if not sel or not self.current_video_path: return
+        clips = self.project_data["videos"].get(self.current_video_path, [])
+        idx = self.tree.index(sel[0])
+        if idx < len(clips): self.show_preview(self.current_video_path, clips[idx])
+
+    def show_preview(self, vid_path, clip=None):
+        """
+        显示缩略图：选中片段时为片段起止及其间的画面，否则沿整个视频均匀取图。
+        时间吸附到关键帧后去重；取图在后台进行，切换视频/片段时旧请求作废。
+        """
+        self.clear_preview()
+        cancel = self.preview_cancel = threading.Event()
+
+        def work():
+            # 选中片段即开始编辑：此时才扫描关键帧表，缩略图与切点校验都用得上
+            info = self.probe_cache.get(vid_path, keyframes=clip is not None)
+            duration = info.get("duration") if info else 0
+            span = None
+            if clip is not None:
+                try:
+                    span = timecode.ClipSpan.from_clip(clip)
+                except timecode.TimecodeError:
+                    pass
+            if span is not None:
+                step = span.duration / (PREVIEW_COUNT - 1)
+                times = [span.start + i * step for i in range(PREVIEW_COUNT - 1)] + [span.end]
+            elif duration:
+                step = duration / PREVIEW_COUNT
+                times = [i * step for i in range(PREVIEW_COUNT)]
+            else:
+                return
+            times = sorted({round(self.thumbs.snap(vid_path, t), 3) for t in times})
+            if cancel.is_set(): return
+            self.root.after(0, lambda: build(times))
+
+        def build(times):
+            if cancel.is_set(): return
+            slots = {}
+            for t in times:
+                lbl = ttk.Label(self.frame_preview, text=engine.format_time(t), compound="top", cursor="hand2")
+                lbl.pack(side=tk.LEFT, padx=2)
+                lbl.bind('<Button-1>', lambda e, t=t: self.set_cut_entry(self.ent_start, t))
+                lbl.bind('<Button-3>', lambda e, t=t: self.set_cut_entry(self.ent_end, t))
+                slots[t] = lbl
+            self.thumbs.request(vid_path, times, lambda t, path: self.root.after(0, lambda: fill(slots[t], path)), cancel)
+
+        def fill(lbl, path):
+            if cancel.is_set() or not path: return
+            try:
+                image = tk.PhotoImage(file=path)
+            except tk.TclError:
+                return
+            self.preview_images.append(image)
+            lbl.config(image=image)
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def clear_preview(self):
+        if self.preview_cancel is not None: self.preview_cancel.set()
+        for child in self.frame_preview.winfo_children(): child.destroy()
+        self.preview_images = []
+
+    def set_cut_entry(self, entry, t):
+        entry.delete(0, tk.END)
+        entry.insert(0, engine.format_time(t))
+
+    @staticmethod
+    def clip_row_id(clip):
+        """表格行 iid：片段对象在列表中存活期间保持不变"""
+        return f"clip{id(clip)}"
+
+    @staticmethod
+    def clip_row_values(index, c):
+        return (index+1, c['start'], c['end'], c.get('category',''), c['name'], c.get('status', engine.STATUS_WAITING))
 
     def refresh_clip_tree(self):
-        for i in self.tree.get_children(): self.tree.delete(i)
+        """整表重建，仅在切换视频/项目时使用；增删改走下面的单行更新"""
+        self.tree.delete(*self.tree.get_children())
         if not self.current_video_path: return
         
         clips = self.project_data["videos"].get(self.current_video_path, [])
         for i, c in enumerate(clips):
-            self.tree.insert("", tk.END, values=(
-                i+1, c['start'], c['end'], c.get('category',''), c['name'], c.get('status','等待')
-            ))
+            self.tree.insert("", tk.END, iid=self.clip_row_id(c), values=self.clip_row_values(i, c))
+
+    def update_clip_row(self, clip):
+        """只刷新一个片段所在行的状态 (不在当前表格中时忽略)"""
+        iid = self.clip_row_id(clip)
+        if self.tree.exists(iid):
+            status = clip.get('status', engine.STATUS_WAITING)
+            pct = self.clip_progress.get(id(clip))
+            if status == engine.STATUS_RUNNING and pct is not None: status = f"处理中 {pct:.0f}%"
+            self.tree.set(iid, "Status", status)
+
+    def queue_row_update(self, vid_path, clip=None, status_text=None):
+        """
+        工作线程调用：登记待刷新的行/状态栏文字，
+        每个 UI_REFRESH_MS 间隔最多在主线程刷新一次。
+        """
+        with self._ui_lock:
+            if clip is not None and self.current_video_path == vid_path:
+                self._pending_rows[id(clip)] = clip
+            if status_text is not None: self._pending_status = status_text
+            if self._ui_flush_scheduled: return
+            self._ui_flush_scheduled = True
+        self.root.after(UI_REFRESH_MS, self.flush_row_updates)
+
+    def flush_row_updates(self):
+        with self._ui_lock:
+            rows, self._pending_rows = self._pending_rows, {}
+            text, self._pending_status = self._pending_status, None
+            self._ui_flush_scheduled = False
+        for clip in rows.values(): self.update_clip_row(clip)
+        if text: self.update_status(text)
 
     def add_clip(self):
         if not self.current_video_path or self.btn_add['state'] == 'disabled': return
-        s, e = self.ent_start.get(), self.ent_end.get()
         cat, n = self.ent_cat.get(), self.ent_name.get()
-        if not n: n = f"clip_{len(self.project_data['videos'][self.current_video_path])+1}"
+        # 输入时就校验并规范化时间，无效的时间不进入项目
+        try:
+            s, e = timecode.ClipSpan.from_clip({"start": self.ent_start.get(), "end": self.ent_end.get()}).texts()
+        except timecode.TimecodeError as err:
+            messagebox.showwarning("时间无效", str(err))
+            return
+        clips = self.project_data["videos"][self.current_video_path]
+        if not n:
+            # 按片段数编号，避开已有的名称 (删除过片段或导入过 clip_N 时)
+            taken, i = {c['name'] for c in clips}, len(clips) + 1
+            while f"clip_{i}" in taken: i += 1
+            n = f"clip_{i}"
         
-        new_clip = {"start": s, "end": e, "category": cat, "name": n, "status": "等待"}
-        self.project_data["videos"][self.current_video_path].append(new_clip)
+        new_clip = {"start": s, "end": e, "category": cat, "name": n, "status": engine.STATUS_WAITING}
+        clips.append(new_clip)
         
-        self.refresh_clip_tree()
+        iid = self.tree.insert("", tk.END, iid=self.clip_row_id(new_clip), values=self.clip_row_values(len(clips)-1, new_clip))
+        self.tree.see(iid)
         self.trigger_autosave()
+        self.warn_cut_problems(self.current_video_path, s, e)
         self.ent_start.delete(0, tk.END); self.ent_start.insert(0, e)
         self.ent_name.delete(0, tk.END)
 
+    def warn_cut_problems(self, vid_path, start, end):
+        """用关键帧表校验切点，只提示不阻止；第一次在该视频上添加片段时在后台扫描关键帧"""
+        s, e = engine.parse_time(start), engine.parse_time(end)
+        if s is None or e is None: return
+        stream_copy = self.get_export_mode() != engine.EXPORT_MODE_SMART
+
+        def work():
+            problems = probe.check_cut(self.probe_cache.get(vid_path, keyframes=True), s, e, stream_copy=stream_copy)
+            if problems: self.root.after(0, lambda: self.update_status("注意: " + "；".join(problems), "orange"))
+        threading.Thread(target=work, daemon=True).start()
+
     def del_clip(self):
+        if self.export_busy(): return
         if not self.current_video_path: return
         sel = self.tree.selection()
         if sel:
             idx = self.tree.index(sel[0])
-            del self.project_data["videos"][self.current_video_path][idx]
-            self.refresh_clip_tree()
+            clips = self.project_data["videos"][self.current_video_path]
+            del clips[idx]
+            self.tree.delete(sel[0])
+            # 只重排后续行的序号
+            for i in range(idx, len(clips)):
+                self.tree.set(self.clip_row_id(clips[i]), "ID", i+1)
             self.trigger_autosave()
 
+    def open_auto_segment(self):
+        """
+        自动分段窗口：后台分析一次当前视频 (已缓存时跳过)，之后调整参数即时预览分段数，
+        确认后整批加入片段列表。
+        """
+        vid_path = self.current_video_path
+        if not vid_path or not self.ffmpeg_path: return
+        import segmenter
+        settings = segmenter.settings_from_project(self.project_data)
+        state = {"analysis": self.analysis_cache.peek(vid_path), "segments": []}
+        control = engine.ExportControl()
+
+        win = tk.Toplevel(self.root)
+        win.title(f"自动分段 - {os.path.basename(vid_path)}")
+        win.geometry("420x360")
+        frame = ttk.Frame(win, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        fields = [("静音阈值 (dB):", "silence_db", -90, 0), ("最短静音 (秒):", "min_silence", 0.1, 30),
+                  ("镜头切换阈值 (0~1):", "scene_threshold", 0.05, 1), ("片段最短 (秒):", "min_len", 0, 36000),
+                  ("片段最长 (秒):", "max_len", 1, 36000)]
+        var_silence = tk.BooleanVar(value=settings["use_silence"])
+        var_scenes = tk.BooleanVar(value=settings["use_scenes"])
+        ttk.Checkbutton(frame, text="在静音处分段", variable=var_silence).grid(row=0, column=0, columnspan=2, sticky="w")
+        ttk.Checkbutton(frame, text="在镜头切换处分段", variable=var_scenes).grid(row=1, column=0, columnspan=2, sticky="w")
+        num_vars = {}
+        for row, (label, key, low, high) in enumerate(fields, 2):
+            ttk.Label(frame, text=label).grid(row=row, column=0, sticky="w", pady=3)
+            num_vars[key] = tk.StringVar(value=str(settings[key]))
+            ttk.Spinbox(frame, from_=low, to=high, width=10, textvariable=num_vars[key]).grid(row=row, column=1, sticky="w")
+        lbl_preview = ttk.Label(frame, text="", wraplength=380)
+        lbl_preview.grid(row=len(fields) + 2, column=0, columnspan=2, sticky="w", pady=10)
+
+        def current_settings():
+            values = {"use_silence": var_silence.get(), "use_scenes": var_scenes.get()}
+            for key, var in num_vars.items():
+                try:
+                    values[key] = float(var.get())
+                except ValueError:
+                    return None
+            return values
+
+        def preview(*args):
+            # 只在缓存的分析结果上重新分段，不读文件
+            if state["analysis"] is None: return
+            values = current_settings()
+            if values is None:
+                lbl_preview.config(text="参数格式错误")
+                btn_apply.config(state="disabled")
+                return
+            info = self.probe_cache.peek(vid_path)
+            state["segments"] = segmenter.propose_segments(state["analysis"], values, info.get("keyframes") if info else None)
+            count = len(state["segments"])
+            avg = sum(e - s for s, e in state["segments"]) / count if count else 0
+            lbl_preview.config(text=f"将生成 {count} 个片段，平均 {engine.format_time(int(avg))}")
+            btn_apply.config(state="normal" if count else "disabled")
+
+        def apply():
+            values = current_settings()
+            if values is None or not state["segments"] or self.export_busy(): return
+            if vid_path not in self.project_data["videos"]:
+                win.destroy()
+                return
+            self.project_data["auto_segment"] = values
+            clips = self.project_data["videos"][vid_path]
+            clips.extend(segmenter.segments_to_clips(state["segments"], clips, self.ent_cat.get()))
+            if self.current_video_path == vid_path: self.refresh_clip_tree()
+            self.trigger_autosave()
+            self.update_status(f"自动分段：已添加 {len(state['segments'])} 个片段", "green")
+            win.destroy()
+
+        def close():
+            control.cancel()
+            win.destroy()
+
+        f_btn = ttk.Frame(win, padding=10)
+        f_btn.pack(fill=tk.X)
+        btn_apply = ttk.Button(f_btn, text="⬇ 添加到片段列表", command=apply, state="disabled", bootstyle="success")
+        btn_apply.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        ttk.Button(f_btn, text="关闭", command=close).pack(side=tk.RIGHT, padx=(5,0))
+        win.protocol("WM_DELETE_WINDOW", close)
+        for var in [var_silence, var_scenes, *num_vars.values()]: var.trace_add("write", preview)
+
+        if state["analysis"] is not None and "keyframes" in (self.probe_cache.peek(vid_path) or {}):
+            preview()
+            return
+
+        # 首次分析 (或还没有关键帧表)：后台读一遍源文件，进度与结果转交主线程
+        def on_progress(pts):
+            info = self.probe_cache.peek(vid_path)
+            duration = info.get("duration") if info else 0
+            text = f"正在分析... {pts / duration * 100:.0f}%" if duration else f"正在分析... {engine.format_time(int(pts))}"
+            self.root.after(0, lambda: win.winfo_exists() and lbl_preview.config(text=text))
+
+        def work():
+            try:
+                info = self.probe_cache.get(vid_path, keyframes=True)  # 切点吸附到关键帧
+                analysis = self.analysis_cache.get(self.ffmpeg_path, vid_path, info, on_progress, control)
+                error = None
+            except segmenter.AnalysisError as e:
+                analysis, error = None, str(e)
+            self.root.after(0, lambda: done(analysis, error))
+
+        def done(analysis, error):
+            if control.cancelled or not win.winfo_exists(): return
+            if analysis is None:
+                lbl_preview.config(text=f"分析失败: {error}")
+                return
+            state["analysis"] = analysis
+            preview()
+
+        lbl_preview.config(text="正在分析...")
+        threading.Thread(target=work, daemon=True).start()
+
+    def open_compilation(self):
+        """合辑窗口：选择分类与视频筛选，即时显示将收入的片段数，确认后在后台拼接 (可用取消按钮中止)"""
+        if not self.ffmpeg_path: return
+        import compilation
+        import cutlist
+        if self.export_thread and self.export_thread.is_alive(): return
+        base_out = self.var_output_dir.get()
+        if not base_out:
+            messagebox.showerror("错误", "请设置输出目录")
+            return
+        state = {"pieces": [], "missing": []}
+
+        win = tk.Toplevel(self.root)
+        win.title("生成合辑 (拼接已导出的片段)")
+        win.geometry("420x240")
+        frame = ttk.Frame(win, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+        var_cat = tk.StringVar(value=self.ent_cat.get())
+        var_match = tk.StringVar()
+        var_name = tk.StringVar()
+        ttk.Label(frame, text="分类:").grid(row=0, column=0, sticky="w", pady=3)
+        ttk.Combobox(frame, width=24, textvariable=var_cat,
+                     values=self.project_data.get("categories", self.default_categories)).grid(row=0, column=1, sticky="w")
+        ttk.Label(frame, text="视频筛选 (路径包含):").grid(row=1, column=0, sticky="w", pady=3)
+        ttk.Entry(frame, width=26, textvariable=var_match).grid(row=1, column=1, sticky="w")
+        ttk.Label(frame, text="合辑文件名:").grid(row=2, column=0, sticky="w", pady=3)
+        ttk.Entry(frame, width=26, textvariable=var_name).grid(row=2, column=1, sticky="w")
+        lbl_preview = ttk.Label(frame, text="", wraplength=380)
+        lbl_preview.grid(row=3, column=0, columnspan=2, sticky="w", pady=10)
+
+        def preview(*args):
+            state["pieces"], state["missing"] = compilation.collect_pieces(
+                self.project_data, var_cat.get().strip(), base_out, self.var_auto_sub.get(), var_match.get().strip())
+            text = f"将按顺序拼接 {len(state['pieces'])} 个已导出的片段"
+            if state["missing"]: text += f"，{len(state['missing'])} 个片段尚未导出 (不收入)"
+            lbl_preview.config(text=text)
+            btn_apply.config(state="normal" if state["pieces"] else "disabled")
+
+        def apply():
+            pieces = state["pieces"]
+            if not pieces: return
+            category = var_cat.get().strip()
+            name = cutlist.clean_name(var_name.get()) or None
+            out_path = compilation.compilation_path(base_out, category, name, os.path.splitext(pieces[0][2])[1])
+            if os.path.exists(out_path) and not messagebox.askyesno("确认覆盖", f"合辑已存在，是否覆盖？\n{out_path}", parent=win): return
+            win.destroy()
+            self.export_control = engine.ExportControl()
+            self.export_thread = threading.Thread(target=self.compile_thread, args=(pieces, out_path, self.export_control))
+            self.btn_run.config(state="disabled")
+            self.btn_compile.config(state="disabled")
+            self.btn_cancel.config(state="normal")
+            self.export_thread.start()
+
+        f_btn = ttk.Frame(win, padding=10)
+        f_btn.pack(fill=tk.X)
+        btn_apply = ttk.Button(f_btn, text="🎞 生成合辑", command=apply, state="disabled", bootstyle="success")
+        btn_apply.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        ttk.Button(f_btn, text="关闭", command=win.destroy).pack(side=tk.RIGHT, padx=(5,0))
+        for var in (var_cat, var_match): var.trace_add("write", preview)
+        preview()
+
+    def compile_thread(self, pieces, out_path, control):
+        import compilation
+        def on_progress(text):
+            self.root.after(0, lambda: self.update_status(f"合辑: {text}"))
+
+        ok, tail, encoded = compilation.build_compilation(self.ffmpeg_path, pieces, out_path, self.probe_cache, on_progress, control)
+        if self.closing: return
+        if control.cancelled:
+            self.root.after(0, lambda: self.update_status("合辑已取消", "orange"))
+        elif ok:
+            msg = f"已生成合辑 ({len(pieces)} 个片段，其中 {encoded} 个因编码参数不同而重编码):\n{out_path}"
+            self.root.after(0, lambda: self.update_status(f"合辑完成: {out_path}", "green"))
+            self.root.after(0, lambda: messagebox.showinfo("合辑完成", msg))
+        else:
+            error = "\n".join([line for line in tail if line][-5:]) or "ffmpeg 执行失败"
+            self.root.after(0, lambda: self.update_status("合辑生成失败", "red"))
+            self.root.after(0, lambda: messagebox.showerror("合辑生成失败", error))
+        self.root.after(0, self.finish_processing)
+
     def select_output(self):
         p = filedialog.askdirectory()
         if p: 
             self.var_output_dir.set(p)
             self.trigger_autosave()
 
-    def start_processing(self):
-        if not self.ffmpeg_path: return
-        threading.Thread(target=self.process_all_thread).start()
+    def export_busy(self):
+        """导出进行中时提示并返回 True：工作线程在写片段状态，不能增删视频/片段或切换项目"""
+        if not self.exporting: return False
+        self.update_status("正在导出，请在导出结束或取消后再进行此操作", "orange")
+        return True
 
-    def process_all_thread(self):
-        self.btn_run.config(state="disabled")
+    def start_processing(self):
+        if not self.ffmpeg_path or self.exporting: return
+        if self.export_thread and self.export_thread.is_alive(): return
+        if self.importing:
+            self.update_status("正在导入文件夹，请在导入完成后再导出", "orange")
+            return
         base_out = self.var_output_dir.get()
         if not base_out:
             messagebox.showerror("错误", "请设置输出目录")
-            self.btn_run.config(state="normal")
             return
+        # 界面设置只在主线程读取，后台线程拿到的都是普通的值
+        settings = {"base_out": base_out, "auto_sub": self.var_auto_sub.get(), "mode": self.get_export_mode(),
+                    "max_workers": self.get_max_workers()}
+        self.exporting = True
+        self.export_control = engine.ExportControl()
+        self.export_thread = threading.Thread(target=self.prepare_export_thread,
+                                              args=(list(self.project_data["videos"]), settings, self.export_control))
+        self.btn_run.config(state="disabled")
+        self.btn_compile.config(state="disabled")
+        self.btn_pause.config(state="normal", text="⏸ 暂停")
+        self.btn_cancel.config(state="normal")
+        self.export_thread.start()
 
-        all_videos = self.project_data["videos"]
-        total_clips = sum(len(v) for v in all_videos.values())
-        processed = 0
-        
-        for vid_path, clips in all_videos.items():
-            if not os.path.exists(vid_path): continue
-            vid_name = os.path.splitext(os.path.basename(vid_path))[0]
-            _, ext = os.path.splitext(vid_path)
-            
-            for clip in clips:
-                if clip['status'] == "完成": 
-                    processed += 1
-                    continue
-                
-                final_dir = base_out
-                if self.var_auto_sub.get(): final_dir = os.path.join(final_dir, vid_name)
-                if clip.get('category'): final_dir = os.path.join(final_dir, clip['category'])
-                
-                if not os.path.exists(final_dir): os.makedirs(final_dir)
-                out_path = os.path.join(final_dir, f"{clip['name']}{ext}")
-                
-                if self.current_video_path == vid_path:
-                    self.root.after(0, lambda c=clip: self.update_row_status(c, "处理中..."))
-
-                cmd = [self.ffmpeg_path, '-y', '-ss', clip['start'], '-to', clip['end'], '-i', vid_path, '-c', 'copy', '-avoid_negative_ts', '1', out_path]
-                
-                try:
-                    startupinfo = subprocess.STARTUPINFO()
-                    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                    subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=startupinfo, check=True)
-                    clip['status'] = "完成"
-                except:
-                    clip['status'] = "失败"
-                
-                processed += 1
-                self.trigger_autosave() 
-                if self.current_video_path == vid_path: self.root.after(0, self.refresh_clip_tree)
-                self.update_status(f"处理进度: {processed}/{total_clips}")
-
-        self.root.after(0, lambda: messagebox.showinfo("功德圆满", "所有视频处理完毕！"))
-        self.root.after(0, lambda: self.btn_run.config(state="normal"))
-
-    def update_row_status(self, clip_obj, status):
-        clip_obj['status'] = status
+    def toggle_pause(self):
+        control = self.export_control
+        if not control or control.cancelled: return
+        if control.paused:
+            control.resume()
+            self.btn_pause.config(text="⏸ 暂停")
+            self.update_status("继续导出...")
+        else:
+            control.pause()
+            self.btn_pause.config(text="▶ 继续")
+            self.update_status("已暂停：正在剪切的片段完成后不再开始新片段", "orange")
+
+    def cancel_processing(self):
+        if not self.export_control: return
+        self.export_control.cancel()
+        self.btn_pause.config(state="disabled")
+        self.btn_cancel.config(state="disabled")
+        self.update_status("正在取消，结束运行中的 ffmpeg 进程...", "orange")
+
+    def finish_processing(self):
+        self.exporting = False
+        self.btn_run.config(state="normal")
+        self.btn_compile.config(state="normal")
+        self.btn_pause.config(state="disabled", text="⏸ 暂停")
+        self.btn_cancel.config(state="disabled")
+
+    def prepare_export_thread(self, videos, settings, control):
+        """读盘的准备工作 (输出清单、源文件指纹) 在后台进行，完成后回到主线程规划任务"""
+        from manifest import OutputManifest
+        try:
+            # 按输出清单判断哪些片段需要 (重新) 剪切；重复素材上的相同片段只剪一次 (指纹通常在导入时已算好)
+            manifest = OutputManifest.load(settings["base_out"])
+            fingerprints = self.fingerprints.compute(videos, settings["max_workers"])
+        except Exception as e:
+            self.root.after(0, lambda: self.abort_export(f"导出准备失败: {e}"))
+            return
+        self.root.after(0, lambda: self.plan_export(settings, manifest, fingerprints, control))
+
+    def plan_export(self, settings, manifest, fingerprints, control):
+        """在主线程上规划导出任务 (遍历项目数据)，再把任务列表交给导出线程"""
+        import staging
+        if self.closing: return
+        if control.cancelled:
+            self.finish_processing()
+            return
+        problems = []
+        jobs, total_clips, skipped = engine.plan_jobs(self.project_data, settings["base_out"], settings["auto_sub"], settings["mode"],
+                                                      manifest, probe_cache=self.probe_cache, problems=problems,
+                                                      source_fingerprints=fingerprints)
         self.refresh_clip_tree()
+        self.report_preflight(jobs, problems)
+        self.export_thread = threading.Thread(target=self.process_all_thread,
+                                              args=(jobs, total_clips, skipped, manifest, settings["max_workers"], self.store,
+                                                    staging.from_project(self.project_data), control))
+        self.export_thread.start()
+
+    def abort_export(self, message):
+        self.finish_processing()
+        if not self.closing: messagebox.showerror("错误", message)
+
+    def process_all_thread(self, jobs, total_clips, skipped, manifest, max_workers, store, staging_cache, control):
+        batch = engine.BatchProgress(jobs, total_clips, skipped)
+        self.clip_progress = {}
+
+        # 引擎回调发生在工作线程，界面更新经 queue_row_update 合并后转交主线程
+        def on_start(job):
+            for clip in job.clips: self.queue_row_update(job.vid_path, clip)
+
+        def on_progress(job, info, batch):
+            for clip in job.clips:
+                self.clip_progress[id(clip)] = info["percent"]
+                self.queue_row_update(job.vid_path, clip)
+            self.queue_row_update(job.vid_path, status_text=engine.describe_progress(batch.snapshot()))
+
+        def on_done(job, ok, processed, total):
+            # 只追加状态日志，不重写整个项目文件
+            for clip in job.clips:
+                self.clip_progress.pop(id(clip), None)
+                store.record_status(job.vid_path, clip)
+                self.queue_row_update(job.vid_path, clip)
+            text = engine.describe_progress(batch.snapshot())
+            if not ok and job.error: text += f" | 最近错误: {job.error.splitlines()[-1]}"
+            self.queue_row_update(job.vid_path, status_text=text)
+
+        error = None
+        try:
+            engine.run_export(self.ffmpeg_path, jobs, total_clips, skipped, max_workers, on_start, on_done, on_progress, batch,
+                              manifest, self.probe_cache, staging=staging_cache, control=control)
+        except Exception as e:
+            error = f"导出出错: {e}"
+        self.root.after(0, store.flush)
+        if error:
+            self.root.after(0, lambda: self.abort_export(error))
+            return
+
+        if self.closing: return
+        if control is not None and control.cancelled:
+            self.root.after(0, lambda: messagebox.showinfo("已取消", "导出已取消，未完成的片段保持等待状态，再次导出时继续。"))
+        else:
+            self.root.after(0, lambda: messagebox.showinfo("功德圆满", "所有视频处理完毕！"))
+        self.root.after(0, self.finish_processing)
+
+    def report_preflight(self, jobs, problems):
+        """导出前预检的结果：无效片段直接记为失败 (不启动 ffmpeg)，重叠等只作提示"""
+        lines = [f"✖ {os.path.basename(job.vid_path)} / {clip['name']}: {job.rejected}"
+                 for job in jobs if job.rejected for clip in job.clips]
+        rejected = len(lines)
+        lines += [f"⚠ {os.path.basename(vid_path)} / {clip['name']}: {text}" for vid_path, clip, text in problems]
+        if not lines: return
+        msg = f"预检发现 {rejected} 个无效片段 (直接标记为失败)，{len(problems)} 条提示:\n\n" + "\n".join(lines[:REPORT_LINES])
+        if len(lines) > REPORT_LINES: msg += "\n..."
+        self.root.after(0, lambda: messagebox.showwarning("导出预检", msg))
 
 if __name__ == "__main__":
     if STYLE_THEME:
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+import engine
+
+# ===========================
+#   输出清单 (按内容指纹判断片段是否需要重新剪切)
+# ===========================
+# 仅凭片段状态 "完成" 判断会出错：输出目录被清空、文件被移走、片段起止时间被修改后，状态都不再反映实际情况。
+# 清单记录每个输出文件的指纹 (源文件身份 + 起止时间 + 剪切参数 + 输出路径) 与文件大小，
+# 导出时只有指纹一致且输出文件仍然存在、大小正常的片段才会跳过，其余片段重新剪切。
+# 清单保存在输出目录中，输出目录整体移动或清空时随之移动或失效。
+# 每条记录先追加到 .journal 日志，定期压缩进清单文件；导出中途崩溃时已完成的片段不会丢失记录。
+
+MANIFEST_NAME = ".clipflow_manifest.json"
+MANIFEST_VERSION = 1
+MIN_OUTPUT_BYTES = 1024       # 小于此大小的输出视为损坏
+SAVE_INTERVAL = 30.0          # 导出过程中清单的最短保存间隔 (秒)
+JOURNAL_SUFFIX = ".journal"
+
+def fingerprint(source_identity, clip, rel_out_path, cut_args=None):
+    """一个输出文件的指纹，任何影响输出内容的因素变化都会改变它"""
+    spec = {
+        "source": [source_identity["path"], source_identity["size"], source_identity["mtime_ns"]],
+        "start": clip["start"],
+        "end": clip["end"],
+        "args": list(cut_args or engine.CUT_ARGS),
+        "output": rel_out_path
+    }
+    raw = json.dumps(spec, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+class OutputManifest:
+    """一个输出目录的清单，线程安全"""
+
+    def __init__(self, root, entries=None):
+        self.root = root
+        self.entries = entries or {}  # 相对路径 -> {"fp": 指纹, "size": 字节数}
+        self._lock = threading.Lock()
+        self._last_save = time.monotonic()
+        self._dirty = False
+
+    @classmethod
+    def load(cls, root):
+        manifest = cls(root)
+        try:
+            with open(manifest.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION: manifest.entries = data.get("entries", {})
+        except (OSError, ValueError):
+            pass
+        manifest._replay_journal()
+        return manifest
+
+    @property
+    def path(self):
+        return os.path.join(self.root, MANIFEST_NAME)
+
+    def _replay_journal(self):
+        """应用上次未压缩的日志 (末尾写坏的行忽略)"""
+        try:
+            f = open(self.path + JOURNAL_SUFFIX, 'r', encoding='utf-8')
+        except OSError:
+            return
+        with f:
+            for line in f:
+                try:
+                    rel, entry = json.loads(line)
+                except (ValueError, TypeError):
+                    continue
+                if entry is None: self.entries.pop(rel, None)
+                else: self.entries[rel] = entry
+                self._dirty = True
+
+    def _append_journal(self, rel, entry):
+        # 调用方持有 self._lock
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.path + JOURNAL_SUFFIX, 'a', encoding='utf-8') as f:
+                f.write(json.dumps([rel, entry], ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+
+    def rel(self, out_path):
+        return os.path.relpath(os.path.abspath(out_path), os.path.abspath(self.root)).replace("\\", "/")
+
+    def fingerprint(self, source_identity, clip, out_path, cut_args=None):
+        return fingerprint(source_identity, clip, self.rel(out_path), cut_args)
+
+    def _output_size(self, out_path):
+        try:
+            size = os.path.getsize(out_path)
+        except OSError:
+            return None
+        return size if size >= MIN_OUTPUT_BYTES else None
+
+    def is_fresh(self, out_path, fp):
+        """输出文件存在、大小正常，且与上次剪切时的指纹和大小一致"""
+        with self._lock:
+            entry = self.entries.get(self.rel(out_path))
+        if not entry or entry.get("fp") != fp: return False
+        return self._output_size(out_path) == entry.get("size")
+
+    def has_entry(self, out_path):
+        with self._lock:
+            return self.rel(out_path) in self.entries
+
+    def adopt(self, out_path, fp):
+        """
+        旧项目迁移：没有清单记录但状态为完成的片段，
+        若输出文件存在且大小正常则直接登记指纹，返回是否登记成功。
+        """
+        size = self._output_size(out_path)
+        if size is None: return False
+        self.record(out_path, fp, size)
+        return True
+
+    def record(self, out_path, fp, size=None):
+        if size is None: size = self._output_size(out_path)
+        if size is None: return
+        rel, entry = self.rel(out_path), {"fp": fp, "size": size}
+        with self._lock:
+            self.entries[rel] = entry
+            self._dirty = True
+            self._append_journal(rel, entry)
+
+    def forget(self, out_path):
+        rel = self.rel(out_path)
+        with self._lock:
+            if self.entries.pop(rel, None) is not None:
+                self._dirty = True
+                self._append_journal(rel, None)
+
+    def save(self, force=True):
+        """
+        原子写入清单并清空日志；force=False 时距上次保存不足 SAVE_INTERVAL 秒则跳过。
+        写入期间持有锁，避免新记录追加到即将删除的日志中。
+        """
+        with self._lock:
+            if not self._dirty: return
+            if not force and time.monotonic() - self._last_save < SAVE_INTERVAL: return
+            self._last_save = time.monotonic()
+            try:
+                os.makedirs(self.root, exist_ok=True)
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({"version": MANIFEST_VERSION, "entries": self.entries}, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+                engine.remove_quietly(self.path + JOURNAL_SUFFIX)
+                self._dirty = False
+            except OSError:
+                pass
@@ -0,0 +1,214 @@
+import os
+import json
+import bisect
+import hashlib
+import subprocess
+import threading
+
+import engine
+
+# ===========================
+#   源视频探测 (时长 / 流信息 / 关键帧) 与磁盘缓存
+# ===========================
+# -c copy 剪切时切点会落到前一个关键帧上，这里提前取得每个源文件的关键帧时间表，
+# 切点的吸附与校验只需查表，不必每次调用 ffmpeg。
+# 缓存以 (路径, 大小, 修改时间) 为键，文件未变化时重新打开项目或再次导出都不会重复探测。
+# 关键帧表要把整个文件读一遍 (NAS 上的大录像很慢)，导入时只探测格式与流信息，
+# 第一次编辑片段或导出时才用 get(path, keyframes=True) 补上；未扫描时信息中没有 "keyframes"。
+
+CACHE_VERSION = 1
+
+def _cache_key(identity):
+    raw = f"{CACHE_VERSION}|{identity['path']}|{identity['size']}|{identity['mtime_ns']}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def _parse_rate(text):
+    try:
+        num, _, den = str(text).partition("/")
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+def _run_ffprobe(ffprobe_path, args):
+    result = subprocess.run([ffprobe_path, '-v', 'error'] + args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            check=True, **engine.subprocess_kwargs())
+    return result.stdout.decode('utf-8', errors='replace')
+
+def probe_media(path, ffprobe_path):
+    """
+    调用 ffprobe 探测一个源文件的格式与流信息 (只读文件头)，返回信息字典；
+    没有视频流时关键帧表直接为空。失败时抛出 OSError / SubprocessError / ValueError
+    """
+    meta = json.loads(_run_ffprobe(ffprobe_path, ['-show_format', '-show_streams', '-of', 'json', path]))
+    fmt = meta.get("format", {})
+    streams = []
+    for st in meta.get("streams", []):
+        info = {"index": st.get("index"), "type": st.get("codec_type"), "codec": st.get("codec_name")}
+        if st.get("codec_type") == "video":
+            info.update(width=st.get("width"), height=st.get("height"), pix_fmt=st.get("pix_fmt"),
+                        fps=_parse_rate(st.get("avg_frame_rate")) or _parse_rate(st.get("r_frame_rate")),
+                        time_base=st.get("time_base"), profile=st.get("profile"))
+        elif st.get("codec_type") == "audio":
+            info.update(sample_rate=int(st.get("sample_rate") or 0), channels=st.get("channels"))
+        streams.append(info)
+
+    info = {
+        "duration": float(fmt.get("duration") or 0.0),
+        "start_time": float(fmt.get("start_time") or 0.0),
+        "format": fmt.get("format_name"),
+        "bit_rate": int(fmt.get("bit_rate") or 0),
+        "streams": streams
+    }
+    if not any(s["type"] == "video" for s in streams): info["keyframes"] = []
+    return info
+
+def probe_keyframes(path, ffprobe_path):
+    """视频流的关键帧时间表：只读取数据包标记 (K)，不解码，速度接近顺序读文件"""
+    keyframes = []
+    out = _run_ffprobe(ffprobe_path, ['-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', path])
+    for line in out.splitlines():
+        pts, _, flags = line.partition(",")
+        if flags.startswith("K"):
+            try:
+                keyframes.append(float(pts))
+            except ValueError:
+                pass
+    keyframes.sort()
+    return keyframes
+
+class ProbeCache:
+    """探测结果缓存：内存一层 + 磁盘每个源文件一个 JSON，线程安全"""
+
+    def __init__(self, ffprobe_path=None, root=None):
+        self.ffprobe_path = ffprobe_path
+        self.root = root or engine.cache_dir("probe")
+        self._mem = {}
+        self._lock = threading.Lock()
+        self._inflight = {}  # 同一文件并发请求时只探测一次
+
+    def _file(self, key):
+        return os.path.join(self.root, key[:2], key + ".json")
+
+    def peek(self, path):
+        """只查缓存，不探测；文件已变化或未缓存时返回 None"""
+        try:
+            key = _cache_key(engine.file_identity(path))
+        except OSError:
+            return None
+        with self._lock:
+            if key in self._mem: return self._mem[key]
+        try:
+            with open(self._file(key), 'r', encoding='utf-8') as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._mem[key] = info
+        return info
+
+    def get(self, path, keyframes=False):
+        """
+        返回源文件信息，必要时探测并写入缓存；无法探测时返回 None。
+        keyframes=True 时确保包含关键帧表 (需要读完整个文件)，扫描失败时返回不含关键帧表的信息。
+        """
+        while True:
+            info = self.peek(path)
+            if (info is not None and (not keyframes or "keyframes" in info)) or not self.ffprobe_path: return info
+            try:
+                identity = engine.file_identity(path)
+            except OSError:
+                return None
+            key = _cache_key(identity)
+
+            with self._lock:
+                event = self._inflight.get(key)
+                owner = event is None
+                if owner: event = self._inflight[key] = threading.Event()
+            if owner: break
+            # 等别的线程探测完再看缓存是否已满足要求
+            event.wait()
+
+        try:
+            if info is None:
+                info = probe_media(path, self.ffprobe_path)
+                info["source"] = identity
+                self._store(key, info)
+            if keyframes and "keyframes" not in info:
+                info = dict(info, keyframes=probe_keyframes(path, self.ffprobe_path))
+                self._store(key, info)
+            return info
+        except (OSError, subprocess.SubprocessError, ValueError):
+            return info
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def _store(self, key, info):
+        self._write(key, info)
+        with self._lock:
+            self._mem[key] = info
+
+    def _write(self, key, info):
+        file_path = self._file(key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = file_path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(info, f, ensure_ascii=False)
+            os.replace(tmp_path, file_path)
+        except OSError:
+            pass
+
+# ===========================
+#      关键帧查表
+# ===========================
+
+def keyframe_before(info, t):
+    """t 时刻及之前最近的关键帧 (stream copy 时起点实际落在这里)；没有关键帧信息时返回 None"""
+    kfs = info.get("keyframes") if info else None
+    if not kfs: return None
+    i = bisect.bisect_right(kfs, t + 1e-6)
+    return kfs[i - 1] if i else kfs[0]
+
+def keyframe_after(info, t):
+    """t 时刻及之后最近的关键帧，没有时返回 None"""
+    kfs = info.get("keyframes") if info else None
+    if not kfs: return None
+    i = bisect.bisect_left(kfs, t - 1e-6)
+    return kfs[i] if i < len(kfs) else None
+
+def snap_to_keyframe(info, t):
+    """把切点吸附到最近的关键帧；没有关键帧信息时原样返回"""
+    before, after = keyframe_before(info, t), keyframe_after(info, t)
+    candidates = [k for k in (before, after) if k is not None]
+    return min(candidates, key=lambda k: abs(k - t)) if candidates else t
+
+def check_cut(info, start, end, tolerance=0.05, stream_copy=True):
+    """
+    校验一个片段 (秒)，返回问题描述列表 (空列表表示没问题)。
+    包括超出视频时长，以及 stream copy 时起点会提前到关键帧的偏移量 (stream_copy=False 时不检查)。
+    """
+    problems = []
+    if not info: return problems
+    duration = info.get("duration") or 0.0
+    if duration and start >= duration:
+        problems.append(f"开始时间超出视频时长 ({duration:.1f} 秒)")
+    elif duration and end > duration + tolerance:
+        problems.append(f"结束时间超出视频时长 ({duration:.1f} 秒)")
+    kf = keyframe_before(info, start) if stream_copy else None
+    if kf is not None and start - kf > tolerance:
+        problems.append(f"起点不在关键帧上，直接复制时将提前 {start - kf:.2f} 秒 (最近关键帧 {kf:.2f})")
+    return problems
+
+def describe(info):
+    """一行概要，用于状态栏显示"""
+    if not info: return "未获取到媒体信息"
+    parts = [f"时长 {engine.format_time(info.get('duration', 0))}"]
+    for st in info.get("streams", []):
+        if st["type"] == "video":
+            parts.append(f"视频 {st['codec']} {st.get('width')}x{st.get('height')} {st.get('fps') or 0:.2f}fps")
+        elif st["type"] == "audio":
+            parts.append(f"音频 {st['codec']} {st.get('sample_rate')}Hz")
+    if "keyframes" in info: parts.append(f"关键帧 {len(info['keyframes'])} 个")
+    return " | ".join(parts)
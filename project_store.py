@@ -0,0 +1,177 @@
+import os
+import json
+import threading
+
+import engine
+
+# ===========================
+#   项目持久化 (合并写入 + 原子替换 + 状态日志)
+# ===========================
+# - 结构性修改 (增删视频/片段、改设置) 调用 request_save()，短时间内的多次修改合并为一次完整保存；
+# - 完整保存先写临时文件再 os.replace，中途崩溃不会留下半截的项目文件；
+# - 导出过程中片段状态变化只追加一行到 <项目>.journal，保存成本与项目大小无关；
+# - 打开项目时回放日志并压缩回项目文件。
+
+JOURNAL_SUFFIX = ".journal"
+SAVE_DELAY = 1.0  # 合并保存的等待时间 (秒)
+
+class SaveTimer:
+    """
+    合并保存的定时器。默认在后台线程中回调；
+    界面传入 schedule(秒, 回调) (基于 root.after)，保存就在主线程执行，不会与界面修改项目数据交错。
+    """
+
+    def __init__(self, delay, callback, schedule=None):
+        self.delay = delay
+        self.callback = callback
+        self.schedule = schedule
+        self._pending = None
+
+    def start(self):
+        """没有待执行的保存时安排一次"""
+        if self._pending is not None: return
+        if self.schedule is None:
+            self._pending = threading.Timer(self.delay, self.callback)
+            self._pending.daemon = True
+            self._pending.start()
+        else:
+            token = self._pending = object()
+            # 取消后又重新安排时，旧的回调作废
+            self.schedule(self.delay, lambda: self._pending is token and self.callback())
+
+    def cancel(self):
+        if isinstance(self._pending, threading.Timer): self._pending.cancel()
+        self._pending = None
+
+def journal_path(project_path):
+    return project_path + JOURNAL_SUFFIX
+
+def replay_journal(data, path):
+    """把日志中的片段状态应用到项目数据上，返回应用的条数 (末尾写坏的行忽略)"""
+    applied = 0
+    try:
+        f = open(path, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return 0
+    with f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                clip = data["videos"][entry["video"]][entry["index"]]
+            except (ValueError, KeyError, IndexError, TypeError):
+                continue
+            # 片段已被改动时跳过，避免把状态写到别的片段上
+            if clip.get("name") != entry.get("name"): continue
+            clip["status"] = entry["status"]
+            applied += 1
+    return applied
+
+class ProjectStore:
+    """一个打开的项目文件，线程安全；未传 schedule 时 on_error(e) 可能在后台线程中回调"""
+
+    def __init__(self, path, data, delay=SAVE_DELAY, on_error=None, schedule=None):
+        self.path = path
+        self.data = data
+        self.delay = delay
+        self.on_error = on_error
+        self._lock = threading.RLock()
+        self._timer = SaveTimer(delay, self.flush, schedule)
+        self._dirty = False
+        self.interrupted = 0  # 打开时发现的上次导出中断的片段数
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        """读取项目文件并回放状态日志；有日志时立即压缩为新的项目文件"""
+        data = engine.load_project(path)
+        store = cls(path, data, **kwargs)
+        if replay_journal(data, journal_path(path)):
+            store.flush()
+        else:
+            store._remove_journal()
+        return store
+
+    # --- 完整保存 ---
+
+    def request_save(self):
+        """标记项目已修改，delay 秒后合并保存一次"""
+        with self._lock:
+            self._dirty = True
+            self._timer.start()
+
+    def flush(self):
+        """立即写入完整项目文件 (原子替换)，并清空状态日志；任何失败都交给 on_error，不抛出"""
+        with self._lock:
+            self._timer.cancel()
+            try:
+                engine.save_project(self.path, self.data)
+                self._dirty = False
+                self._remove_journal()
+            except Exception as e:
+                if self.on_error: self.on_error(e)
+
+    def close(self):
+        self.flush()
+
+    def to_dict(self):
+        """与 SqliteProjectStore.to_dict 对应：项目数据 (已回放状态日志)"""
+        return self.data
+
+    # --- 增量状态日志 ---
+
+    def record_status(self, vid_path, clip):
+        """记录一个片段的状态变化：追加一行日志，不重写整个项目"""
+        with self._lock:
+            # 有待保存的修改时，完整保存会包含该状态，日志只需相对于磁盘上的快照
+            if self._dirty: return
+            clips = self.data["videos"].get(vid_path, [])
+            index = next((i for i, c in enumerate(clips) if c is clip), None)
+            if index is None: return
+            entry = {"video": vid_path, "index": index, "name": clip.get("name"), "status": clip.get("status")}
+            try:
+                with open(journal_path(self.path), 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except OSError as e:
+                if self.on_error: self.on_error(e)
+
+    def clips_with_status(self, status):
+        """按状态查询片段，返回 [(视频路径, 片段序号, 片段), ...]"""
+        return [(path, i, c) for path, clips in self.data["videos"].items()
+                for i, c in enumerate(clips) if c.get("status") == status]
+
+    def _remove_journal(self):
+        try:
+            os.remove(journal_path(self.path))
+        except FileNotFoundError:
+            pass
+
+# ===========================
+#      按文件格式选择存储方式
+# ===========================
+
+def reset_interrupted(store):
+    """
+    上次导出被强制结束或崩溃时，片段会停留在 "处理中..."。
+    把它们恢复为 "等待" (其输出只存在临时文件中，下次导出时重新剪切)，返回恢复的片段数。
+    """
+    count = 0
+    for vid_path, index, _ in store.clips_with_status(engine.STATUS_RUNNING):
+        clip = store.data["videos"][vid_path][index]
+        clip["status"] = engine.STATUS_WAITING
+        store.record_status(vid_path, clip)
+        count += 1
+    return count
+
+def open_project_store(path, **kwargs):
+    """打开项目文件：.db/.sqlite 使用 SQLite 存储，其余按 JSON 处理"""
+    from sqlite_store import SqliteProjectStore, is_sqlite_path
+    store = SqliteProjectStore.open(path, **kwargs) if is_sqlite_path(path) else ProjectStore.open(path, **kwargs)
+    store.interrupted = reset_interrupted(store)
+    return store
+
+def create_project_store(path, data, **kwargs):
+    """以给定的项目数据新建项目文件 (调用方应改用返回值的 data)"""
+    from sqlite_store import SqliteProjectStore, is_sqlite_path
+    if is_sqlite_path(path): return SqliteProjectStore.create(path, data, **kwargs)
+    store = ProjectStore(path, data, **kwargs)
+    store.flush()
+    return store
@@ -0,0 +1,85 @@
+import os
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import engine
+
+# ===========================
+#   文件夹批量导入 (后台扫描 + 并发探测 + 分批回报)
+# ===========================
+
+def normalize_path(path):
+    return path.replace("\\", "/")
+
+def iter_video_files(root):
+    """递归遍历文件夹，按目录顺序产出视频文件路径 (扩展名不区分大小写)"""
+    for folder, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(engine.VIDEO_EXTENSIONS):
+                yield normalize_path(os.path.join(folder, name))
+
+def scan_folder(root, known=(), probe_cache=None, max_workers=None, on_batch=None,
+                batch_size=200, interval=0.25, cancel=None):
+    """
+    扫描文件夹中尚未导入的视频，并在线程池中探测媒体信息 (结果进入探测缓存)。
+    探测完成的文件攒成一批后调用 on_batch([(路径, 信息或 None), ...])，
+    每批最多 batch_size 个、最长间隔 interval 秒。回调发生在调用线程中。
+    cancel 为 threading.Event 时可中途取消。返回新发现的视频数。
+    """
+    results = queue.Queue()
+    seen = set(known)
+    state = {"batch": [], "last": time.monotonic(), "received": 0}
+
+    def emit(force=False):
+        batch = state["batch"]
+        if batch and (force or len(batch) >= batch_size or time.monotonic() - state["last"] >= interval):
+            if on_batch: on_batch(batch)
+            state["batch"] = []
+            state["last"] = time.monotonic()
+
+    def drain(timeout=None):
+        try:
+            while True:
+                item = results.get(timeout=timeout) if timeout else results.get_nowait()
+                state["batch"].append(item)
+                state["received"] += 1
+                timeout = None
+                emit()
+        except queue.Empty:
+            pass
+
+    def probe_one(path):
+        info = None
+        try:
+            if probe_cache: info = probe_cache.get(path)
+        finally:
+            results.put((path, info))
+
+    def stop(pool, futures):
+        # shutdown(cancel_futures=True) 需要 Python 3.9，这里逐个取消尚未开始的探测
+        for future in futures: future.cancel()
+        pool.shutdown(wait=False)
+
+    found = 0
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_workers or engine.DEFAULT_MAX_WORKERS) as pool:
+        for path in iter_video_files(root):
+            if cancel is not None and cancel.is_set():
+                stop(pool, futures)
+                break
+            if path in seen: continue
+            seen.add(path)
+            futures.append(pool.submit(probe_one, path))
+            found += 1
+            drain()
+        while state["received"] < found:
+            if cancel is not None and cancel.is_set():
+                stop(pool, futures)
+                break
+            drain(timeout=interval)
+            emit()
+    drain()
+    emit(force=True)
+    return found
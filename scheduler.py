@@ -0,0 +1,126 @@
+import os
+import platform
+import threading
+from collections import OrderedDict, deque
+
+# ===========================
+#   按存储设备调度剪切任务
+# ===========================
+# stream copy 的瓶颈在读盘：机械硬盘上多个进程同时读不同位置会来回寻道，
+# 网络共享上并发过多会互相抢带宽，而固态硬盘可以全速并发。
+# 这里按源文件所在设备排队，每个设备同时运行的任务数不超过其上限；
+# 同一设备内保持规划时的顺序 (同一源文件的任务相邻、按开始时间排序)，读盘尽量顺序进行，页缓存也能复用。
+
+DEVICE_SSD = "ssd"
+DEVICE_HDD = "hdd"
+DEVICE_NETWORK = "network"
+DEVICE_UNKNOWN = "unknown"
+
+# 每种设备同时运行的任务上限，None 表示只受总并发数限制
+DEVICE_LIMITS = {
+    DEVICE_SSD: None,
+    DEVICE_HDD: 1,
+    DEVICE_NETWORK: 2,
+    DEVICE_UNKNOWN: None
+}
+NETWORK_FS_TYPES = ("nfs", "nfs4", "cifs", "smb3", "smbfs", "afpfs", "fuse.sshfs", "9p", "ceph", "glusterfs")
+
+def _linux_mount_type(path):
+    """/proc/mounts 中包含该路径的最长挂载点的文件系统类型"""
+    best, fs_type = "", None
+    try:
+        with open("/proc/mounts", 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3: continue
+                mount = fields[1].replace("\\040", " ")
+                if (path == mount or path.startswith(mount.rstrip("/") + "/")) and len(mount) > len(best):
+                    best, fs_type = mount, fields[2]
+    except OSError:
+        pass
+    return fs_type
+
+def _linux_rotational(st_dev):
+    """块设备是否为机械硬盘；分区的 queue 信息在上一级设备目录中"""
+    base = f"/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}"
+    for sub in ("queue/rotational", "../queue/rotational"):
+        try:
+            with open(os.path.join(base, sub), 'r') as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+    return None
+
+def _windows_is_remote(path):
+    drive = os.path.splitdrive(os.path.abspath(path))[0]
+    if drive.startswith("\\\\") or drive.startswith("//"): return True
+    try:
+        import ctypes
+        return ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == 4  # DRIVE_REMOTE
+    except (ImportError, AttributeError, OSError):
+        return False
+
+def device_kind(path):
+    """源文件所在存储的类型 (DEVICE_*)，无法判断时返回 DEVICE_UNKNOWN"""
+    if platform.system() == "Windows":
+        return DEVICE_NETWORK if _windows_is_remote(path) else DEVICE_UNKNOWN
+    real = os.path.realpath(path)
+    if platform.system() == "Linux":
+        fs_type = _linux_mount_type(real)
+        if fs_type and (fs_type in NETWORK_FS_TYPES or fs_type.startswith("fuse.")): return DEVICE_NETWORK
+        try:
+            rotational = _linux_rotational(os.stat(real).st_dev)
+        except OSError:
+            return DEVICE_UNKNOWN
+        if rotational is not None: return DEVICE_HDD if rotational else DEVICE_SSD
+    return DEVICE_UNKNOWN
+
+def device_key(path):
+    """区分设备的键：Windows 为盘符或共享名，其他平台为 st_dev"""
+    if platform.system() == "Windows":
+        return os.path.splitdrive(os.path.abspath(path))[0].lower()
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+class IoScheduler:
+    """
+    按设备分队列发放任务，线程安全。
+    工作线程循环调用 acquire() 取任务 (没有可运行的任务时阻塞，全部发完后返回 None)，
+    任务结束后调用 release(job)。
+    """
+
+    def __init__(self, jobs, limits=None):
+        limits = {**DEVICE_LIMITS, **(limits or {})}
+        self._queues = OrderedDict()  # 设备键 -> deque(任务)，按首次出现的顺序
+        self._limits = {}             # 设备键 -> 并发上限
+        self._running = {}
+        self._cond = threading.Condition()
+        devices = {}  # 源文件 -> 设备键 (同一源文件只判断一次)
+        for job in jobs:
+            if job.vid_path not in devices:
+                key = device_key(job.vid_path)
+                devices[job.vid_path] = key
+                if key not in self._limits:
+                    self._limits[key] = limits.get(device_kind(job.vid_path))
+                    self._queues[key] = deque()
+                    self._running[key] = 0
+            self._queues[devices[job.vid_path]].append(job)
+        self._devices = {id(job): devices[job.vid_path] for job in jobs}
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                if not any(self._queues.values()): return None
+                for key, q in self._queues.items():
+                    limit = self._limits[key]
+                    if q and (limit is None or self._running[key] < limit):
+                        self._running[key] += 1
+                        return q.popleft()
+                self._cond.wait()
+
+    def release(self, job):
+        with self._cond:
+            self._running[self._devices[id(job)]] -= 1
+            self._cond.notify_all()
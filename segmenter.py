@@ -0,0 +1,302 @@
+import os
+import json
+import bisect
+import hashlib
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+
+import engine
+
+# ===========================
+#   自动分段 (静音 / 镜头切换检测)
+# ===========================
+# 几个小时的开示录像，逐段手工输入起止时间很费力。这里对源文件做一次流式分析：
+#   音频: 每 LEVEL_WINDOW 秒一个响度值 (astats RMS)；
+#   视频: 只解码关键帧 (-skip_frame nokey)，计算相邻关键帧的画面变化 (scene 分数)。
+# 分析结果是原始序列而不是切点，按源文件身份缓存到磁盘；
+# 调整静音阈值、最短静音、镜头阈值、片段长短时直接在缓存上重新分段，不必再读一遍文件。
+# 镜头切点本身就在关键帧上；静音切点优先取静音区间内的关键帧，直接复制剪切时切点精确。
+# 两路 print 各自缓冲输出，共用标准输出时行会交错甚至被截断，所以同时分析时画面变化写到单独的临时文件。
+
+ANALYSIS_VERSION = 2  # 2: 不再共用标准输出 (旧缓存中的数值可能对错了时间)
+LEVEL_WINDOW = 0.1        # 响度统计窗口 (秒)
+LEVEL_SAMPLE_RATE = 8000  # 分析用的音频采样率，只看响度不需要高采样率
+SILENCE_FLOOR = -120.0    # 完全静音 (-inf dB) 记为此值
+MIN_SCENE_SCORE = 0.05    # 低于此值的画面变化不保存
+SCENE_SIZE = "64:36"      # 计算画面变化前缩小到此尺寸
+PROGRESS_INTERVAL = 0.5   # 分析进度回调的最短间隔 (秒)
+LEVEL_KEY = "lavfi.astats.Overall.RMS_level"
+SCENE_KEY = "lavfi.scene_score"
+
+# 分段参数的默认值 (项目中保存在 "auto_segment" 下)
+DEFAULT_SETTINGS = {
+    "use_silence": True,
+    "silence_db": -40.0,      # 响度低于此值 (dBFS) 视为静音
+    "min_silence": 1.0,       # 静音持续至少这么久 (秒) 才作为切点
+    "use_scenes": False,
+    "scene_threshold": 0.4,   # 画面变化分数 (0~1) 达到此值视为镜头切换
+    "min_len": 60.0,          # 片段最短时长 (秒)，更短的与后面合并
+    "max_len": 900.0,         # 片段最长时长 (秒)，超过时强制切开
+}
+
+class AnalysisError(RuntimeError):
+    """分析失败，消息为 ffmpeg 错误输出的最后几行"""
+
+def settings_from_project(project):
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(project.get("auto_segment") or {})
+    return settings
+
+def filter_path(path):
+    """把文件路径转义为滤镜参数值 (选项层与滤镜图层两级转义)"""
+    for chars in ("\\:'", "\\'[],;"):
+        path = "".join("\\" + c if c in chars else c for c in path)
+    return path
+
+def build_analysis_cmd(ffmpeg_path, vid_path, has_audio=True, has_video=True, scenes_file=None):
+    """
+    一次读取同时输出响度与画面变化：响度由 ametadata 打印到标准输出；
+    画面变化由 metadata 打印到 scenes_file，未给出时打印到标准输出 (只应在只有一路时使用)
+    """
+    graphs, outputs = [], []
+    if has_audio:
+        graphs.append(f"[0:a:0]aformat=channel_layouts=mono,aresample={LEVEL_SAMPLE_RATE},"
+                      f"asetnsamples=n={int(LEVEL_SAMPLE_RATE * LEVEL_WINDOW)}:p=0,"
+                      f"astats=metadata=1:reset=1:measure_perchannel=none:measure_overall=RMS_level,"
+                      f"ametadata=mode=print:key={LEVEL_KEY}:file=-[levels]")
+        outputs += ['-map', '[levels]', '-f', 'null', '-']
+    if has_video:
+        graphs.append(f"[0:v:0]scale={SCENE_SIZE},select='gte(scene\\,0)',"
+                      f"metadata=mode=print:key={SCENE_KEY}:file={filter_path(scenes_file) if scenes_file else '-'}[scenes]")
+        outputs += ['-map', '[scenes]', '-f', 'null', '-']
+    return [ffmpeg_path, '-hide_banner', '-nostats', '-v', 'error', '-skip_frame', 'nokey', '-i', vid_path,
+            '-filter_complex', ";".join(graphs), *outputs]
+
+def metadata_events(lines):
+    """
+    解析 metadata/ametadata 的打印输出，逐个产生 (pts 秒, 键, 值)。
+    每个事件两行: "frame:N pts:X pts_time:T" 与 "键=值"
+    """
+    pts = 0.0
+    for raw in lines:
+        line = raw.decode('utf-8', errors='replace').strip()
+        if line.startswith("frame:"):
+            for token in line.split():
+                if token.startswith("pts_time:"):
+                    try:
+                        pts = float(token[9:])
+                    except ValueError:
+                        pass
+            continue
+        key, _, value = line.partition("=")
+        if key: yield pts, key, value
+
+def analyze(ffmpeg_path, vid_path, info, on_progress=None, control=None):
+    """
+    分析一个源文件，返回 {"window", "levels", "scenes", "duration"}；被取消时返回 None，失败时抛出 AnalysisError。
+    info 为探测信息 (决定分析哪些流)；on_progress(已分析秒数) 在调用线程中回调；
+    control (engine.ExportControl) 可取消分析。
+    """
+    streams = info.get("streams", []) if info else []
+    has_audio = any(s["type"] == "audio" for s in streams)
+    has_video = any(s["type"] == "video" for s in streams)
+    if not has_audio and not has_video: raise AnalysisError("没有可分析的音视频流 (未获取到媒体信息)")
+
+    levels, scenes = [], []
+
+    def record(pts, key, value):
+        try:
+            number = float(value)
+        except ValueError:
+            number = float("-inf") if key == LEVEL_KEY else 0.0
+        if key == LEVEL_KEY:
+            index = int(round(pts / LEVEL_WINDOW))
+            if index >= len(levels): levels.extend([SILENCE_FLOOR] * (index + 1 - len(levels)))
+            levels[index] = round(max(SILENCE_FLOOR, number), 1)
+        elif key == SCENE_KEY and number >= MIN_SCENE_SCORE:
+            scenes.append([round(pts, 3), round(number, 3)])
+
+    scenes_file = None
+    if has_audio and has_video:
+        fd, scenes_file = tempfile.mkstemp(prefix="scenes_", suffix=".txt")
+        os.close(fd)
+    try:
+        cmd = build_analysis_cmd(ffmpeg_path, vid_path, has_audio, has_video, scenes_file)
+        if not _run_printer(cmd, record, on_progress, control): return None
+        # 响度在标准输出上边读边解析 (用于报告进度)，画面变化文件等 ffmpeg 结束后再读
+        if scenes_file:
+            try:
+                with open(scenes_file, 'rb') as f:
+                    for event in metadata_events(f): record(*event)
+            except OSError as e:
+                raise AnalysisError(f"读取画面变化结果失败: {e}") from e
+    finally:
+        if scenes_file: engine.remove_quietly(scenes_file)
+    scenes.sort()
+    duration = info.get("duration") or len(levels) * LEVEL_WINDOW
+    return {"window": LEVEL_WINDOW, "levels": levels, "scenes": scenes, "duration": duration}
+
+def _run_printer(cmd, on_event, on_progress, control):
+    """运行分析命令，标准输出的每个事件交给 on_event；被取消时返回 False，失败时抛出 AnalysisError"""
+    tail = deque(maxlen=engine.STDERR_TAIL_LINES)
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **engine.subprocess_kwargs())
+    except OSError as e:
+        raise AnalysisError(str(e)) from e
+    if control is not None: control.register(proc)
+    reader = threading.Thread(target=lambda: tail.extend(l.decode('utf-8', errors='replace').rstrip() for l in proc.stderr),
+                              daemon=True)
+    reader.start()
+    last_report = 0.0
+    try:
+        for pts, key, value in metadata_events(proc.stdout):
+            on_event(pts, key, value)
+            now = time.monotonic()
+            if on_progress and now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                on_progress(pts)
+        proc.wait()
+    finally:
+        if control is not None: control.unregister(proc)
+        reader.join()
+    if control is not None and control.cancelled: return False
+    if proc.returncode != 0: raise AnalysisError("\n".join(list(tail)[-5:]) or "ffmpeg 分析失败")
+    return True
+
+# ===========================
+#   分析结果缓存
+# ===========================
+
+def _cache_key(identity):
+    raw = f"{ANALYSIS_VERSION}|{identity['path']}|{identity['size']}|{identity['mtime_ns']}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+class AnalysisCache:
+    """分析结果缓存：磁盘上每个源文件一个 JSON，以源文件身份为键，线程安全"""
+
+    def __init__(self, root=None):
+        self.root = root or engine.cache_dir("analysis")
+        self._mem = {}
+        self._lock = threading.Lock()
+
+    def _file(self, key):
+        return os.path.join(self.root, key + ".json")
+
+    def peek(self, path):
+        """只查缓存；文件已变化或未分析过时返回 None"""
+        try:
+            key = _cache_key(engine.file_identity(path))
+        except OSError:
+            return None
+        with self._lock:
+            if key in self._mem: return self._mem[key]
+        try:
+            with open(self._file(key), 'r', encoding='utf-8') as f:
+                analysis = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._mem[key] = analysis
+        return analysis
+
+    def get(self, ffmpeg_path, path, info, on_progress=None, control=None):
+        """返回分析结果，没有缓存时分析并写入缓存；被取消时返回 None，失败时抛出 AnalysisError"""
+        analysis = self.peek(path)
+        if analysis is not None: return analysis
+        try:
+            key = _cache_key(engine.file_identity(path))
+        except OSError:
+            return None
+        analysis = analyze(ffmpeg_path, path, info, on_progress, control)
+        if analysis is None: return None
+        file_path = self._file(key)
+        tmp_path = file_path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(analysis, f, separators=(",", ":"))
+            os.replace(tmp_path, file_path)
+        except OSError:
+            engine.remove_quietly(tmp_path)
+        with self._lock:
+            self._mem[key] = analysis
+        return analysis
+
+# ===========================
+#   按参数分段 (只用缓存的序列，瞬间完成)
+# ===========================
+
+def silences(analysis, silence_db, min_silence):
+    """响度低于 silence_db 且持续至少 min_silence 秒的区间 [(开始, 结束), ...]"""
+    window, result, run = analysis["window"], [], None
+    levels = analysis["levels"]
+    for i, level in enumerate(levels + [0.0]):  # 末尾哨兵，收尾最后一段静音
+        if i < len(levels) and level < silence_db:
+            if run is None: run = i
+        elif run is not None:
+            if (i - run) * window >= min_silence: result.append((run * window, i * window))
+            run = None
+    return result
+
+def propose_segments(analysis, settings=None, keyframes=None):
+    """
+    按参数把整个源文件分成 [(开始, 结束), ...] (秒)。
+    切点为静音区间 (优先取其中的关键帧，否则取中点) 与镜头切换处；首尾的静音不计入片段。
+    短于 min_len 的片段与后面合并，长于 max_len 的在关键帧处强制切开。
+    """
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    min_len = max(0.0, settings["min_len"])
+    max_len = max(1.0, min_len, settings["max_len"])
+    begin, finish = 0.0, analysis["duration"]
+    cuts = []
+    if settings["use_silence"] and analysis["levels"]:
+        for s, e in silences(analysis, settings["silence_db"], settings["min_silence"]):
+            if s <= begin:
+                begin = e
+                continue
+            if e >= finish:
+                finish = s
+                continue
+            mid = (s + e) / 2
+            inside = [k for k in (keyframes or ()) if s <= k <= e]
+            cuts.append(min(inside, key=lambda k: abs(k - mid)) if inside else mid)
+    if settings["use_scenes"]:
+        cuts += [t for t, score in analysis["scenes"] if score >= settings["scene_threshold"]]
+    cuts = sorted(t for t in set(cuts) if begin < t < finish)
+
+    def forced_cut(start):
+        # 在 (start + min_len, start + max_len] 内最晚的关键帧处切开，没有时按时长切
+        limit = start + max_len
+        i = bisect.bisect_right(keyframes or [], limit)
+        if keyframes and i and keyframes[i - 1] > start + min_len: return keyframes[i - 1]
+        return limit
+
+    segments, start = [], begin
+    for cut in cuts + [finish]:
+        while cut - start > max_len:
+            forced = forced_cut(start)
+            segments.append((start, forced))
+            start = forced
+        if cut - start >= min_len:
+            segments.append((start, cut))
+            start = cut
+    if finish - start > 0:
+        # 末尾不足 min_len 的部分并入上一段 (不超过 max_len 时)
+        if segments and finish - segments[-1][0] <= max_len:
+            segments[-1] = (segments[-1][0], finish)
+        else:
+            segments.append((start, finish))
+    return segments
+
+def segments_to_clips(segments, existing, category="", prefix="auto"):
+    """把分段结果转为片段字典，名称 prefix_001 起编号并避开 existing 中已有的名称"""
+    taken = {c['name'] for c in existing}
+    clips, n = [], 0
+    for s, e in segments:
+        n += 1
+        while f"{prefix}_{n:03d}" in taken: n += 1
+        clips.append({"start": engine.format_time(round(s, 3)), "end": engine.format_time(round(e, 3)),
+                      "category": category, "name": f"{prefix}_{n:03d}", "status": engine.STATUS_WAITING})
+    return clips
@@ -0,0 +1,180 @@
+import os
+import shutil
+
+import engine
+import probe
+
+# ===========================
+#   精确剪切 (只重编码首尾 GOP)
+# ===========================
+# -c copy 只能从关键帧开始，片段会提前开始；整段重编码又慢几十倍。
+# 这里把一个片段拆成三段：
+#   [开始, 第一个关键帧)      重编码
+#   [第一个关键帧, 最后关键帧) 直接复制 (segment 复用器在关键帧处精确截断)
+#   [最后关键帧, 结束)        重编码
+# 各段只含视频，用 concat 拼接后再与按片段起止重编码的音频合流 (音频编码很快，且避免拼接处的音画错位)。
+# 拼接后的文件只保留第一段的编码头 (SPS/PPS 等参数集)，重编码段与复制段的参数集不同，
+# 所以各段都把参数集写进每个关键帧的码流里 (复制段用 INBAND_HEADER_BSF，重编码段用 REPEAT_HEADER_ARGS)，
+# 解码器在每段开头切换到该段的参数集。拼接后在各拼接处解码一小段，出错时该片段记为失败。
+# 中间文件为 .mkv，放在输出目录下以输出文件命名的临时文件夹中，结束后删除。
+# 没有探测信息、没有关键帧表或源编码没有对应的编码器时回退为直接复制剪切。
+
+# 源视频编码 -> 重编码参数 (与源编码一致，拼接后才能直接复制)
+VIDEO_ENCODERS = {
+    "h264": ('libx264', '-preset', 'veryfast', '-crf', '18'),
+    "hevc": ('libx265', '-preset', 'veryfast', '-crf', '20'),
+    "mpeg4": ('mpeg4', '-q:v', '2'),
+    "mpeg2video": ('mpeg2video', '-q:v', '2'),
+    "vp9": ('libvpx-vp9', '-crf', '24', '-b:v', '0'),
+}
+AUDIO_ENCODERS = {
+    "aac": ('aac', '-b:a', '192k'),
+    "mp3": ('libmp3lame', '-b:a', '192k'),
+    "ac3": ('ac3', '-b:a', '192k'),
+    "opus": ('libopus', '-b:a', '128k'),
+    "flac": ('flac',),
+    "pcm_s16le": ('pcm_s16le',),
+}
+DEFAULT_AUDIO_ENCODER = AUDIO_ENCODERS["aac"]
+# 重编码时在每个关键帧前重复参数集 (与其他段拼接、从中间 seek 时都能取到本段的参数集)
+REPEAT_HEADER_ARGS = {
+    "h264": ('-x264-params', 'repeat-headers=1'),
+    "hevc": ('-x265-params', 'repeat-headers=1'),
+    "mpeg4": ('-bsf:v', 'dump_extra'),
+    "mpeg2video": ('-bsf:v', 'dump_extra'),
+}
+# 直接复制时把源文件的参数集插入每个关键帧之前的码流过滤器 (VP9 没有独立的参数集)
+INBAND_HEADER_BSF = {
+    "h264": "h264_mp4toannexb",
+    "hevc": "hevc_mp4toannexb",
+    "mpeg4": "dump_extra",
+    "mpeg2video": "dump_extra",
+}
+# 参与输出指纹计算，修改上面的编码设置时应同步修改版本号
+FINGERPRINT_ARGS = ('smart', 2)
+KEYFRAME_TOLERANCE = 0.02  # 切点与关键帧相差不超过此值 (秒) 时视为落在关键帧上
+SEEK_EPSILON = 0.001       # 复制段的 seek 位置略晚于关键帧，避免浮点误差落到前一个关键帧
+SEGMENT_MARGIN = 1.0       # 复制段多读的时长 (秒)，保证读到截断处的关键帧
+DECODE_CHECK_SECONDS = 2.0  # 拼接后在每个拼接处解码的时长 (秒)
+
+def plan_parts(info, start, end):
+    """把 [start, end) 拆成 [("encode"|"copy", 起, 止), ...]；区间内没有关键帧时整段重编码"""
+    tol = KEYFRAME_TOLERANCE
+    first = probe.keyframe_after(info, start - tol)
+    if first is None or first >= end - tol: return [("encode", start, end)]
+    last = probe.keyframe_before(info, end)
+    parts = []
+    if first - start > tol: parts.append(("encode", start, first))
+    if last - first > tol: parts.append(("copy", first, last))
+    if end - last > tol: parts.append(("encode", last, end))
+    return parts
+
+def video_encoder_args(info):
+    """与源视频一致的编码参数，源编码不支持时返回 None"""
+    video = next((s for s in info.get("streams", []) if s["type"] == "video"), None) if info else None
+    if not video or video.get("codec") not in VIDEO_ENCODERS: return None
+    args = codec_encoder_args(video["codec"])
+    if video.get("pix_fmt"): args += ['-pix_fmt', video["pix_fmt"]]
+    return args
+
+def codec_encoder_args(codec):
+    """重编码为 codec 的 -c:v 参数 (codec 须在 VIDEO_ENCODERS 中)，参数集写在每个关键帧前"""
+    return ['-c:v', *VIDEO_ENCODERS[codec], *REPEAT_HEADER_ARGS.get(codec, ())]
+
+def inband_header_args(codec):
+    """直接复制 codec 视频时把参数集写进码流的 -bsf:v 参数，不需要时为空"""
+    return ['-bsf:v', INBAND_HEADER_BSF[codec]] if codec in INBAND_HEADER_BSF else []
+
+def audio_encoder_args(info):
+    audio = next((s for s in info.get("streams", []) if s["type"] == "audio"), None)
+    if not audio: return []
+    return ['-c:a', *AUDIO_ENCODERS.get(audio.get("codec"), DEFAULT_AUDIO_ENCODER)]
+
+def build_part_cmd(ffmpeg_path, vid_path, part, encoder_args, part_path, copy_args=()):
+    kind, s, e = part
+    if kind == "encode":
+        # 重编码时 ffmpeg 从前一个关键帧解码并丢弃 s 之前的帧，起点精确到帧
+        return [ffmpeg_path, '-y', '-ss', f"{s:.6f}", '-i', vid_path, '-t', f"{e - s:.6f}", '-an', *encoder_args, part_path]
+    # 直接复制按解码顺序截断会多带下一个关键帧，改用 segment 复用器在关键帧 e 处切开，只保留第一段
+    root, ext = os.path.splitext(part_path)
+    pattern = root.replace("%", "%%") + "_%03d" + ext
+    return [ffmpeg_path, '-y', '-ss', f"{s + SEEK_EPSILON:.6f}", '-i', vid_path, '-t', f"{e - s + SEGMENT_MARGIN:.6f}",
+            '-an', '-c', 'copy', *copy_args, '-f', 'segment', '-segment_times', f"{e - s:.6f}", '-reset_timestamps', '1', pattern]
+
+def copied_part_path(part_path):
+    root, ext = os.path.splitext(part_path)
+    return root + "_000" + ext
+
+def check_joins(ffmpeg_path, path, joins, control=None):
+    """
+    在各拼接处 (path 时间轴上的秒数) 前后解码 DECODE_CHECK_SECONDS 秒，返回 (是否没有解码错误, 错误输出末尾行)。
+    拼接两侧的参数集对不上时解码器会报错，这里在交给用户之前发现。
+    解码出的帧按序号重新编时间戳，拼接处时间戳重叠一帧时空输出不报错，只检查解码本身。
+    """
+    for t in joins:
+        cmd = [ffmpeg_path, '-v', 'error', '-xerror', '-ss', f"{max(0.0, t - DECODE_CHECK_SECONDS / 2):.3f}", '-i', path,
+               '-t', f"{DECODE_CHECK_SECONDS:.3f}", '-map', '0:v:0', '-vf', 'setpts=N', '-f', 'null', '-']
+        ok, tail = engine.run_ffmpeg(cmd, None, control)
+        if not ok or any(tail):
+            if control is not None and control.cancelled: return False, tail
+            return False, [f"拼接处 {engine.format_time(round(t, 3))} 解码出错", *tail]
+    return True, []
+
+def smart_cut(ffmpeg_path, job, items, probe_cache=None, on_block=None, control=None):
+    """
+    精确剪切一个片段 (job 只含一个片段)，items 为实际写入的 [(片段, 输出路径)]，返回 (是否成功, 错误输出末尾行)。
+    on_block(block) 收到换算为整个片段时间轴的 ffmpeg 进度；control 为 engine.ExportControl。
+    """
+    clip, out_path = items[0]
+    source = job.input_path or job.vid_path
+    info = probe_cache.get(job.vid_path, keyframes=True) if probe_cache else None
+    encoder_args = video_encoder_args(info)
+    start, end = engine.parse_time(clip['start']), engine.parse_time(clip['end'])
+    if encoder_args is None or not info.get("keyframes") or start is None or end is None or end <= start:
+        return engine.run_ffmpeg(engine.build_cut_cmd(ffmpeg_path, source, items), on_block, control)
+
+    def relay(offset, final):
+        def handle(block):
+            # 合流阶段的时间轴从头开始，只转发结束标记
+            if on_block is None or (final and block.get("progress") != "end"): return
+            block = dict(block)
+            try:
+                block["out_time_us"] = str(int(block.get("out_time_us", "0")) + int(offset * 1e6))
+            except ValueError:
+                pass
+            if not final and block.get("progress") == "end": block["progress"] = "continue"
+            on_block(block)
+        return handle
+
+    # 临时目录按输出文件命名，上次崩溃留下的同名目录在这里清掉
+    tmp_dir = os.path.join(os.path.dirname(out_path) or ".", f".{os.path.basename(out_path)}.smart")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    try:
+        os.makedirs(tmp_dir)
+    except OSError as e:
+        return False, [str(e)]
+    try:
+        files = []
+        parts = plan_parts(info, start, end)
+        copy_args = inband_header_args(next(s for s in info["streams"] if s["type"] == "video")["codec"])
+        for i, part in enumerate(parts):
+            part_path = os.path.join(tmp_dir, f"part{i}.mkv")
+            ok, tail = engine.run_ffmpeg(build_part_cmd(ffmpeg_path, source, part, encoder_args, part_path, copy_args),
+                                         relay(part[1] - start, False), control)
+            if not ok: return ok, tail
+            files.append(copied_part_path(part_path) if part[0] == "copy" else part_path)
+
+        list_path = os.path.join(tmp_dir, "parts.txt")
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for path in files: f.write(f"file '{os.path.basename(path)}'\n")
+        cmd = [ffmpeg_path, '-y', '-f', 'concat', '-safe', '0', '-i', list_path,
+               '-ss', engine.format_time(start), '-to', engine.format_time(end), '-i', source,
+               '-map', '0:v', '-map', '1:a:0?', '-c:v', 'copy', *audio_encoder_args(info),
+               '-avoid_negative_ts', '1', out_path]
+        ok, tail = engine.run_ffmpeg(cmd, relay(0.0, True), control)
+        if not ok: return ok, tail
+        return check_joins(ffmpeg_path, out_path, [part[1] - start for part in parts[1:]], control)
+    except OSError as e:
+        return False, [str(e)]
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
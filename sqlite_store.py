@@ -0,0 +1,271 @@
+import os
+import json
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+import engine
+from project_store import SAVE_DELAY, SaveTimer
+
+# ===========================
+#   SQLite 项目格式 (适用于数千个源视频的大型项目)
+# ===========================
+# - 视频路径、分类、状态均有索引，"所有失败片段" 之类的查询无需遍历整个项目；
+# - 打开项目只读取视频路径列表，片段在首次访问某个视频时才加载；
+# - 对外提供与 ProjectStore 相同的接口 (data / request_save / flush / close / record_status)，
+#   界面和命令行无需关心项目文件的格式。
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS videos (
+    id       INTEGER PRIMARY KEY,
+    path     TEXT NOT NULL UNIQUE,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clips (
+    id       INTEGER PRIMARY KEY,
+    video_id INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    start    TEXT NOT NULL,
+    "end"    TEXT NOT NULL,
+    category TEXT NOT NULL DEFAULT '',
+    name     TEXT NOT NULL,
+    status   TEXT NOT NULL DEFAULT '等待',
+    extra    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_videos_position ON videos(position);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_clips_video ON clips(video_id, position);
+CREATE INDEX IF NOT EXISTS idx_clips_category ON clips(category);
+CREATE INDEX IF NOT EXISTS idx_clips_status ON clips(status);
+"""
+
+# 片段中有独立列的字段，其余字段以 JSON 存入 extra 列
+CLIP_COLUMNS = ("start", "end", "category", "name", "status")
+_COLUMN_KEYS = frozenset(CLIP_COLUMNS)
+
+def is_sqlite_path(path):
+    return path.lower().endswith(SQLITE_SUFFIXES)
+
+def _clip_row(clip):
+    extra = clip.keys() - _COLUMN_KEYS
+    if extra: extra = {k: v for k, v in clip.items() if k in extra}
+    return (clip.get("start", ""), clip.get("end", ""), clip.get("category") or "",
+            clip.get("name", ""), clip.get("status", engine.STATUS_WAITING),
+            json.dumps(extra, ensure_ascii=False) if extra else None)
+
+def _row_clip(row):
+    clip = dict(zip(CLIP_COLUMNS, row[:5]))
+    if row[5]: clip.update(json.loads(row[5]))
+    return clip
+
+class LazyVideos(MutableMapping):
+    """
+    项目中的 "videos" 字典：{视频路径: [片段, ...]}。
+    键 (路径) 在打开时一次读入，片段列表在首次访问时从数据库加载并缓存。
+    同时记下每个已加载视频在数据库中的片段行，保存时只重写与之不同的视频 (导出前规划会加载全部视频)。
+    """
+
+    def __init__(self, conn, lock):
+        self._conn = conn
+        self._lock = lock
+        with lock:
+            rows = conn.execute("SELECT path FROM videos ORDER BY position").fetchall()
+        self._paths = [r[0] for r in rows]
+        self._known = set(self._paths)
+        self._loaded = {}
+        self._saved = {}  # 路径 -> 数据库中的片段行 (_clip_row 的格式)，没有记录的视频保存时总会重写
+
+    def __getitem__(self, path):
+        clips = self._loaded.get(path)
+        if clips is not None: return clips
+        if path not in self._known: raise KeyError(path)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.start, c.\"end\", c.category, c.name, c.status, c.extra FROM clips c "
+                "JOIN videos v ON v.id = c.video_id WHERE v.path = ? ORDER BY c.position", (path,)).fetchall()
+        clips = [_row_clip(r) for r in rows]
+        self._loaded[path] = clips
+        self._saved[path] = [tuple(r) for r in rows]
+        return clips
+
+    def __setitem__(self, path, clips):
+        if path not in self._known:
+            self._known.add(path)
+            self._paths.append(path)
+        self._loaded[path] = clips
+        self._saved.pop(path, None)
+
+    def __delitem__(self, path):
+        if path not in self._known: raise KeyError(path)
+        self._known.remove(path)
+        self._paths.remove(path)
+        self._loaded.pop(path, None)
+        self._saved.pop(path, None)
+
+    def __contains__(self, path):
+        return path in self._known
+
+    def __iter__(self):
+        return iter(list(self._paths))
+
+    def __len__(self):
+        return len(self._paths)
+
+    def changed_items(self):
+        """已加载且与数据库中不同的视频，返回 [(路径, 片段行), ...]"""
+        changed = []
+        for path, clips in self._loaded.items():
+            rows = [_clip_row(c) for c in clips]
+            if rows != self._saved.get(path): changed.append((path, rows))
+        return changed
+
+    def mark_saved(self, path, rows):
+        self._saved[path] = rows
+
+    def mark_status_saved(self, path, index, status):
+        """单独写入了一个片段的状态 (其余字段的改动仍由保存时写入)"""
+        rows = self._saved.get(path)
+        if rows is not None and index < len(rows): rows[index] = rows[index][:4] + (status,) + rows[index][5:]
+
+class SqliteProjectStore:
+    """SQLite 格式的项目，线程安全；未传 schedule 时 on_error(e) 可能在后台线程中回调"""
+
+    def __init__(self, path, conn, delay=SAVE_DELAY, on_error=None, schedule=None):
+        self.path = path
+        self.delay = delay
+        self.on_error = on_error
+        self._conn = conn
+        self._lock = threading.RLock()
+        self._timer = SaveTimer(delay, self.flush, schedule)
+        self._dirty = False
+        self.interrupted = 0  # 打开时发现的上次导出中断的片段数
+        self.data = self._load_settings()
+        self.data["videos"] = LazyVideos(conn, self._lock)
+
+    # --- 打开 / 新建 ---
+
+    @staticmethod
+    def _connect(path):
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(SCHEMA)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        return conn
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        if not os.path.exists(path): raise FileNotFoundError(path)
+        return cls(path, cls._connect(path), **kwargs)
+
+    @classmethod
+    def create(cls, path, data, **kwargs):
+        """用一个 JSON 结构的项目数据新建 (或覆盖) SQLite 项目"""
+        conn = cls._connect(path)
+        with conn:
+            conn.execute("DELETE FROM clips")
+            conn.execute("DELETE FROM videos")
+            conn.execute("DELETE FROM settings")
+            _write_settings(conn, data)
+            for pos, (vid_path, clips) in enumerate(data.get("videos", {}).items()):
+                vid = conn.execute("INSERT INTO videos (path, position) VALUES (?, ?)", (vid_path, pos)).lastrowid
+                _write_clips(conn, vid, clips)
+        return cls(path, conn, **kwargs)
+
+    def _load_settings(self):
+        data = engine.new_project()
+        with self._lock:
+            for key, value in self._conn.execute("SELECT key, value FROM settings"):
+                data[key] = json.loads(value)
+        return data
+
+    # --- 保存 ---
+
+    def request_save(self):
+        with self._lock:
+            self._dirty = True
+            self._timer.start()
+
+    def flush(self):
+        """写入设置、视频列表以及有改动的视频的片段 (未加载的视频不会被改动，无需重写)"""
+        with self._lock:
+            self._timer.cancel()
+            videos = self.data["videos"]
+            try:
+                with self._conn:
+                    _write_settings(self._conn, self.data)
+                    ids, positions = {}, {}
+                    for path, vid, pos in self._conn.execute("SELECT path, id, position FROM videos"):
+                        ids[path], positions[path] = vid, pos
+                    for path in set(ids) - set(videos):
+                        self._conn.execute("DELETE FROM videos WHERE id = ?", (ids.pop(path),))
+                    # 只更新顺序变化了的视频
+                    for pos, path in enumerate(videos):
+                        if path not in ids:
+                            ids[path] = self._conn.execute("INSERT INTO videos (path, position) VALUES (?, ?)", (path, pos)).lastrowid
+                        elif positions[path] != pos:
+                            self._conn.execute("UPDATE videos SET position = ? WHERE id = ?", (pos, ids[path]))
+                    changed = videos.changed_items()
+                    for path, rows in changed:
+                        self._conn.execute("DELETE FROM clips WHERE video_id = ?", (ids[path],))
+                        _write_rows(self._conn, ids[path], rows)
+                for path, rows in changed: videos.mark_saved(path, rows)
+                self._dirty = False
+            except Exception as e:
+                if self.on_error: self.on_error(e)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def record_status(self, vid_path, clip):
+        """单条 UPDATE 记录片段状态；有待保存的修改时交给 flush 一并写入"""
+        with self._lock:
+            if self._dirty: return
+            clips = self.data["videos"].get(vid_path, [])
+            index = next((i for i, c in enumerate(clips) if c is clip), None)
+            if index is None: return
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE clips SET status = ? WHERE position = ? AND video_id = (SELECT id FROM videos WHERE path = ?)",
+                        (clip.get("status"), index, vid_path))
+                self.data["videos"].mark_status_saved(vid_path, index, clip.get("status"))
+            except sqlite3.Error as e:
+                if self.on_error: self.on_error(e)
+
+    # --- 查询 ---
+
+    def clips_with_status(self, status):
+        """按状态查询片段 (走 status 索引)，返回 [(视频路径, 片段序号, 片段), ...]"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT v.path, c.position, c.start, c.\"end\", c.category, c.name, c.status, c.extra "
+                "FROM clips c JOIN videos v ON v.id = c.video_id WHERE c.status = ? "
+                "ORDER BY v.position, c.position", (status,)).fetchall()
+        return [(r[0], r[1], _row_clip(r[2:])) for r in rows]
+
+    def to_dict(self):
+        """导出为与 default_project.json 相同结构的普通字典 (会加载全部片段)"""
+        data = {k: v for k, v in self.data.items() if k != "videos"}
+        data["videos"] = {path: list(self.data["videos"][path]) for path in self.data["videos"]}
+        return data
+
+def _write_settings(conn, data):
+    conn.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                     [(k, json.dumps(v, ensure_ascii=False)) for k, v in data.items() if k != "videos"])
+
+def _write_clips(conn, video_id, clips):
+    _write_rows(conn, video_id, [_clip_row(c) for c in clips])
+
+def _write_rows(conn, video_id, rows):
+    conn.executemany(
+        "INSERT INTO clips (video_id, position, start, \"end\", category, name, status, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(video_id, pos) + row for pos, row in enumerate(rows)])
@@ -0,0 +1,148 @@
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import engine
+
+# ===========================
+#   网络源文件预读缓存 (本地暂存 + LRU 淘汰)
+# ===========================
+# 源文件在 SMB/NFS 共享上时，每个片段都要让 ffmpeg 隔着网络 seek，延迟叠加在剪切时间上。
+# 剪切第 N 个源文件时，后台把第 N+1 个顺序复制到本地暂存目录，轮到它时直接读本地副本，
+# 网络传输与剪切重叠进行。
+# 暂存目录有总大小上限，超出时按最近使用时间 (文件 mtime) 淘汰，正在使用的副本不会被淘汰。
+# 副本以源文件身份 (路径, 大小, 修改时间) 命名，源文件变化后旧副本自然失效并最终被淘汰。
+
+DEFAULT_MAX_BYTES = engine.DEFAULT_STAGING_GB * 1024 ** 3
+COPY_BUFFER = 4 * 1024 * 1024
+PART_SUFFIX = ".part"
+
+def _staged_name(identity):
+    raw = f"{identity['path']}|{identity['size']}|{identity['mtime_ns']}"
+    ext = os.path.splitext(identity["path"])[1]
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest() + ext
+
+def from_project(project, root=None):
+    """按项目设置创建暂存缓存，未启用时返回 None"""
+    if not project.get("staging"): return None
+    try:
+        max_bytes = int(float(project.get("staging_max_gb") or engine.DEFAULT_STAGING_GB) * 1024 ** 3)
+    except (TypeError, ValueError):
+        max_bytes = DEFAULT_MAX_BYTES
+    return StagingCache(root, max_bytes)
+
+class StagingCache:
+    """本地暂存目录，线程安全；同一时间只复制一个文件，避免多路读取拖慢网络共享"""
+
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root or engine.cache_dir("staging")
+        os.makedirs(self.root, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._inflight = {}  # 源文件 -> Future
+        self._pins = {}      # 本地副本 -> 使用中的任务数
+        self._abort = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._cleanup_parts()
+
+    def _cleanup_parts(self):
+        # 上次中断时留下的半截副本
+        for name in os.listdir(self.root):
+            if name.endswith(PART_SUFFIX):
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except OSError:
+                    pass
+
+    def _local_path(self, path):
+        try:
+            identity = engine.file_identity(path)
+        except OSError:
+            return None, 0
+        return os.path.join(self.root, _staged_name(identity)), identity["size"]
+
+    def prefetch(self, path):
+        """在后台复制源文件到暂存目录 (已暂存、正在复制或超过总大小上限时不做任何事)"""
+        local, size = self._local_path(path)
+        if local is None or size > self.max_bytes or os.path.exists(local): return
+        with self._lock:
+            if path in self._inflight: return
+            self._inflight[path] = self._pool.submit(self._copy, path, local, size)
+
+    def _copy(self, path, local, size):
+        tmp_path = local + PART_SUFFIX
+        try:
+            # 腾不出空间 (其余副本都在使用中) 时放弃预读，直接读源文件
+            if not self._evict(size): return
+            with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                while not self._abort.is_set():
+                    chunk = src.read(COPY_BUFFER)
+                    if not chunk: break
+                    dst.write(chunk)
+            if self._abort.is_set(): raise OSError("预读已中止")
+            os.replace(tmp_path, local)
+        except OSError:
+            engine.remove_quietly(tmp_path)
+        finally:
+            with self._lock:
+                self._inflight.pop(path, None)
+
+    def _evict(self, needed):
+        """按最近使用时间淘汰副本，直到能放下 needed 字节，返回是否放得下"""
+        entries = []
+        for name in os.listdir(self.root):
+            full = os.path.join(self.root, name)
+            try:
+                st = os.stat(full)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, full))
+        total = sum(size for _, size, _ in entries)
+        for _, size, full in sorted(entries):
+            if total + needed <= self.max_bytes: return True
+            with self._lock:
+                if self._pins.get(full) or full.endswith(PART_SUFFIX): continue
+            try:
+                os.remove(full)
+                total -= size
+            except OSError:
+                pass
+        return total + needed <= self.max_bytes
+
+    def acquire(self, path):
+        """
+        返回可供读取的本地副本路径并标记为使用中；正在复制时等待复制完成，
+        没有副本时返回 None (直接读源文件)。返回非 None 时任务结束后须调用 release()。
+        """
+        with self._lock:
+            future = self._inflight.get(path)
+        if future is not None: future.result()
+        local, _ = self._local_path(path)
+        if local is None: return None
+        with self._lock:
+            if not os.path.exists(local): return None
+            self._pins[local] = self._pins.get(local, 0) + 1
+        try:
+            os.utime(local)  # 记录最近使用时间
+        except OSError:
+            pass
+        return local
+
+    def release(self, local):
+        with self._lock:
+            count = self._pins.get(local, 0) - 1
+            if count > 0: self._pins[local] = count
+            else: self._pins.pop(local, None)
+
+    def abort(self):
+        """中止正在进行的复制 (导出被取消时)"""
+        self._abort.set()
+
+    def close(self):
+        """取消尚未开始的预读，等待正在进行的复制结束"""
+        with self._lock:
+            # shutdown(cancel_futures=True) 需要 Python 3.9，这里逐个取消
+            for path, future in list(self._inflight.items()):
+                if future.cancel(): del self._inflight[path]
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+
+# ===========================
+#   启动计时
+# ===========================
+# 记录图形界面启动各阶段的耗时 (导入、建窗口、首次绘制、打开项目)，用于排查办公电脑上启动慢的问题。
+# 本模块只依赖标准库，main.py 最先导入它，计时起点尽量靠前。
+# 设置环境变量 CLIPFLOW_STARTUP_TRACE=1 时把各阶段耗时输出到标准错误；
+# 值为文件路径时追加写入该文件 (打包后的无控制台程序没有标准错误)。
+
+TRACE_ENV = "CLIPFLOW_STARTUP_TRACE"
+
+_t0 = time.perf_counter()
+_marks = []  # [(阶段, 距启动的秒数)]
+
+def mark(name):
+    """记录一个阶段结束的时刻"""
+    _marks.append((name, time.perf_counter() - _t0))
+
+def elapsed():
+    return time.perf_counter() - _t0
+
+def summary():
+    """各阶段耗时的一行描述，如 "导入 0.21s | 建窗口 0.08s | 合计 0.29s" """
+    parts, last = [], 0.0
+    for name, t in _marks:
+        parts.append(f"{name} {t - last:.2f}s")
+        last = t
+    return " | ".join(parts + [f"合计 {last:.2f}s"])
+
+def report():
+    """按环境变量 CLIPFLOW_STARTUP_TRACE 输出各阶段耗时，未设置时什么都不做"""
+    target = os.environ.get(TRACE_ENV)
+    if not target: return
+    line = f"[启动计时] {time.strftime('%Y-%m-%d %H:%M:%S')} {summary()}"
+    if target != "1":
+        try:
+            with open(target, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+        except OSError:
+            pass
+    elif sys.stderr is not None:
+        print(line, file=sys.stderr, flush=True)
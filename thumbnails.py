@@ -0,0 +1,135 @@
+import os
+import hashlib
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import engine
+import probe
+
+# ===========================
+#   关键帧缩略图 (磁盘缓存 + LRU 淘汰)
+# ===========================
+# 预览面板在片段起止处和时间轴上显示缩略图，用来核对切点，不必再用播放器打开文件。
+# 取图时先把时间吸附到之前最近的关键帧 (直接复制剪切时片段实际从这里开始)，
+# ffmpeg 只解码这一个关键帧 (-skip_frame nokey)，每张图只需一次 seek。
+# 缩略图以 (源文件身份, 关键帧时间, 宽度) 为键缓存为 PNG，同一关键帧附近的请求共用一张图；
+# 缓存目录有总大小上限，超出时按最近使用时间 (文件 mtime) 淘汰。
+
+CACHE_VERSION = 1
+THUMB_WIDTH = 160
+DEFAULT_MAX_BYTES = 200 * 1024 ** 2
+EVICT_TARGET = 0.9  # 淘汰到上限的这个比例，避免每张新图都触发一次淘汰
+WORKERS = 2         # 并发取图数，缩略图是随机读，并发过多反而拖慢
+
+def _thumb_key(identity, t, width):
+    raw = f"{CACHE_VERSION}|{identity['path']}|{identity['size']}|{identity['mtime_ns']}|{t:.3f}|{width}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def build_thumb_cmd(ffmpeg_path, vid_path, t, width, out_path):
+    return [ffmpeg_path, '-hide_banner', '-v', 'error', '-y', '-skip_frame', 'nokey', '-noaccurate_seek',
+            '-ss', f"{t:.3f}", '-i', vid_path, '-map', '0:v:0', '-frames:v', '1', '-vf', f"scale={width}:-2",
+            '-f', 'image2', '-c:v', 'png', out_path]
+
+class ThumbnailCache:
+    """缩略图缓存，线程安全；request() 在后台线程中取图"""
+
+    def __init__(self, ffmpeg_path, probe_cache=None, root=None, max_bytes=DEFAULT_MAX_BYTES, width=THUMB_WIDTH):
+        self.ffmpeg_path = ffmpeg_path
+        self.probe_cache = probe_cache
+        self.root = root or engine.cache_dir("thumbnails")
+        self.max_bytes = max_bytes
+        self.width = width
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=WORKERS)
+        self._pending = set()  # 尚未完成的取图，关闭时取消
+        self._total = sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        entries = []
+        for folder, _, files in os.walk(self.root):
+            for name in files:
+                full = os.path.join(folder, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, full))
+        return entries
+
+    def snap(self, vid_path, t):
+        """把时间吸附到之前最近的关键帧 (还没有扫描关键帧表时原样返回，不为此读整个文件)"""
+        info = self.probe_cache.get(vid_path) if self.probe_cache else None
+        kf = probe.keyframe_before(info, t)
+        return kf if kf is not None else t
+
+    def get(self, vid_path, t):
+        """返回 t 时刻 (吸附到关键帧后) 的缩略图路径，必要时调用 ffmpeg 生成；失败时返回 None"""
+        try:
+            identity = engine.file_identity(vid_path)
+        except OSError:
+            return None
+        t = self.snap(vid_path, t)
+        key = _thumb_key(identity, t, self.width)
+        path = os.path.join(self.root, key[:2], key + ".png")
+        try:
+            os.utime(path)  # 命中：记录最近使用时间
+            return path
+        except OSError:
+            pass
+        if not self.ffmpeg_path: return None
+        tmp_path = path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            subprocess.run(build_thumb_cmd(self.ffmpeg_path, vid_path, t, self.width, tmp_path),
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True, **engine.subprocess_kwargs())
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except (OSError, subprocess.SubprocessError):
+            engine.remove_quietly(tmp_path)
+            return None
+        with self._lock:
+            self._total += size
+            over = self._total > self.max_bytes
+        if over: self._evict()
+        return path
+
+    def _evict(self):
+        """按最近使用时间淘汰，直到总大小降到上限的 EVICT_TARGET"""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, full in entries:
+                if total <= self.max_bytes * EVICT_TARGET: break
+                try:
+                    os.remove(full)
+                    total -= size
+                except OSError:
+                    pass
+            self._total = total
+
+    def request(self, vid_path, times, on_ready, cancel=None):
+        """
+        后台依次取图，每张完成后在工作线程中回调 on_ready(请求的时间, 缩略图路径或 None)。
+        cancel 为 threading.Event 时，置位后尚未开始的取图直接跳过 (切换视频时旧请求作废)。
+        """
+        def work(t):
+            if cancel is not None and cancel.is_set(): return
+            path = self.get(vid_path, t)
+            if cancel is None or not cancel.is_set(): on_ready(t, path)
+        for t in times:
+            future = self._pool.submit(work, t)
+            with self._lock:
+                self._pending.add(future)
+            future.add_done_callback(self._forget)
+
+    def _forget(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def close(self):
+        # shutdown(cancel_futures=True) 需要 Python 3.9，这里逐个取消尚未开始的取图
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending: future.cancel()
+        self._pool.shutdown(wait=False)
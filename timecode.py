@@ -0,0 +1,92 @@
+import re
+import math
+
+# ===========================
+#   时间码解析与规范化
+# ===========================
+# 片段起止在界面中手工输入、或来自剪辑清单，写法五花八门：
+#   HH:MM:SS(.mmm) / MM:SS / 秒数 / HH:MM:SS,mmm (SRT) / HH:MM:SS:FF 帧号时间码 (分号分隔为丢帧时间码)
+# 这里统一解析为秒，并规范为 HH:MM:SS(.mmm) 交给 ffmpeg；分、秒超过 59 等笔误视为无法解析。
+# 本模块不依赖其他模块，engine.parse_time / format_time 即为这里的函数。
+
+DEFAULT_FPS = 25.0  # 帧号时间码的默认帧率 (PAL)
+SMPTE_RE = re.compile(r"^(\d{1,2})[:;](\d{2})[:;](\d{2})[:;](\d{2,3})$")
+CLOCK_RE = re.compile(r"^(?:(\d+):)?(?:(\d+):)?(\d+(?:\.\d*)?)$")
+
+class TimecodeError(ValueError):
+    """片段时间无效，消息为可直接展示给用户的原因"""
+
+def parse_timecode(text, fps=DEFAULT_FPS):
+    """把时间文本转为秒，无法解析时返回 None"""
+    text = str(text).strip()
+    match = SMPTE_RE.match(text)
+    if match:
+        h, m, s, f = (int(x) for x in match.groups())
+        nominal = int(round(fps))
+        if nominal <= 0 or f >= nominal or m >= 60 or s >= 60: return None
+        frames = ((h * 60 + m) * 60 + s) * nominal + f
+        if ";" in text and nominal in (30, 60):
+            # 丢帧: 除每第 10 分钟外，每分钟开头跳过 2 (60fps 为 4) 个帧号
+            minutes = h * 60 + m
+            frames -= (nominal // 15) * (minutes - minutes // 10)
+            return frames * 1001 / (nominal * 1000)
+        return frames / fps
+    match = CLOCK_RE.match(text.replace(",", "."))
+    if not match:
+        # 科学计数法等其他数字写法
+        try:
+            secs = float(text)
+        except ValueError:
+            return None
+        return secs if math.isfinite(secs) and secs >= 0 else None
+    first, second, last = match.groups()
+    fields = [int(x) for x in (first, second) if x is not None]
+    secs = float(last)
+    # 前面有分、时字段时，秒和分不能超过 59
+    if fields and secs >= 60 or len(fields) == 2 and fields[1] >= 60: return None
+    total = 0
+    for value in fields: total = total * 60 + value
+    return total * 60 + secs
+
+def format_timecode(secs):
+    """秒数转为 HH:MM:SS，带小数时保留毫秒"""
+    secs = max(0.0, float(secs))
+    ms = int(round(secs * 1000))
+    h, rem = divmod(ms, 3600000)
+    m, rem = divmod(rem, 60000)
+    s, ms = divmod(rem, 1000)
+    text = f"{h:02d}:{m:02d}:{s:02d}"
+    return f"{text}.{ms:03d}" if ms else text
+
+def normalize_timecode(text, fps=DEFAULT_FPS):
+    """规范写法 HH:MM:SS(.mmm)，无法解析时返回 None"""
+    secs = parse_timecode(text, fps)
+    return None if secs is None else format_timecode(secs)
+
+class ClipSpan:
+    """一个片段的起止时间 (秒)"""
+    __slots__ = ("start", "end")
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def from_clip(cls, clip, fps=DEFAULT_FPS):
+        """解析片段的起止时间，无效时抛出 TimecodeError"""
+        start, end = parse_timecode(clip.get('start', ""), fps), parse_timecode(clip.get('end', ""), fps)
+        if start is None: raise TimecodeError(f"开始时间格式错误: {clip.get('start', '')}")
+        if end is None: raise TimecodeError(f"结束时间格式错误: {clip.get('end', '')}")
+        if end <= start: raise TimecodeError(f"结束时间不晚于开始时间: {clip['start']} - {clip['end']}")
+        return cls(start, end)
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def overlaps(self, other):
+        return self.start < other.end and other.start < self.end
+
+    def texts(self):
+        """规范化的 (开始, 结束) 文本"""
+        return format_timecode(self.start), format_timecode(self.end)